@@ -9,6 +9,7 @@ COMBAT_START_THRESHOLD = 30 # Threshold to engage combat
 COMBAT_INCLUDE_THRESHOLD = 45 # Threshold to include entities in combat
 WAVE_COMBINE_THRESHOLD = 15 # threshold for waves to be combined into one
 TARGET_LOC_THRESHOLD = 3 # threshold for being considered as arriving at a target location
+SPATIAL_GRID_CELL_SIZE = max(PRESENCE_THRESHOLD, COMBAT_INCLUDE_THRESHOLD) # cell size of the Map's spatial index, so typical range queries touch at most 3x3 cells
 
 # Simulation step periods, intervals, and timers
 DAMAGE_APPLY_INTERVAL = 1  # time per damage tick in seconds
@@ -30,6 +30,16 @@ TOP_LANE_POINTS = SIDE_LANE_POINTS
 MID_LAND_POINTS = [(p[0], 0) for p in SIDE_LANE_POINTS]
 BOT_LANE_POINTS = [(p[0], -p[1]) for p in SIDE_LANE_POINTS]
 
+def get_lane_y_scale(lane_index, lane_count):
+    # Lanes are spread evenly from the top lane (1) to the bottom lane (-1). With three lanes this gives top/mid/bottom
+    if lane_count == 1:
+        return 0
+    return 1 - 2 * lane_index / (lane_count - 1)
+
+def get_lane_points(lane_index, lane_count) -> COORD_LIST:
+    y_scale = get_lane_y_scale(lane_index, lane_count)
+    return [(p[0], y_scale * p[1]) for p in SIDE_LANE_POINTS]
+
 def get_tower_points(y_sign, from_end):
     if from_end:
         return [(MAP_X - p[0], y_sign * p[1]) for p in TOWER_BASE_POINTS]
@@ -0,0 +1,391 @@
+"""
+Vectorized engine that steps K independent games in lockstep.
+All game state is held in numpy arrays with a leading game axis, so one call to step() advances every game at once.
+
+This is an approximate model of the Simulator, not the same game: results don't match Simulator runs game for game or
+in distribution, so policies trained on it should be checked against the Simulator. It covers the parts of the game
+that dominate rollouts:
+   - Wave spawning and movement along the lanes (SingleLaneSimulator.move_wave), including wave combining
+   - Lane fights between waves, turrets and players (SingleLaneSimulator.set_attacking / run_attack_step)
+   - Player vs player combat damage ticks, with the same miss probability
+   - Reward distribution for damaging waves (Map.distribute_rewards)
+Where it differs from the Simulator:
+   - It always plays the default game (three lanes, default team size, wave size and spawn interval) and ignores SimConfig
+   - Damage within a tick is resolved simultaneously rather than in a random sequential order
+   - Lane entities pick the nearest target in range rather than the first one (turrets still take priority over waves)
+   - Combats are groups of players within range of each other rather than Combat instances, with a random target each tick
+   - There is no experience, levels, items or recalls, so player stats never change
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+from CONSTANTS import (COMBAT_INCLUDE_THRESHOLD, COMBAT_START_THRESHOLD, DAMAGE_APPLY_INTERVAL, DEFAULT_WAVE_REWARD, DISENGAGE_TIME,
+                       PLAYER_ATTACK_MISS_PROBABILITY, PRESENCE_THRESHOLD, RESPAWN_TIME, SIM_STEPS_PER_SECOND, TARGET_LOC_THRESHOLD, WAVE_COMBINE_THRESHOLD)
+from MAP_CONSTANTS import BOT_LANE_POINTS, MID_LAND_POINTS, TOP_LANE_POINTS, get_tower_points
+from entity import CANNON_WAVE_HEALTH, DEFAULT_WAVE_HEALTH, GET_DEFAULT_TURRET_STATS, GET_DEFAULT_WAVE_STATS, Team
+from lane import WAVE_SPAWN_INTERVAL
+from player import GET_DEFAULT_PLAYER_STATS, RESPAWN_POINT
+from sim import PLAYER_START_INFO
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TEAMS = (Team.BLUE, Team.RED) # Index 0 is BLUE, index 1 is RED along every team axis
+LANE_POINTS = [TOP_LANE_POINTS, MID_LAND_POINTS, BOT_LANE_POINTS]
+LANE_Y_SIGNS = [1, 0, -1]
+TURRETS_PER_LANE = 3
+DEFAULT_MAX_WAVES = 8 # Wave slots per game, lane and team
+
+@dataclass
+class BatchActions:
+    # Every field is optional and has a leading (K, 2, players per team) shape
+    move_target: Optional[np.ndarray] = None # (K, 2, P, 2) float. NaN means keep the current target
+    attack_lane: Optional[np.ndarray] = None # (K, 2, P) bool. Start attacking the nearest enemy lane entity in range
+    engage: Optional[np.ndarray] = None # (K, 2, P) bool. Start a combat at the player's location if an enemy player is in range
+    disengage: Optional[np.ndarray] = None # (K, 2, P) bool. Start disengaging from combat
+
+class BatchSimulator:
+    # Approximate model of K default games, see the module docstring for how it differs from the Simulator
+    def __init__(self, num_games: int, max_waves: int = DEFAULT_MAX_WAVES, seed: Optional[int] = None) -> None:
+        assert np is not None, "BatchSimulator requires numpy"
+        self.num_games = K = num_games
+        self.max_waves = W = max_waves
+        self.num_lanes = L = len(LANE_POINTS)
+        self.players_per_team = P = len(PLAYER_START_INFO[Team.BLUE])
+        self.rng = np.random.default_rng(seed)
+
+        self.sim_step = 0
+        self.time_delta = 1 / SIM_STEPS_PER_SECOND
+        self.damage_tick_timer = DAMAGE_APPLY_INTERVAL
+        self.spawn_interval_sim_steps = WAVE_SPAWN_INTERVAL * SIM_STEPS_PER_SECOND
+        self.wave_num = 0
+
+        # Lane geometry. Waves track the distance travelled from their own team's end of the lane
+        self.lane_xs = [np.array([p[0] for p in points], dtype=float) for points in LANE_POINTS]
+        self.lane_ys = [np.array([p[1] for p in points], dtype=float) for points in LANE_POINTS]
+        self.lane_cum = [np.concatenate([[0.0], np.cumsum(np.hypot(np.diff(xs), np.diff(ys)))]) for xs, ys in zip(self.lane_xs, self.lane_ys)]
+        self.lane_length = np.array([cum[-1] for cum in self.lane_cum])
+
+        wave_stats = GET_DEFAULT_WAVE_STATS().effective
+        self.wave_speed_base = wave_stats.move_speed
+        self.wave_damage_base = wave_stats.damage_stats.physical_damage
+        self.wave_armor_base = wave_stats.health_stats.armor
+
+        # Waves: (K, L, 2, W)
+        self.wave_alive = np.zeros((K, L, 2, W), dtype=bool)
+        self.wave_order = np.zeros((K, L, 2, W), dtype=np.int64) # Spawn number, used to combine waves in the same order as the lane lists
+        self.wave_dist = np.zeros((K, L, 2, W))
+        self.wave_health = np.zeros((K, L, 2, W))
+        self.wave_max_health = np.ones((K, L, 2, W))
+        self.wave_damage = np.zeros((K, L, 2, W))
+        self.wave_armor = np.zeros((K, L, 2, W))
+        self.wave_speed = np.zeros((K, L, 2, W))
+
+        # Turrets: (K, L, 2, TURRETS_PER_LANE)
+        turret_stats = GET_DEFAULT_TURRET_STATS().effective
+        self.turret_max_health = turret_stats.health_stats.max_health
+        self.turret_damage = turret_stats.damage_stats.physical_damage
+        self.turret_armor = turret_stats.health_stats.armor
+        self.turret_health = np.full((K, L, 2, TURRETS_PER_LANE), float(self.turret_max_health))
+        self.turret_xy = np.array([[get_tower_points(sgn, from_end=team == Team.RED) for team in TEAMS] for sgn in LANE_Y_SIGNS], dtype=float) # (L, 2, T, 2)
+
+        # Players: (K, 2, P)
+        player_stats = GET_DEFAULT_PLAYER_STATS().effective
+        self.player_max_health = player_stats.health_stats.max_health
+        self.player_armor = player_stats.health_stats.armor
+        self.player_magic_resist = player_stats.health_stats.magic_resist
+        self.player_physical_damage = player_stats.damage_stats.physical_damage
+        self.player_magic_damage = player_stats.damage_stats.magic_damage
+        self.player_speed = player_stats.move_speed
+        self.spawn_xy = np.array([RESPAWN_POINT[team] for team in TEAMS], dtype=float) # (2, 2)
+        start_xy = np.array([[info[0] for info in PLAYER_START_INFO[team]] for team in TEAMS], dtype=float)
+        self.player_xy = np.broadcast_to(start_xy, (K, 2, P, 2)).copy()
+        self.player_target = np.full((K, 2, P, 2), np.nan)
+        self.player_health = np.full((K, 2, P), float(self.player_max_health))
+        self.player_respawn_timer = np.zeros((K, 2, P)) # > 0 while respawning
+        self.player_attacking_lane = np.zeros((K, 2, P), dtype=bool)
+        self.player_in_combat = np.zeros((K, 2, P), dtype=bool)
+        self.player_disengage_timer = np.full((K, 2, P), np.inf)
+        self.player_gold = np.zeros((K, 2, P))
+
+    def player_alive(self):
+        return self.player_respawn_timer <= 0
+
+    def lane_position(self, lane, dist, team_index):
+        # Position along the lane polyline for a distance travelled by a wave of the given team
+        s = dist if team_index == 0 else self.lane_length[lane] - dist
+        return np.stack([np.interp(s, self.lane_cum[lane], self.lane_xs[lane]), np.interp(s, self.lane_cum[lane], self.lane_ys[lane])], axis=-1)
+
+    def wave_xy(self):
+        xy = np.zeros(self.wave_dist.shape + (2,))
+        for lane in range(self.num_lanes):
+            for t in range(2):
+                xy[:, lane, t] = self.lane_position(lane, self.wave_dist[:, lane, t], t)
+        return xy
+
+    def spawn_waves(self):
+        if self.sim_step % self.spawn_interval_sim_steps != 0:
+            return
+        is_cannon = self.wave_num % 3 == 2
+        free = ~self.wave_alive
+        assert free.any(axis=-1).all(), "Ran out of wave slots, increase max_waves"
+        slot = free.argmax(axis=-1) # (K, L, 2) first free slot
+        k, l, t = np.indices(slot.shape)
+        health = CANNON_WAVE_HEALTH if is_cannon else DEFAULT_WAVE_HEALTH
+        self.wave_alive[k, l, t, slot] = True
+        self.wave_order[k, l, t, slot] = self.wave_num
+        self.wave_dist[k, l, t, slot] = 0
+        self.wave_health[k, l, t, slot] = health
+        self.wave_max_health[k, l, t, slot] = health
+        self.wave_damage[k, l, t, slot] = self.wave_damage_base
+        self.wave_armor[k, l, t, slot] = self.wave_armor_base
+        self.wave_speed[k, l, t, slot] = self.wave_speed_base
+        self.wave_num += 1
+
+    def combine_waves(self):
+        # Mirrors SingleLaneSimulator.combine_waves: every chain of waves where each is within WAVE_COMBINE_THRESHOLD of the
+        # next one along the lane is combined into the wave furthest along, for each game, lane and team
+        order = np.argsort(np.where(self.wave_alive, -self.wave_dist, np.inf), axis=-1, kind="stable") # Alive waves first, furthest along first
+        alive = np.take_along_axis(self.wave_alive, order, axis=-1)
+        dist = np.take_along_axis(self.wave_dist, order, axis=-1)
+        linked = alive[..., 1:] & (dist[..., :-1] - dist[..., 1:] <= WAVE_COMBINE_THRESHOLD) # linked[..., j - 1]: wave j joins the chain of wave j - 1
+        if not linked.any():
+            return
+        leader = order[..., 0]
+        for j in range(1, self.max_waves):
+            link = linked[..., j - 1]
+            leader = np.where(link, leader, order[..., j])
+            if not link.any():
+                continue
+            k, l, t = np.nonzero(link)
+            front, back = leader[k, l, t], order[k, l, t, j]
+            # Combining adds all effective stats together, as WaveWrapper.combine_from does
+            for arr in (self.wave_health, self.wave_max_health, self.wave_damage, self.wave_armor, self.wave_speed):
+                arr[k, l, t, front] += arr[k, l, t, back]
+            self.wave_alive[k, l, t, back] = False
+
+    def apply_actions(self, actions: BatchActions):
+        alive = self.player_alive()
+        if actions.move_target is not None:
+            new_target = ~np.isnan(actions.move_target).any(axis=-1) & alive & ~self.player_in_combat
+            self.player_target[new_target] = actions.move_target[new_target]
+        if actions.attack_lane is not None:
+            self.player_attacking_lane |= actions.attack_lane & alive & ~self.player_in_combat
+        if actions.engage is not None:
+            self.start_combats(actions.engage & alive & ~self.player_in_combat)
+        if actions.disengage is not None:
+            start = actions.disengage & self.player_in_combat & np.isinf(self.player_disengage_timer)
+            self.player_disengage_timer[start] = DISENGAGE_TIME
+
+    def player_distances(self):
+        # (K, 2, P, P) distances from each player to each player of the other team
+        other = self.player_xy[:, ::-1]
+        return np.hypot(self.player_xy[:, :, :, None, 0] - other[:, :, None, :, 0], self.player_xy[:, :, :, None, 1] - other[:, :, None, :, 1])
+
+    def start_combats(self, engage):
+        # Same rule as Map.start_combat_at_location: needs an enemy player within COMBAT_START_THRESHOLD, then pulls in
+        # every free player (of both teams) within COMBAT_INCLUDE_THRESHOLD of the engaging player
+        if not engage.any():
+            return
+        alive = self.player_alive()
+        free = alive & ~self.player_in_combat
+        enemy_in_range = ((self.player_distances() <= COMBAT_START_THRESHOLD) & free[:, ::-1, None, :]).any(axis=-1)
+        for k, t, p in zip(*np.nonzero(engage & enemy_in_range)):
+            d = np.hypot(self.player_xy[k, :, :, 0] - self.player_xy[k, t, p, 0], self.player_xy[k, :, :, 1] - self.player_xy[k, t, p, 1])
+            joined = (d <= COMBAT_INCLUDE_THRESHOLD) & free[k]
+            self.player_in_combat[k] |= joined
+            self.player_attacking_lane[k] &= ~joined
+            self.player_target[k][joined] = np.nan
+
+    def step_players(self, is_damage_tick):
+        alive = self.player_alive()
+        dt = self.time_delta
+
+        # Respawning
+        self.player_respawn_timer[~alive] -= dt
+        respawned = ~alive & (self.player_respawn_timer <= 0)
+        if respawned.any():
+            self.player_health[respawned] = self.player_max_health
+            self.player_xy[respawned] = np.broadcast_to(self.spawn_xy[None, :, None, :], self.player_xy.shape)[respawned]
+
+        # Movement towards the path target
+        moving = alive & ~self.player_in_combat & ~self.player_attacking_lane & ~np.isnan(self.player_target[..., 0])
+        delta = self.player_target - self.player_xy
+        distance = np.hypot(delta[..., 0], delta[..., 1])
+        step_len = self.player_speed * dt
+        arrived = moving & (distance <= step_len + TARGET_LOC_THRESHOLD)
+        advancing = moving & ~arrived
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.player_xy[advancing] += delta[advancing] / distance[advancing][:, None] * step_len
+        self.player_xy[arrived] = self.player_target[arrived]
+        self.player_target[arrived] = np.nan
+
+        # Healing at spawn
+        spawn_delta = self.player_xy - self.spawn_xy[None, :, None, :]
+        at_spawn = alive & (np.hypot(spawn_delta[..., 0], spawn_delta[..., 1]) <= PRESENCE_THRESHOLD)
+        self.player_health[at_spawn] = self.player_max_health
+
+    def lane_entities(self, wave_xy):
+        # Stacks waves and turrets into (K, L, 2, W + T) arrays: xy, alive, health, raw damage, armor, is_turret
+        K, L = self.num_games, self.num_lanes
+        T = TURRETS_PER_LANE
+        xy = np.concatenate([wave_xy, np.broadcast_to(self.turret_xy[None], (K, L, 2, T, 2))], axis=3)
+        alive = np.concatenate([self.wave_alive, self.turret_health > 0], axis=3)
+        health = np.concatenate([self.wave_health, self.turret_health], axis=3)
+        damage = np.concatenate([self.wave_damage * self.wave_health / self.wave_max_health, np.full((K, L, 2, T), float(self.turret_damage))], axis=3) # Wave damage scales with health
+        armor = np.concatenate([self.wave_armor, np.full((K, L, 2, T), float(self.turret_armor))], axis=3)
+        is_turret = np.concatenate([np.zeros(self.max_waves, dtype=bool), np.ones(T, dtype=bool)])
+        return xy, alive, health, damage, armor, is_turret
+
+    def step_lanes(self, is_damage_tick, wave_xy):
+        # Returns (incoming lane damage (K, L, 2, W + T), incoming player damage (K, 2, P), engaged wave mask (K, L, 2, W))
+        xy, alive, health, damage, armor, is_turret = self.lane_entities(wave_xy)
+        W = self.max_waves
+        BIG = 1e9
+
+        # Lane entity vs lane entity. d[k, l, i, j] is between blue entity i and red entity j
+        d = np.hypot(xy[:, :, 0, :, None, 0] - xy[:, :, 1, None, :, 0], xy[:, :, 0, :, None, 1] - xy[:, :, 1, None, :, 1])
+        in_range = (d <= COMBAT_START_THRESHOLD) & alive[:, :, 0, :, None] & alive[:, :, 1, None, :]
+        masked = np.where(in_range, d, np.inf)
+        wave_penalty = np.where(is_turret, 0, BIG)[None, None, None, :] # Turrets take priority, then the nearest wave
+        blue_target = np.argmin(masked + wave_penalty, axis=3)
+        red_target = np.argmin(masked.transpose(0, 1, 3, 2) + wave_penalty, axis=3)
+        has_target = np.stack([in_range.any(axis=3), in_range.any(axis=2)], axis=2) # (K, L, 2, E)
+        target = np.stack([blue_target, red_target], axis=2)
+
+        # Lane entities without a lane target attack the nearest enemy player in range
+        player_alive = self.player_alive()
+        enemy_xy = self.player_xy[:, ::-1] # (K, 2, P, 2), indexed by the lane entity's team
+        pd = np.hypot(xy[..., :, None, 0] - enemy_xy[:, None, :, None, :, 0], xy[..., :, None, 1] - enemy_xy[:, None, :, None, :, 1]) # (K, L, 2, E, P)
+        player_in_range = (pd <= COMBAT_START_THRESHOLD) & player_alive[:, ::-1][:, None, :, None, :] & alive[..., None] & ~has_target[..., None]
+        has_player_target = player_in_range.any(axis=-1)
+        player_target = np.argmin(np.where(player_in_range, pd, np.inf), axis=-1)
+
+        lane_incoming = np.zeros(alive.shape)
+        player_incoming = np.zeros(self.player_health.shape)
+        if is_damage_tick:
+            k, l, t, e = np.nonzero(has_target)
+            tgt = target[k, l, t, e]
+            np.add.at(lane_incoming, (k, l, 1 - t, tgt), damage[k, l, t, e] * 100 / (100 + armor[k, l, 1 - t, tgt]))
+            k, l, t, e = np.nonzero(has_player_target)
+            np.add.at(player_incoming, (k, 1 - t, player_target[k, l, t, e]), damage[k, l, t, e] * 100 / (100 + self.player_armor))
+
+            # Players attacking lane entities hit the nearest enemy lane entity in range (in any lane)
+            attacking = self.player_attacking_lane & player_alive
+            if attacking.any():
+                ka, ta, pa = np.nonzero(attacking)
+                enemy_lane_xy = xy[ka, :, 1 - ta] # (n, L, E, 2)
+                ad = np.hypot(enemy_lane_xy[..., 0] - self.player_xy[ka, ta, pa, None, None, 0], enemy_lane_xy[..., 1] - self.player_xy[ka, ta, pa, None, None, 1])
+                ad = np.where(alive[ka, :, 1 - ta] & (ad <= COMBAT_START_THRESHOLD), ad, np.inf).reshape(len(ka), -1)
+                has_lane_target = np.isfinite(ad).any(axis=-1)
+                flat = np.argmin(ad, axis=-1)
+                lane_idx, ent_idx = np.divmod(flat, ad.shape[-1] // self.num_lanes)
+                hit = has_lane_target
+                mitigation = 100 / (100 + armor[ka[hit], lane_idx[hit], 1 - ta[hit], ent_idx[hit]])
+                np.add.at(lane_incoming, (ka[hit], lane_idx[hit], 1 - ta[hit], ent_idx[hit]), self.player_physical_damage * mitigation + self.player_magic_damage) # Lane entities have no magic resist
+                self.player_attacking_lane[ka[~hit], ta[~hit], pa[~hit]] = False
+
+        engaged = (has_target | has_player_target)[..., :W]
+        return lane_incoming, player_incoming, engaged
+
+    def step_combats(self, is_damage_tick):
+        # Player vs player damage ticks. Returns incoming player damage (K, 2, P)
+        incoming = np.zeros(self.player_health.shape)
+        if not self.player_in_combat.any():
+            return incoming
+        dt = self.time_delta
+        disengaging = np.isfinite(self.player_disengage_timer)
+        self.player_disengage_timer[disengaging] -= dt
+        done = disengaging & (self.player_disengage_timer <= 0)
+        self.player_in_combat[done] = False
+        self.player_disengage_timer[done] = np.inf
+
+        in_combat = self.player_in_combat & self.player_alive()
+        candidates = (self.player_distances() <= COMBAT_INCLUDE_THRESHOLD) & in_combat[:, :, :, None] & in_combat[:, ::-1][:, :, None, :] # (K, 2, P, P)
+        has_enemy = candidates.any(axis=-1)
+        if is_damage_tick:
+            hits = has_enemy & (self.rng.random(has_enemy.shape) > PLAYER_ATTACK_MISS_PROBABILITY)
+            target = np.argmax(np.where(candidates, self.rng.random(candidates.shape), -1), axis=-1) # Uniform choice among candidates
+            mitigated = self.player_physical_damage * 100 / (100 + self.player_armor) + self.player_magic_damage * 100 / (100 + self.player_magic_resist)
+            k, t, p = np.nonzero(hits)
+            np.add.at(incoming, (k, 1 - t, target[k, t, p]), mitigated)
+        # Combat ends for players without any enemy left in range
+        ended = self.player_in_combat & ~has_enemy
+        self.player_in_combat[ended] = False
+        self.player_disengage_timer[ended] = np.inf
+        return incoming
+
+    def distribute_rewards(self, wave_xy, wave_reward):
+        # wave_reward is (K, L, 2, W). Returns gold gained per game and team (K, 2)
+        gained = np.zeros(self.player_gold.shape)
+        k, l, t, w = np.nonzero(wave_reward > 0)
+        if len(k) > 0:
+            enemy_xy = self.player_xy[k, 1 - t] # (n, P, 2)
+            d = np.hypot(enemy_xy[..., 0] - wave_xy[k, l, t, w, None, 0], enemy_xy[..., 1] - wave_xy[k, l, t, w, None, 1])
+            in_range = (d <= PRESENCE_THRESHOLD) & self.player_alive()[k, 1 - t]
+            count = in_range.sum(axis=-1)
+            reward = wave_reward[k, l, t, w] * np.where(count > 1, 1.3, 1.0) / np.maximum(count, 1) # Sharing multiplier as in Map.distribute_rewards
+            kk, pp = np.nonzero(in_range)
+            np.add.at(gained, (k[kk], 1 - t[kk], pp), reward[kk])
+        self.player_gold += gained
+        return gained.sum(axis=-1)
+
+    def step(self, actions: Optional[BatchActions] = None):
+        """
+        Advance every game by one simulation step. Returns (observations, rewards), where rewards is the gold gained by
+        each team this step with shape (K, 2).
+        """
+        is_damage_tick = self.damage_tick_timer < 0
+        if actions is not None:
+            self.apply_actions(actions)
+
+        self.step_players(is_damage_tick)
+        self.spawn_waves()
+        self.combine_waves()
+        wave_xy = self.wave_xy()
+        lane_incoming, player_incoming, engaged = self.step_lanes(is_damage_tick, wave_xy)
+        player_incoming += self.step_combats(is_damage_tick)
+
+        # Apply all damage at once
+        W = self.max_waves
+        wave_reward = lane_incoming[..., :W] * DEFAULT_WAVE_REWARD / DEFAULT_WAVE_HEALTH
+        self.wave_health -= lane_incoming[..., :W]
+        self.turret_health = np.maximum(self.turret_health - lane_incoming[..., W:], 0)
+        self.wave_alive &= self.wave_health > 0
+        self.player_health = np.maximum(self.player_health - player_incoming, 0)
+        killed = self.player_alive() & (self.player_health <= 0)
+        self.player_respawn_timer[killed] = RESPAWN_TIME
+        self.player_xy[killed] = np.broadcast_to(self.spawn_xy[None, :, None, :], self.player_xy.shape)[killed]
+        self.player_in_combat[killed] = False
+        self.player_attacking_lane[killed] = False
+        self.player_target[killed] = np.nan
+
+        # Waves that are not fighting keep moving. Waves that go past the end of the lane are finished and free their slot
+        moving = self.wave_alive & ~engaged
+        self.wave_dist[moving] += self.wave_speed[moving] * self.time_delta
+        self.wave_alive &= ~(moving & (self.wave_dist > self.lane_length[None, :, None, None]))
+
+        rewards = self.distribute_rewards(wave_xy, wave_reward)
+
+        self.sim_step += 1
+        if is_damage_tick:
+            self.damage_tick_timer = DAMAGE_APPLY_INTERVAL
+        else:
+            self.damage_tick_timer -= self.time_delta
+        return self.observe(), rewards
+
+    def observe(self) -> dict[str, np.ndarray]:
+        return {
+            "player_xy": self.player_xy.copy(),
+            "player_health": self.player_health.copy(),
+            "player_alive": self.player_alive(),
+            "player_in_combat": self.player_in_combat.copy(),
+            "player_gold": self.player_gold.copy(),
+            "wave_xy": self.wave_xy(),
+            "wave_health": np.where(self.wave_alive, self.wave_health, 0),
+            "turret_health": self.turret_health.copy(),
+        }
@@ -0,0 +1,3 @@
+"""
+Benchmark suite for the simulator. Run with `python -m benchmarks` from the repository root (see __main__.py).
+"""
@@ -0,0 +1,175 @@
+"""
+Runs the benchmark scenarios and compares them against the stored baseline.
+
+    python -m benchmarks                     # run everything and compare against benchmarks/baseline.json
+    python -m benchmarks --quick             # shorter runs (compared against the "quick" section of the baseline)
+    python -m benchmarks --only early_laning --only team_fight_3v3
+    python -m benchmarks --update-baseline   # store the results of this run as the new baseline
+
+Exits with status 1 if any scenario regressed by more than --threshold.
+
+Raw throughput depends on the machine and on whatever else it is doing, so rates are not compared directly. Right before
+and right after each timed run of a scenario a fixed pure Python workload that doesn't use any simulator code
+(calibrate) is timed, and the baseline stores each scenario's rate relative to it. Only that relative rate is compared,
+so a baseline made on one machine can be checked on another. It is still only an approximation: on a machine very different from the one the baseline was
+made on, refresh it first with `python -m benchmarks --update-baseline` (and `--quick --update-baseline`). Changes that
+make a scenario faster should refresh its entry too (--only <scenario> --update-baseline), or later slowdowns can hide
+behind the gain.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from benchmarks.scenarios import SCENARIOS, Scenario
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.2
+CALIBRATION_ITERATIONS = 1000000
+CALIBRATION_REPEAT = 1 # Calibration runs before and after each timed run of a scenario
+
+class _CalibrationPoint:
+    def __init__(self, x, y) -> None:
+        self.x = x
+        self.y = y
+
+def calibrate(repeat: int) -> float:
+    # Iterations per second of a fixed workload of the kind the simulator does (attribute access, float math, dict and
+    # list operations), fastest of `repeat` runs. It never changes, so it measures the machine rather than the code
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        points = [_CalibrationPoint(float(i), float(-i)) for i in range(100)]
+        cells: dict[int, list[_CalibrationPoint]] = {}
+        total = 0.0
+        for i in range(CALIBRATION_ITERATIONS):
+            point = points[i % 100]
+            point.x += 0.5
+            total += math.hypot(point.x - point.y, 1.0) * 0.001
+            cells.setdefault(i % 37, []).append(point)
+            if len(cells[i % 37]) > 8:
+                cells[i % 37].clear()
+        best = min(best, time.perf_counter() - start)
+    return CALIBRATION_ITERATIONS / best
+
+@dataclass
+class ScenarioResult:
+    name: str
+    unit: str
+    work: int
+    wall_time: float
+    rate: float # Work per second of wall time
+    relative_rate: Optional[float] = None # Work per million iterations of calibrate(), timed around the scenario. This is what gets compared
+    peak_memory: Optional[int] = None # Peak traced allocation in bytes
+    snapshot_bytes: Optional[int] = None
+    details: Optional[str] = None
+
+def run_scenario(scenario: Scenario, quick: bool, seed: int, measure_memory: bool, repeat: int = 1) -> ScenarioResult:
+    # The timed runs and the memory run are separate, since tracemalloc slows everything down a lot.
+    # Each timed run is compared with the mean of the calibrations right before and after it, so load that slows the
+    # machine down for a while slows both. The best of the timed runs is kept, as it is the one least disturbed by
+    # whatever else the machine is doing
+    relative_rate, wall_time = 0.0, float("inf")
+    for _ in range(repeat):
+        before = calibrate(CALIBRATION_REPEAT)
+        random.seed(seed)
+        start = time.perf_counter()
+        run = scenario.run(quick)
+        elapsed = time.perf_counter() - start
+        calibration = (before + calibrate(CALIBRATION_REPEAT)) / 2
+        relative_rate = max(relative_rate, run.work / elapsed * 1e6 / calibration)
+        wall_time = min(wall_time, elapsed)
+
+    peak_memory = None
+    if measure_memory:
+        random.seed(seed)
+        tracemalloc.start()
+        scenario.run(quick)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return ScenarioResult(scenario.name, scenario.unit, run.work, wall_time, run.work / wall_time, relative_rate, peak_memory, run.snapshot_bytes, run.details)
+
+def find_regressions(result: ScenarioResult, baseline: dict, threshold: float) -> list[str]:
+    # Lower relative rate, or higher memory/snapshot size, by more than threshold (as a fraction of the baseline) is a
+    # regression. Entries without a relative rate (made before it was stored) don't have their rate checked
+    regressions = []
+    base_rate = baseline.get("relative_rate")
+    if base_rate and result.relative_rate is not None and result.relative_rate < base_rate * (1 - threshold):
+        regressions.append(f"relative rate {result.relative_rate:.1f} < baseline {base_rate:.1f} {result.unit} per million calibration iterations")
+    for key in ("peak_memory", "snapshot_bytes"):
+        value, base = getattr(result, key), baseline.get(key)
+        if value is not None and base and value > base * (1 + threshold):
+            regressions.append(f"{key} {value} > baseline {base}")
+    return regressions
+
+def format_bytes(n: Optional[int]):
+    if n is None:
+        return "-"
+    return f"{n / 1024:.1f} KiB" if n < 1024 * 1024 else f"{n / 1024 / 1024:.2f} MiB"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the simulator benchmark scenarios")
+    parser.add_argument("--quick", action="store_true", help="shorter runs of each scenario")
+    parser.add_argument("--only", action="append", help="scenario to run (can be repeated)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression as a fraction of the baseline")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario (the fastest is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each scenario")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    mode = "quick" if args.quick else "full"
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(mode, {})
+
+    scenarios = [s for s in SCENARIOS if args.only is None or s.name in args.only]
+    assert len(scenarios) > 0, f"No scenarios match {args.only}, options are {[s.name for s in SCENARIOS]}"
+
+    results: dict[str, ScenarioResult] = {}
+    failed = False
+    print(f"{'scenario':<24} {'work':>10} {'time s':>8} {'rate /s':>10} {'relative':>9} {'peak mem':>11} {'snapshot':>11}  status")
+    for scenario in scenarios:
+        skip_reason = scenario.skip_reason() if scenario.skip_reason is not None else None
+        if skip_reason is not None:
+            print(f"{scenario.name:<24} skipped: {skip_reason}")
+            continue
+        result = run_scenario(scenario, args.quick, args.seed, not args.no_memory, args.repeat)
+        results[scenario.name] = result
+        if scenario.name in baseline:
+            regressions = find_regressions(result, baseline[scenario.name], args.threshold)
+            status = "REGRESSED: " + "; ".join(regressions) if regressions else "ok"
+            failed |= len(regressions) > 0
+        else:
+            status = "no baseline"
+        print(
+            f"{scenario.name:<24} {result.work:>10} {result.wall_time:>8.2f} {result.rate:>10.1f} {result.relative_rate:>9.1f} "
+            f"{format_bytes(result.peak_memory):>11} {format_bytes(result.snapshot_bytes):>11}  {status}"
+        )
+        if result.details is not None:
+            print(f"{'':<24} {result.details}")
+
+    if args.update_baseline:
+        for name, result in results.items():
+            entry = asdict(result)
+            if result.peak_memory is None and name in baseline:
+                entry["peak_memory"] = baseline[name].get("peak_memory") # Keep the old memory baseline on --no-memory runs
+            baseline[name] = entry
+        baselines[mode] = baseline
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Updated {mode} baseline in {args.baseline}")
+        return 0
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
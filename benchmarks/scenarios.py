@@ -0,0 +1,291 @@
+"""
+Canned benchmark scenarios. Each scenario is deterministic for a given seed and returns how much work it did (in its own
+unit, e.g. sim steps) plus the pickled size of a representative snapshot, so runs can be compared between commits.
+Even the quick runs are sized to take about a second or more, as shorter ones vary too much from run to run to compare.
+"""
+from __future__ import annotations
+
+import importlib.util
+import pickle
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from CONSTANTS import SIM_STEPS_PER_SECOND
+from MAP_CONSTANTS import BOT_LANE_POINTS, MAP_Y, MID_LAND_POINTS, TOP_LANE_POINTS
+from combat import Combat
+from controller import ActionType
+from entity import Team
+from game_tree import GameTree
+from headless import HeadlessRunner, ScheduledAction
+from lane import lane_divergence
+from player import Player
+from sim import Simulator
+from sim_config import SimConfig
+
+@dataclass
+class ScenarioRun:
+    work: int # Amount of work done, in the scenario's unit
+    snapshot_bytes: Optional[int] = None # Mean pickled size of one snapshot of the scenario's state
+    details: Optional[str] = None # Extra line printed under the scenario's result
+
+@dataclass
+class Scenario:
+    name: str
+    unit: str
+    run: Callable[[bool], ScenarioRun] # Called with quick=True for a shorter run
+    skip_reason: Optional[Callable[[], Optional[str]]] = None # Returns why the scenario can't run here, if it can't
+
+def _lane_midpoint(points):
+    return points[len(points) // 2]
+
+# One player per lane for each team, moving to the middle of their lane at the start of the game
+LANE_ASSIGNMENTS = {
+    "A": _lane_midpoint(TOP_LANE_POINTS), "B": _lane_midpoint(MID_LAND_POINTS), "C": _lane_midpoint(BOT_LANE_POINTS),
+    "D": _lane_midpoint(TOP_LANE_POINTS), "E": _lane_midpoint(MID_LAND_POINTS), "F": _lane_midpoint(BOT_LANE_POINTS),
+}
+
+def _move_to_lanes(sim_step=0):
+    return [ScheduledAction(sim_step, ActionType.MOVE_TO_LOCATION, player_id, position) for player_id, position in LANE_ASSIGNMENTS.items()]
+
+def early_laning(quick: bool) -> ScenarioRun:
+    # First few minutes: players walk to their lanes and stand with the waves while they meet. Several games, as one is
+    # too short to time reliably
+    games = 8 if quick else 24
+    steps = 0
+    for _ in range(games):
+        sim = Simulator()
+        steps += HeadlessRunner(max_time=3 * 60).run_game(_move_to_lanes(), sim=sim).steps
+    return ScenarioRun(steps, len(pickle.dumps(sim)))
+
+def wave_push_game(quick: bool) -> ScenarioRun:
+    # Full length games where every player keeps attacking the lane entities near them, so waves keep pushing into turrets
+    games = 1 if quick else 3
+    max_steps = 30 * 60 * SIM_STEPS_PER_SECOND
+    schedule = _move_to_lanes()
+    for sim_step in range(10 * SIM_STEPS_PER_SECOND, max_steps, 10 * SIM_STEPS_PER_SECOND):
+        schedule += [ScheduledAction(sim_step, ActionType.ATTACK_LANE_ENTITY, player_id) for player_id in LANE_ASSIGNMENTS]
+    steps = 0
+    for _ in range(games):
+        sim = Simulator()
+        steps += HeadlessRunner(max_steps=max_steps).run_game(schedule, sim=sim).steps
+    return ScenarioRun(steps, len(pickle.dumps(sim)))
+
+def long_game(quick: bool) -> ScenarioRun:
+    # BLUE keeps pushing towards RED's base while RED stays home, so RED's turrets fall and BLUE waves run to the end of
+    # the lanes. Entity count and snapshot size are sampled every 20 minutes and should stay bounded
+    minutes = 40 if quick else 120
+    sample_minutes = 20
+    schedule = _move_to_lanes()
+    lanes = {"A": TOP_LANE_POINTS, "B": MID_LAND_POINTS, "C": BOT_LANE_POINTS}
+    for sim_step in range(10 * SIM_STEPS_PER_SECOND, minutes * 60 * SIM_STEPS_PER_SECOND, 10 * SIM_STEPS_PER_SECOND):
+        schedule += [ScheduledAction(sim_step, ActionType.ATTACK_LANE_ENTITY, player_id) for player_id in lanes]
+        if sim_step % (50 * SIM_STEPS_PER_SECOND) == 0:
+            schedule += [ScheduledAction(sim_step, ActionType.MOVE_TO_LOCATION, player_id, points[-2]) for player_id, points in lanes.items()]
+    sim = Simulator()
+    entity_counts, snapshot_sizes = [], []
+    for end_minute in range(sample_minutes, minutes + 1, sample_minutes):
+        end_step = end_minute * 60 * SIM_STEPS_PER_SECOND
+        HeadlessRunner(max_steps=end_step).run_game([a for a in schedule if sim.sim_step <= a.sim_step < end_step], sim=sim)
+        entity_counts.append(len(sim.map.entities))
+        snapshot_sizes.append(len(pickle.dumps(sim)))
+    details = f"every {sample_minutes} min: entities {entity_counts}, snapshot KiB {[round(size / 1024, 1) for size in snapshot_sizes]}"
+    return ScenarioRun(sim.sim_step, max(snapshot_sizes), details)
+
+# Coarse lane stepping settings used by one_lane_push_lod
+LOD_CONFIG = SimConfig(lane_lod_radius=150, lane_lod_interval=1.0)
+
+# Last full rate one_lane_push run (wall time and final state) for each value of quick, which one_lane_push_lod compares against
+_one_lane_reference: dict[bool, tuple[float, Simulator]] = {}
+
+def _play_one_lane(quick: bool, config: SimConfig) -> tuple[float, Simulator]:
+    # Every player goes to the middle of mid lane and keeps attacking lane entities there, so the other lanes are left alone
+    minutes = 30 if quick else 60
+    max_steps = minutes * 60 * SIM_STEPS_PER_SECOND
+    schedule = [ScheduledAction(0, ActionType.MOVE_TO_LOCATION, player_id, _lane_midpoint(MID_LAND_POINTS)) for player_id in LANE_ASSIGNMENTS]
+    for sim_step in range(10 * SIM_STEPS_PER_SECOND, max_steps, 10 * SIM_STEPS_PER_SECOND):
+        schedule += [ScheduledAction(sim_step, ActionType.ATTACK_LANE_ENTITY, player_id) for player_id in LANE_ASSIGNMENTS]
+    sim = Simulator(config=config)
+    start = time.perf_counter()
+    HeadlessRunner(max_steps=max_steps).run_game(schedule, sim=sim)
+    return time.perf_counter() - start, sim
+
+def one_lane_push(quick: bool) -> ScenarioRun:
+    wall_time, sim = _play_one_lane(quick, SimConfig())
+    if quick not in _one_lane_reference or wall_time < _one_lane_reference[quick][0]:
+        _one_lane_reference[quick] = (wall_time, sim)
+    return ScenarioRun(sim.sim_step, len(pickle.dumps(sim)))
+
+def one_lane_push_lod(quick: bool) -> ScenarioRun:
+    # Same game as one_lane_push with the two empty lanes stepped coarsely. Reports the speedup and how far the result
+    # drifted from the full rate game
+    if quick not in _one_lane_reference:
+        state = random.getstate()
+        one_lane_push(quick) # Only when run on its own (--only). Later repeats are timed without it
+        random.setstate(state)
+    reference_time, reference = _one_lane_reference[quick]
+    wall_time, sim = _play_one_lane(quick, LOD_CONFIG)
+    divergence = lane_divergence(reference.map.lanes, sim.map.lanes)
+    gold = sum(p.inventory.gold for p in sim.map.players) - sum(p.inventory.gold for p in reference.map.players)
+    details = (
+        f"speedup {reference_time / wall_time:.2f}x, gold {gold:+.0f}, "
+        f"wave distance {max(d.wave_distance for d in divergence):.1f}, waves {sum(d.waves for d in divergence):+d}, "
+        f"turrets {sum(d.turrets for d in divergence):+d}, turret health {sum(d.turret_health for d in divergence):+.1f}"
+    )
+    return ScenarioRun(sim.sim_step, len(pickle.dumps(sim)), details)
+
+def _game_state(sim: Simulator):
+    # Everything stepping changes, to check that two ways of running a game ended up in the same place
+    entities = [
+        (type(e).__name__, e.team, e.position, e.stats.health, e._state, getattr(e, "respawn_timer", None), getattr(e, "recall_timer", None))
+        for e in sim.map.entities
+    ]
+    return entities, sim.sim_step, sim.damage_tick_timer, random.getstate()
+
+def _fast_forward(quick: bool, config: SimConfig) -> ScenarioRun:
+    # Players walk to their lanes, attack the lane entities near them every minute and recall every few minutes. The game
+    # is played once with step() and once with advance_until, which should end in exactly the same state
+    minutes = 30 if quick else 120
+    max_steps = minutes * 60 * SIM_STEPS_PER_SECOND
+    schedule = _move_to_lanes()
+    for sim_step in range(60 * SIM_STEPS_PER_SECOND, max_steps, 60 * SIM_STEPS_PER_SECOND):
+        schedule += [ScheduledAction(sim_step, ActionType.ATTACK_LANE_ENTITY, player_id) for player_id in LANE_ASSIGNMENTS]
+    for sim_step in range(150 * SIM_STEPS_PER_SECOND, max_steps, 150 * SIM_STEPS_PER_SECOND):
+        schedule += [ScheduledAction(sim_step, ActionType.START_RECALL, player_id) for player_id in LANE_ASSIGNMENTS]
+        schedule += _move_to_lanes(sim_step + 30 * SIM_STEPS_PER_SECOND)
+    results = []
+    seed_state = random.getstate()
+    for fast_forward in (False, True):
+        random.setstate(seed_state)
+        sim = Simulator(config=config)
+        game = HeadlessRunner(max_steps=max_steps, fast_forward=fast_forward).run_game(schedule, sim=sim)
+        results.append((game.wall_time, _game_state(sim)))
+    (step_time, step_state), (fast_time, fast_state) = results
+    assert fast_state == step_state, "advance_until ended in a different state from step()"
+    return ScenarioRun(2 * max_steps, details=f"speedup {step_time / fast_time:.2f}x over step(), same end state")
+
+# Waves every five minutes rather than every 100 seconds, so the lanes are empty for long stretches. Like the quiet parts of a
+# game where players move around and recall between fights, which is what advance_until skips through
+QUIET_CONFIG = SimConfig(wave_spawn_interval=300)
+
+def fast_forward(quick: bool) -> ScenarioRun:
+    return _fast_forward(quick, QUIET_CONFIG)
+
+def fast_forward_lod(quick: bool) -> ScenarioRun:
+    return _fast_forward(quick, LOD_CONFIG)
+
+def team_fight(quick: bool) -> ScenarioRun:
+    # Repeated 3v3 fights in a Combat until one side is wiped out
+    fights = 2000 if quick else 10000
+    steps, snapshot_bytes = 0, 0
+    time_delta = 1 / SIM_STEPS_PER_SECOND
+    for i in range(fights):
+        players = [Player.default_player((MAP_Y / 2, 0), team, f"{team.name}{j}") for team in (Team.BLUE, Team.RED) for j in range(3)]
+        combat = Combat(players, (MAP_Y / 2, 0))
+        snapshot_bytes += len(pickle.dumps(combat))
+        while combat.step(time_delta, is_damage_tick=steps % SIM_STEPS_PER_SECOND == 0):
+            steps += 1
+        steps += 1
+    return ScenarioRun(steps, snapshot_bytes // fights)
+
+def combat_ticks(quick: bool) -> ScenarioRun:
+    # Rounds of 100 simultaneous 5v5 combats where every step is a damage tick, fought once with Combat.step and once with
+    # the batched CombatEngine. Only the stepping is timed, alternating which goes first, and the speedup is reported
+    from combat_engine import CombatEngine
+
+    rounds = 10 if quick else 30
+    time_delta = 1 / SIM_STEPS_PER_SECOND
+    ticks, times = 0, {False: 0.0, True: 0.0}
+    for i in range(rounds):
+        for batched in ((False, True) if i % 2 == 0 else (True, False)):
+            combats = [
+                Combat([Player.default_player((MAP_Y / 2, 0), team, f"{team.name}{j}") for team in (Team.BLUE, Team.RED) for j in range(5)], (MAP_Y / 2, 0))
+                for _ in range(100)
+            ]
+            engine = CombatEngine() if batched else None
+            start = time.perf_counter()
+            while len(combats) > 0:
+                if engine is not None:
+                    still_active = engine.step(combats, time_delta, True)
+                else:
+                    still_active = [combat.step(time_delta, True) for combat in combats]
+                combats = [combat for combat, active in zip(combats, still_active) if active]
+                ticks += 1
+            times[batched] += time.perf_counter() - start
+    return ScenarioRun(ticks, details=f"batched {times[False] / times[True]:.2f}x faster than Combat.step")
+
+def combat_estimates(quick: bool) -> ScenarioRun:
+    # Planning style queries: who wins a 1-3 v 1-3 fight with players at random health. Health is coarse enough that
+    # some queries repeat and are answered from the cache
+    from combat_estimator import CombatEstimator
+
+    queries = 150 if quick else 600
+    rng = random.Random(0)
+    estimator = CombatEstimator(seed=0)
+    for _ in range(queries):
+        players = [Player.default_player((MAP_Y / 2, 0), team, f"{team.name}{j}") for team in (Team.BLUE, Team.RED) for j in range(rng.randint(1, 3))]
+        for player in players:
+            player.stats.health *= rng.choice((0.25, 0.5, 0.75, 1.0))
+        estimator.estimate(players)
+    return ScenarioRun(queries, details=f"cache hits {estimator.hits}, misses {estimator.misses}")
+
+def _numpy_missing():
+    if importlib.util.find_spec("numpy") is None:
+        return "numpy is not installed"
+    return None
+
+def game_tree_branching(quick: bool) -> ScenarioRun:
+    # Builds a deep tree of snapshots. Most nodes continue the current line, some branch off from an ancestor
+    nodes = 500 if quick else 1000
+    rng = random.Random(0)
+    sim = Simulator()
+    HeadlessRunner(max_steps=1).run_game(_move_to_lanes(), sim=sim)
+    tree = GameTree(sim)
+    snapshot_bytes = 0
+    for i in range(nodes):
+        if i > 0 and rng.random() < 0.2:
+            for _ in range(rng.randint(1, 5)):
+                sim = tree.up_tree()
+        for _ in range(rng.randint(1, 2 * SIM_STEPS_PER_SECOND)):
+            sim.step()
+        sim = tree.add_node(sim)
+        snapshot_bytes += len(pickle.dumps(tree.cur_node.sim))
+    return ScenarioRun(nodes, snapshot_bytes // nodes)
+
+def _pygame_missing():
+    if importlib.util.find_spec("pygame") is None:
+        return "pygame is not installed"
+    return None
+
+def overlay_build_consolidate(quick: bool) -> ScenarioRun:
+    # Rebuilds the UI overlay for a mid game state and consolidates it, as the UI does every frame
+    from overlay_manager import OverlayManager, OverlayType
+    from ui_utils import coord2screen
+
+    frames = 1000 if quick else 2000
+    sim = Simulator()
+    HeadlessRunner(max_time=60).run_game(_move_to_lanes(), sim=sim)
+    box_types = [(OverlayType.MOVE_TO_LOCATION, lambda pos: None), (OverlayType.ATTACK_LANE_ENTITY, lambda pos: None), (OverlayType.ENGAGE_COMBAT, lambda pos: None)]
+    manager = OverlayManager()
+    for _ in range(frames):
+        manager.clear()
+        for entity in sim.map.entities:
+            manager.add_multiple_boxes(coord2screen(entity.position), box_types)
+        manager.consolidate()
+    return ScenarioRun(frames)
+
+SCENARIOS: list[Scenario] = [
+    Scenario("early_laning", "steps", early_laning),
+    Scenario("wave_push_30min", "steps", wave_push_game),
+    Scenario("long_game_2h", "steps", long_game),
+    Scenario("one_lane_push", "steps", one_lane_push),
+    Scenario("one_lane_push_lod", "steps", one_lane_push_lod),
+    Scenario("fast_forward", "steps", fast_forward),
+    Scenario("fast_forward_lod", "steps", fast_forward_lod),
+    Scenario("team_fight_3v3", "steps", team_fight),
+    Scenario("combat_ticks_100x5v5", "ticks", combat_ticks, skip_reason=_numpy_missing),
+    Scenario("combat_estimates", "queries", combat_estimates, skip_reason=_numpy_missing),
+    Scenario("game_tree_1000_nodes", "nodes", game_tree_branching),
+    Scenario("overlay_consolidate", "frames", overlay_build_consolidate, skip_reason=_pygame_missing),
+]
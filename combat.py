@@ -1,19 +1,22 @@
-from typing import Sequence
+from typing import Optional, Sequence
 from CONSTANTS import DISENGAGE_TIME, PLAYER_ATTACK_MISS_PROBABILITY
+from events import CombatEnded, CombatStarted, EventLog
 from player import Player
-from entity import Entity, EntityState, Team
+from entity import Entity, EntityState, Team, clone_of
 
 
 import random
 
 
 class Combat:
-    def __init__(self, entities: Sequence[Entity], position):
+    def __init__(self, entities: Sequence[Entity], position, events: Optional[EventLog] = None):
+        self.events = events
         self.entities: list[Entity] = []  # List of entities involved in combat
         self.position = position
         self.disengage_counter = None
         self.active = True
         self.steps_run = 0
+        self.version = 0 # Bumped whenever an entity joins, so CombatEngine knows to rebuild its arrays. Entities only leave by dying
 
         self.players_by_team: dict[Team, list[Player]] = {
             Team.RED: [],
@@ -22,13 +25,24 @@ class Combat:
 
         for entity in entities:
             self.add_entity(entity)
-        
-        print("combat started")
+
+        if self.events is not None:
+            self.events.emit(CombatStarted(position, len(self.entities)))
+
+    def clone(self, clones: dict[Entity, Entity], events: Optional[EventLog]) -> "Combat":
+        # Copy for Simulator.clone, between the copies of the participants
+        new = object.__new__(Combat)
+        new.__dict__.update(self.__dict__)
+        new.events = events
+        new.entities = [clone_of(clones, e) for e in self.entities]
+        new.players_by_team = {team: [clone_of(clones, p) for p in players] for team, players in self.players_by_team.items()} # type: ignore
+        return new
 
     def add_entity(self, entity: Entity):
         assert entity._state != EntityState.COMBAT, "Tried to add an Entity to Combat that is already in the COMBAT state"
         entity.set_state(EntityState.COMBAT)
         self.entities.append(entity)
+        self.version += 1
         if isinstance(entity, Player):
             self.players_by_team[entity.team].append(entity)
 
@@ -41,14 +55,26 @@ class Combat:
         for e in self.entities:
             if e._state == EntityState.COMBAT:
                 e.set_state(EntityState.NORMAL)
-        print("combat ended")
+        if self.events is not None:
+            self.events.emit(CombatEnded(self.position, self.steps_run))
 
-    def step(self, time_delta, is_damage_tick):
+    def step_timers(self, time_delta):
         self.steps_run += 1
         if self.disengage_counter is not None:
             self.disengage_counter -= time_delta
             if self.disengage_counter <= 0:
                 self.active = False
+
+    def remove_dead(self):
+        # Drops players that have died, and ends the combat if either side has nobody left
+        for team in self.players_by_team:
+            self.players_by_team[team] = [p for p in self.players_by_team[team] if p.is_alive()]
+        self.entities = [e for e in self.entities if e.is_alive() or not isinstance(e, Player)]
+        if len(self.players_by_team[Team.BLUE]) == 0 or len(self.players_by_team[Team.RED]) == 0:
+            self.active = False
+
+    def step(self, time_delta, is_damage_tick):
+        self.step_timers(time_delta)
         if not is_damage_tick:
             return self.active # Combat/damage is only applied every DAMAGE_TICK_TIME sim steps
 
@@ -57,12 +83,11 @@ class Combat:
             if entity.is_alive():
                 enemies = self.players_by_team[entity.team.enemy()]
                 if len(enemies) == 0:
-                    print("got empty enemies list")
-                    break
+                    break # The other side is gone, so the combat ends after this tick
                 if random.random() <= PLAYER_ATTACK_MISS_PROBABILITY:
                     continue # Incorporate some additional combat randomness via a miss probability
                 target = random.choice(enemies)
-                target.take_damage(entity.get_damage())
+                entity.attack(target)
                 if not target.is_alive():
                     enemies.remove(target)
                     to_remove.append(target)
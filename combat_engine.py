@@ -0,0 +1,206 @@
+"""
+Batched damage ticks for all active combats at once.
+Combat.step resolves a damage tick one entity at a time, with a miss roll, a random.choice of target and a take_damage
+for each. CombatEngine lays the attackers and targets of every combat out in arrays, rolls all misses and picks all
+targets with one vectorized RNG call each, looks mitigated damage up in a dense attacker x target matrix and writes each
+target's new health once.
+
+The arrays (who attacks which group of targets, and the damage matrix from the Map's MitigationCache) are built per
+combat, and joined into one set of arrays for all the active combats. Both are only rebuilt when a combat starts, ends
+or gains an entity, or when someone's effective stats are replaced (level up, items). Entities only leave a combat by
+dying, so instead of rebuilding, the joined arrays keep an alive flag per attacker, cleared once the EntityStore state
+column (the Map's store, or one the engine keeps for combats outside a Map) shows it out of combat. A tick only loops
+in Python over the waves, whose damage is rescaled by their health (as in Wave.get_damage), and over the targets that
+were hit.
+
+Damage within a tick is resolved simultaneously: every entity alive at the start of the tick attacks with its damage at
+the start of the tick, and targets are picked among the enemy players alive at the start of the tick. Combat.step
+instead skips attackers killed earlier in the same tick and stops picking targets as they die.
+"""
+from __future__ import annotations
+
+import random
+from typing import Optional, Sequence
+
+from CONSTANTS import PLAYER_ATTACK_MISS_PROBABILITY
+from combat import Combat
+from entity import Entity, EntityState, Team, Wave
+from entity_store import STATE_CODES, EntityStore
+from mitigation_cache import MitigationCache
+from player import Player
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class CombatLayout:
+    # Arrays for one combat. Its targets are laid out in two groups: its RED players (hit by BLUE) then its BLUE players (hit by RED)
+    def __init__(self, combat: Combat, mitigation: MitigationCache) -> None:
+        self.version = combat.version
+        red = [p for p in combat.players_by_team[Team.RED] if p.is_alive()]
+        blue = [p for p in combat.players_by_team[Team.BLUE] if p.is_alive()]
+        self.targets: list[Player] = red + blue
+        self.attackers: list[Entity] = [e for e in combat.entities if (e.team is Team.BLUE or e.team is Team.RED) and e.is_alive()]
+        is_blue = np.array([a.team is Team.BLUE for a in self.attackers], dtype=bool)
+        self.group_start = np.where(is_blue, 0, len(red)) # Relative to this combat's first target
+        self.group_size = np.where(is_blue, len(red), len(blue))
+        self.waves = np.array([i for i, a in enumerate(self.attackers) if isinstance(a, Wave)], dtype=int)
+        self.row_start = np.arange(len(self.attackers)) * len(self.targets) # Where each attacker's row of damage starts
+        attacker_index = {a: i for i, a in enumerate(self.attackers)}
+        self.target_attacker = np.array([attacker_index[t] for t in self.targets], dtype=int) # Targets attack too
+        self.read_stats(mitigation)
+
+    def read_stats(self, mitigation: MitigationCache):
+        self.stats_keys = [e.stats.stats_key for e in self.attackers + self.targets]
+        # Damage of attacker i to target j at full scale is at i * len(targets) + j
+        self.damage = mitigation.damage_matrix([a.stats for a in self.attackers], [t.stats for t in self.targets]).ravel()
+        self.max_health = np.array([self.attackers[i].stats.effective.health_stats.max_health for i in self.waves], dtype=float)
+
+    def stats_changed(self):
+        return any(e.stats.stats_key != key for e, key in zip(self.attackers + self.targets, self.stats_keys))
+
+class CombatBatch:
+    # The layouts of all the combats stepped together, joined into one set of arrays
+    def __init__(self, key: tuple, combats: Sequence[Combat], layouts: Sequence[CombatLayout], store: EntityStore) -> None:
+        self.key = key # (combat, combat.version) for each combat
+        self.layouts = layouts
+        self.attackers: list[Entity] = [a for layout in layouts for a in layout.attackers]
+        self.targets: list[Player] = [t for layout in layouts for t in layout.targets]
+        self.target_combat: list[Combat] = [combat for combat, layout in zip(combats, layouts) for _ in layout.targets]
+        attacker_counts = [len(layout.attackers) for layout in layouts]
+        first_target = np.cumsum([0] + [len(layout.targets) for layout in layouts[:-1]])
+        self.target_offset = np.repeat(first_target, attacker_counts) # Where each attacker's combat's targets start
+        self.group_start = np.concatenate([layout.group_start for layout in layouts]) # Relative to the attacker's combat
+        self.group_size = np.concatenate([layout.group_size for layout in layouts])
+        first_row = np.cumsum([0] + [len(layout.damage) for layout in layouts[:-1]]) # Where each combat's matrix starts in damage
+        self.row_start = np.concatenate([layout.row_start for layout in layouts]) + np.repeat(first_row, attacker_counts)
+        attacker_start = np.cumsum([0] + attacker_counts[:-1])
+        self.waves = np.concatenate([layout.waves + start for layout, start in zip(layouts, attacker_start)]).astype(int)
+        self.target_attacker = np.concatenate([layout.target_attacker + start for layout, start in zip(layouts, attacker_start)]).astype(int)
+        self.alive = np.ones(len(self.attackers), dtype=bool) # Cleared for good once an attacker leaves its combat
+        self.wave_entities = [self.attackers[i] for i in self.waves]
+        # Attackers are looked up in the store by slot. The slot's attach order is kept too, so an attacker that was
+        # taken out of the store (removed from the Map) never reads the state of whatever took over its slot
+        in_store = [a.store is store for a in self.attackers]
+        self.slots = np.array([a.store_slot if ok else 0 for a, ok in zip(self.attackers, in_store)], dtype=np.int64)
+        self.attach_order = np.where(in_store, store.order[self.slots], -1)
+        self.target_slots = self.slots[self.target_attacker]
+        self.read_stats(store)
+
+    def read_stats(self, store: EntityStore):
+        self.stats_version = store.stats_version
+        self.damage = np.concatenate([layout.damage for layout in self.layouts])
+        self.max_health = np.concatenate([layout.max_health for layout in self.layouts])
+
+    def get_scale(self):
+        # Multiplier on each attacker's damage this tick. Wave damage scales with the wave's health (Wave.get_damage)
+        scale = np.ones(len(self.attackers))
+        if len(self.waves) > 0:
+            scale[self.waves] = np.fromiter((w.stats.health for w in self.wave_entities), dtype=float, count=len(self.waves)) / self.max_health
+        return scale
+
+    def update_alive(self, store: EntityStore):
+        # Attackers that died since their combat's layout was built don't attack or get picked as targets. A player that
+        # respawns and joins the same combat again bumps its version, so the flags never need setting back
+        slots = self.slots
+        self.alive &= (store.state[slots] == STATE_CODES[EntityState.COMBAT]) & store.active[slots] & (store.order[slots] == self.attach_order)
+        return self.alive
+
+class CombatEngine:
+    def __init__(self, seed: Optional[int] = None, mitigation: Optional[MitigationCache] = None, store: Optional[EntityStore] = None) -> None:
+        assert np is not None, "CombatEngine requires numpy"
+        self.reseed(seed)
+        self.mitigation = mitigation if mitigation is not None else MitigationCache()
+        self.layouts: dict[Combat, CombatLayout] = {}
+        self.batch: Optional[CombatBatch] = None
+        # Without a store to read entity state from (the Map's), attackers are attached to one of the engine's own while
+        # they are in a batch
+        self.owns_store = store is None
+        self.store = EntityStore() if store is None else store
+        self.attached: set[Entity] = set()
+
+    def reseed(self, seed: Optional[int] = None):
+        # Seeded from the random module by default, so games seeded with random.seed stay reproducible
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+
+    def clone(self, mitigation: MitigationCache, store: Optional[EntityStore] = None) -> CombatEngine:
+        # Copy for Simulator.clone, with the same RNG state. Layouts are rebuilt for the copied combats when needed
+        new = CombatEngine(0, mitigation, store)
+        new.rng.bit_generator.state = self.rng.bit_generator.state
+        return new
+
+    def step(self, combats: Sequence[Combat], time_delta, is_damage_tick) -> list[bool]:
+        # Same as calling Combat.step on each combat. Returns whether each combat is still active
+        for combat in combats:
+            combat.step_timers(time_delta)
+        if is_damage_tick and len(combats) > 0:
+            self.resolve_damage_tick(combats)
+        return [combat.active for combat in combats]
+
+    def get_layout(self, combat: Combat) -> CombatLayout:
+        # Arrays are only rebuilt for combats that gained entities, or whose entities' stats were replaced
+        layout = self.layouts.get(combat)
+        if layout is None or layout.version != combat.version:
+            layout = self.layouts[combat] = CombatLayout(combat, self.mitigation)
+        elif layout.stats_changed():
+            layout.read_stats(self.mitigation)
+        return layout
+
+    def get_batch(self, combats: Sequence[Combat]) -> CombatBatch:
+        # The joined arrays are kept until the set of combats or any of their versions change
+        key = tuple((combat, combat.version) for combat in combats)
+        batch = self.batch
+        if batch is None or batch.key != key:
+            layouts = [self.get_layout(combat) for combat in combats]
+            self.layouts = {combat: layout for combat, layout in zip(combats, layouts)} # Forget combats that have ended
+            if self.owns_store:
+                self.attach([a for layout in layouts for a in layout.attackers])
+            batch = self.batch = CombatBatch(key, combats, layouts, self.store)
+        elif self.store.stats_version != batch.stats_version: # Someone's stats were replaced, maybe someone in a combat
+            for layout in batch.layouts:
+                if layout.stats_changed():
+                    layout.read_stats(self.mitigation)
+            batch.read_stats(self.store)
+        return batch
+
+    def attach(self, attackers: Sequence[Entity]):
+        # Keeps exactly the attackers of the current batch in the engine's own store
+        attackers_set = set(attackers)
+        for entity in self.attached - attackers_set:
+            self.store.detach(entity)
+        for entity in attackers_set - self.attached:
+            if entity.store is None:
+                self.store.attach(entity)
+        self.attached = {e for e in attackers_set if e.store is self.store}
+
+    def resolve_damage_tick(self, combats: Sequence[Combat]):
+        batch = self.get_batch(combats)
+        attackers, targets, target_combat = batch.attackers, batch.targets, batch.target_combat
+        if len(attackers) == 0 or len(targets) == 0:
+            return
+        alive = batch.update_alive(self.store)
+        # Number of live targets before each target, to count and pick the live enemies in each attacker's group
+        alive_before = np.concatenate([[0], np.cumsum(alive[batch.target_attacker])])
+        group_start = batch.target_offset + batch.group_start
+        alive_in_group = alive_before[group_start + batch.group_size] - alive_before[group_start]
+
+        hits = alive & (self.rng.random(len(attackers)) > PLAYER_ATTACK_MISS_PROBABILITY) & (alive_in_group > 0)
+        # Uniform choice among the live targets within each attacker's group of enemies
+        pick = alive_before[group_start] + (self.rng.random(len(attackers)) * alive_in_group).astype(int)
+        target = np.searchsorted(alive_before, pick[hits] + 1) - 1
+        combat_target = target - batch.target_offset[hits]
+        incoming = np.zeros(len(targets))
+        np.add.at(incoming, target, batch.damage[batch.row_start[hits] + combat_target] * batch.get_scale()[hits])
+
+        lost_players: list[Combat] = []
+        hit_targets = np.nonzero(incoming)[0]
+        health = self.store.health[batch.target_slots[hit_targets]] # Only live targets are hit, and they are all in the store
+        for i, new_health in zip(hit_targets.tolist(), np.maximum(health - incoming[hit_targets], 0).tolist()):
+            targets[i].set_health(new_health)
+            if new_health <= 0:
+                alive[batch.target_attacker[i]] = False
+                if target_combat[i] not in lost_players:
+                    lost_players.append(target_combat[i])
+        for combat in lost_players:
+            combat.remove_dead()
@@ -0,0 +1,163 @@
+"""
+Monte Carlo estimate of how a Combat between a set of entities would end, without running a Simulator.
+Trials follow the same model as Combat.step: every damage tick each living participant in turn misses with
+PLAYER_ATTACK_MISS_PROBABILITY, or hits a random living enemy player, and players that die stop being targets straight
+away. The combat ends once a side has no players left. Thousands of trials run at once, as arrays with one row per trial.
+
+Disengaging, respawns and anyone joining mid fight are not modelled. Results are kept in an LRU cache keyed on the
+participants' quantized stats and health, so repeated queries about similar fights don't rerun the trials.
+"""
+from __future__ import annotations
+
+import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Sequence
+
+from CONSTANTS import DAMAGE_APPLY_INTERVAL, PLAYER_ATTACK_MISS_PROBABILITY
+from entity import Entity, Team, Wave
+from player import Player
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TRIALS = 2000
+DEFAULT_CACHE_SIZE = 4096
+MAX_ESTIMATE_TICKS = 500 # Trials still going after this many damage ticks count as draws
+
+# Health and stats are rounded to these steps for the cache key, and the trials are run on the rounded values
+HEALTH_QUANTUM = 5
+STAT_QUANTUM = 0.5
+
+@dataclass(frozen=True)
+class CombatantKey:
+    team: Team
+    is_player: bool
+    is_wave: bool # Wave damage scales with health
+    health: float
+    max_health: float
+    physical_damage: float
+    magic_damage: float
+    true_damage: float
+    armor: float
+    magic_resist: float
+
+@dataclass(frozen=True)
+class CombatEstimate:
+    # Shared by every query that hits the same cache entry, so it can't be modified
+    win_probability: Mapping[Team, float] # Chance each team is the one left with players. The rest is draws (read only)
+    expected_health: tuple[float, ...] # Mean health left for each participant, in the order given
+    expected_ticks: float # Mean damage ticks until the combat ends (draws count as MAX_ESTIMATE_TICKS)
+    trials: int
+
+    @property
+    def expected_duration(self) -> float:
+        # Nominal simulated seconds until the combat ends
+        return self.expected_ticks * DAMAGE_APPLY_INTERVAL
+
+def quantize(value, quantum):
+    return round(value / quantum) * quantum
+
+def combatant_key(entity: Entity) -> CombatantKey:
+    effective = entity.stats.effective
+    damage, health_stats = effective.damage_stats, effective.health_stats
+    return CombatantKey(
+        entity.team,
+        isinstance(entity, Player),
+        isinstance(entity, Wave),
+        quantize(entity.stats.health, HEALTH_QUANTUM),
+        quantize(health_stats.max_health, HEALTH_QUANTUM),
+        quantize(damage.physical_damage, STAT_QUANTUM),
+        quantize(damage.magic_damage, STAT_QUANTUM),
+        quantize(damage.true_damage, STAT_QUANTUM),
+        quantize(health_stats.armor, STAT_QUANTUM),
+        quantize(health_stats.magic_resist, STAT_QUANTUM),
+    )
+
+def run_trials(keys: Sequence[CombatantKey], trials: int, rng) -> CombatEstimate:
+    health = np.tile(np.array([k.health for k in keys], dtype=float), (trials, 1))
+    max_health = np.array([max(k.max_health, 1e-9) for k in keys])
+    is_player = np.array([k.is_player and k.team in (Team.BLUE, Team.RED) for k in keys])
+    team_blue = np.array([k.team is Team.BLUE for k in keys])
+    # Damage dealt by i to j at full health, after j's armor and magic resist
+    effective = np.array([[
+        a.physical_damage * 100 / (100 + b.armor) + a.magic_damage * 100 / (100 + b.magic_resist) + a.true_damage
+        for b in keys] for a in keys
+    ])
+    enemies = [np.nonzero(is_player & (team_blue != (k.team is Team.BLUE)))[0] for k in keys]
+    attacks = [i for i, k in enumerate(keys) if k.team in (Team.BLUE, Team.RED)]
+
+    ticks = np.zeros(trials)
+    running = np.ones(trials, dtype=bool)
+    for _ in range(MAX_ESTIMATE_TICKS):
+        alive = health > 0
+        blue_left = (alive & is_player & team_blue).any(axis=1)
+        red_left = (alive & is_player & ~team_blue).any(axis=1)
+        running &= blue_left & red_left
+        if not running.any():
+            break
+        ticks[running] += 1
+        in_tick = running.copy()
+        for i in attacks:
+            targets = enemies[i]
+            attacker_alive = health[:, i] > 0
+            if len(targets) == 0:
+                in_tick &= ~attacker_alive
+                continue
+            # As in Combat.step, a living attacker with no enemies left ends the tick
+            target_alive = health[:, targets] > 0
+            in_tick &= ~(attacker_alive & ~target_alive.any(axis=1))
+            # Misses, dead attackers and trials out of this tick don't hit. Each hit picks a living enemy uniformly
+            attacking = in_tick & attacker_alive & (rng.random(trials) > PLAYER_ATTACK_MISS_PROBABILITY)
+            choice = targets[np.argmax(np.where(target_alive, rng.random((trials, len(targets))), -1), axis=1)]
+            scale = health[:, i] / max_health[i] if keys[i].is_wave else 1
+            rows = np.nonzero(attacking)[0]
+            damage = (effective[i, choice] * scale)[rows]
+            health[rows, choice[rows]] = np.maximum(health[rows, choice[rows]] - damage, 0)
+
+    alive = health > 0
+    blue_won = (alive & is_player & team_blue).any(axis=1) & ~(alive & is_player & ~team_blue).any(axis=1)
+    red_won = (alive & is_player & ~team_blue).any(axis=1) & ~(alive & is_player & team_blue).any(axis=1)
+    return CombatEstimate(
+        MappingProxyType({Team.BLUE: float(blue_won.mean()), Team.RED: float(red_won.mean())}),
+        tuple(health.mean(axis=0).tolist()),
+        float(ticks.mean()),
+        trials,
+    )
+
+class CombatEstimator:
+    """
+    Answers "who wins this combat, and with how much health left?" for a set of participants, with an LRU cache of
+    previous answers. The same participants in a different order are a different query, as order matters in Combat.step
+    """
+    def __init__(self, trials: int = DEFAULT_TRIALS, cache_size: int = DEFAULT_CACHE_SIZE, seed: Optional[int] = None) -> None:
+        assert np is not None, "CombatEstimator requires numpy"
+        assert trials > 0 and cache_size > 0, "Need at least one trial and one cache entry"
+        self.trials = trials
+        self.cache_size = cache_size
+        # Seeded from the random module by default, so games seeded with random.seed stay reproducible
+        self.rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+        self.cache: OrderedDict[tuple[CombatantKey, ...], CombatEstimate] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def estimate(self, entities: Sequence[Entity]) -> CombatEstimate:
+        key = tuple(combatant_key(e) for e in entities)
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return result
+        self.misses += 1
+        result = run_trials(key, self.trials, self.rng)
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+        self.hits, self.misses = 0, 0
@@ -8,6 +8,7 @@ from typing import Optional, Tuple
 from CONSTANTS import COMBAT_START_THRESHOLD
 from combat import Combat
 from entity import EntityState, LaneEntity
+from events import ItemPurchase, RecallStarted
 from item import ALL_ITEMS, Item
 from player import Player
 from sim import Simulator
@@ -64,6 +65,7 @@ class InputAction:
     source_entry: ActionEntry
     player: Optional[Player] = None
     position: Optional[Tuple[float, float]] = None
+    item_name: Optional[str] = None # Used by BUY_ITEM. If not given, the item (and player) are read from stdin
 
 @dataclass
 class AvailableActions:
@@ -71,8 +73,8 @@ class AvailableActions:
     map_actions: list[ActionEntry]
 
 class Controller:
-    def __init__(self) -> None:
-        self.sim = Simulator()
+    def __init__(self, sim: Optional[Simulator] = None) -> None:
+        self.sim = sim if sim is not None else Simulator()
     
     def get_all_available_actions(self):
         all_available = AvailableActions([], [])
@@ -120,7 +122,9 @@ class Controller:
             action.player.set_path_target(action.position)
         elif action.source_entry.type == ActionType.START_RECALL:
             assert action.player is not None, "Tried to recall without player specified"
-            action.player.start_recall()
+            started = action.player.start_recall()
+            if self.sim.map.events is not None:
+                self.sim.map.events.emit(RecallStarted(action.player.player_id, started))
         elif action.source_entry.type == ActionType.STOP_RECALL:
             assert action.player is not None, "Tried to stop recall without player specified"
             action.player.stop_recall()
@@ -141,17 +145,20 @@ class Controller:
             assert action.source_entry.combat is not None, "Tried to start disengage combat without combat specified"
             action.source_entry.combat.start_disengage()
         elif action.source_entry.type == ActionType.BUY_ITEM:
-            item = ALL_ITEMS[input("enter item")]
+            item_name = action.item_name if action.item_name is not None else input("enter item")
+            item = ALL_ITEMS.get(item_name)
+            player = action.player if action.player is not None else self.sim.map.get_player_by_id(input("enter player id"))
             if item is None:
-                print("could not find item")
-            player = self.sim.map.get_player_by_id(input("enter player id"))
-            if player is None:
-                print("could not find player")
+                reason = "could not find item"
+            elif player is None:
+                reason = "could not find player"
             elif not player.at_spawn():
-                print("could not buy item - not at spawn")
-            elif player.buy(item):
-                print("bought item")
+                reason = "not at spawn"
             else:
-                print("could not buy item - other reason")
+                reason = player.inventory.buy_failure_reason(item)
+                if reason is None and not player.buy(item):
+                    reason = "other reason"
+            if self.sim.map.events is not None:
+                self.sim.map.events.emit(ItemPurchase(None if player is None else player.player_id, item_name, reason is None, reason))
         else:
             assert False, "Unknown action type specified"
\ No newline at end of file
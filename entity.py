@@ -1,16 +1,27 @@
 from enum import Enum
 import math
-from typing import Optional, Tuple, Union
+from typing import TYPE_CHECKING, Optional, Tuple, Union
 
 from CONSTANTS import DEFAULT_WAVE_REWARD, TARGET_LOC_THRESHOLD
-from stats import AllStats, DamageStats, DynamicStats
+from stats import AllStats, DamageStats, DynamicStats, mitigated_damage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from entity_store import EntityStore
+    from mitigation_cache import MitigationCache
+    from spatial_index import SpatialHashGrid
 
 # Constants
 DEFAULT_WAVE_HEALTH = 100
 CANNON_WAVE_HEALTH = 125
 
-def GET_DEFAULT_WAVE_STATS(isCannon=False):
-    return DynamicStats.make_stats(CANNON_WAVE_HEALTH if isCannon else DEFAULT_WAVE_HEALTH, 7, 20, 0, 15)
+def GET_DEFAULT_WAVE_STATS(isCannon=False, size=1.0):
+    # size scales the health and damage of the wave
+    return DynamicStats.make_stats((CANNON_WAVE_HEALTH if isCannon else DEFAULT_WAVE_HEALTH) * size, 7 * size, 20, 0, 15)
 
 def GET_DEFAULT_TURRET_STATS():
     return DynamicStats.make_stats(500, 25, 50, 0, 0)
@@ -41,15 +52,25 @@ class Entity:
         self.path: Optional[Path] = None
         self.team = team 
         self.attacking: Optional[Entity] = None
+        self.entity_id: Optional[int] = None # Assigned by the EntityRegistry when added to the Map
+        self.spatial_index: Optional[SpatialHashGrid] = None # Set by the Map when the entity is added to it
+        self.store: Optional[EntityStore] = None # Set when attached to an EntityStore
+        self.store_slot: Optional[int] = None
+        self.mitigation: Optional[MitigationCache] = None # Set by the Map when the entity is added to it
 
     def move(self, time_delta):
         if self.path is None:
             return
         dist = self.get_speed() * time_delta
-        self.position = self.path.move(self.position, dist)
+        self.set_pos(self.path.move(self.position, dist))
     
     def set_pos(self, pos):
+        # All position changes should go through here so the spatial index stays in sync
         self.position = pos
+        if self.spatial_index is not None:
+            self.spatial_index.update(self)
+        if self.store is not None:
+            self.store.write_position(self.store_slot, pos)
 
     def is_alive(self):
         return self._state not in [EntityState.DEAD, EntityState.RESPAWNING, EntityState.FINISHED]
@@ -57,14 +78,38 @@ class Entity:
     def get_damage(self) -> DamageStats:
         return self.stats.effective.damage_stats
 
+    def damage_scale(self):
+        # Multiplier on this entity's damage stats when it attacks
+        return 1
+
+    def damage_against(self, target: "Entity"):
+        # Damage this entity's attack would do to target after armor and magic resist, from the Map's cache if there is one
+        if self.mitigation is not None:
+            return self.mitigation.damage(self.stats, self.damage_scale(), target.stats)
+        return mitigated_damage(self.stats.vector, self.damage_scale(), target.stats.vector)
+
+    def attack(self, target: "Entity"):
+        # Same as target.take_damage(self.get_damage()), but without building any stats objects
+        return target.take_mitigated_damage(self.damage_against(target))
+
     def take_damage(self, damage: DamageStats):
-        effective_damage = self.stats.take_damage(damage)
-        if self.stats.health <= 0:
-            self.set_state(EntityState.DEAD)
+        return self.take_mitigated_damage(self.stats.effective.get_effective_damage(damage))
+
+    def take_mitigated_damage(self, effective_damage):
+        # Damage that armor and magic resist have already been applied to
+        self.set_health(max(self.stats.health - effective_damage, 0))
         return effective_damage
 
+    def set_health(self, health):
+        # Health changes from damage go through here so deaths are noticed
+        self.stats.health = health
+        if health <= 0:
+            self.set_state(EntityState.DEAD)
+
     def set_state(self, state: EntityState):
         self._state = state
+        if self.store is not None:
+            self.store.write_state(self.store_slot, state)
 
     def distance_to_entity(self, other):
         dx = self.position[0] - other.position[0]
@@ -77,24 +122,93 @@ class Entity:
         return math.hypot(dx, dy)
 
     def get_speed(self):
-        return self.stats.effective.move_speed
+        return self.stats.vector.move_speed
 
     def get_health(self):
         return self.stats.health
     
     def get_max_health(self):
-        return self.stats.effective.health_stats.max_health
+        return self.stats.vector.max_health
     
+    def clone(self) -> "Entity":
+        # Copy of this entity's own state, for Simulator.clone. References to other entities are swapped for their
+        # copies afterwards by link_clone, and the Map points the copy at its own indexes
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.stats = self.stats.clone()
+        if new.stats.owner is not None:
+            new.stats.owner = new
+        return new
+
+    def link_clone(self, clones: dict["Entity", "Entity"]):
+        # Called on a copy made by clone, with the copy of every entity of the original Simulator
+        if self.attacking is not None:
+            self.attacking = clone_of(clones, self.attacking)
+        if self.path is not None:
+            self.path = self.path.clone(clones)
+
     def __repr__(self) -> str:
-        return f"[{type(self)}] team={self.team.name} health={self.stats.health} / {self.stats.effective.health_stats.max_health}"
+        return f"[{type(self)}] team={self.team.name} health={self.stats.health} / {self.stats.vector.max_health}"
 
 PathTarget = Union[Entity, Tuple[float, float]]
 
+def clone_of(clones: dict[Entity, Entity], entity: Entity) -> Entity:
+    # The copy of entity in a Simulator.clone. Entities no longer on the map (say a dead wave something still targets)
+    # are copied the first time they come up
+    new = clones.get(entity)
+    if new is None:
+        new = clones[entity] = entity.clone()
+        new.link_clone(clones)
+    return new
+
+# Helpers for working out how many upcoming steps are guaranteed to be free of events (see Simulator.advance_until).
+# They err on the side of returning fewer steps, so that float rounding can never skip over an event
+
+def steps_until_contact(distance, threshold, closing_speed, time_delta):
+    # Steps that can run before two things `distance` apart, closing at no more than `closing_speed`, get within `threshold`.
+    # The margin of two steps covers float rounding in the positions
+    if distance <= threshold:
+        return 0
+    if closing_speed <= 0:
+        return math.inf
+    return max(0, math.floor((distance - threshold) / (closing_speed * time_delta)) - 2)
+
+def steps_until_expired(timer, time_delta):
+    # Steps that can run before a timer decremented by time_delta each step reaches zero, using the same float arithmetic
+    steps = 0
+    while timer > 0:
+        timer -= time_delta
+        steps += 1
+    return max(0, steps - 1)
+
+# Below this many additions a Python loop is quicker than numpy
+REPEAT_ADD_NUMPY_MIN = 64
+
+def repeat_add(value, increment, times):
+    # value with increment added to it `times` times, rounded after every addition as a loop doing it would be. Skipped
+    # steps use this so they end up with exactly the same floats as stepping (value + increment * times can differ)
+    if np is None or times < REPEAT_ADD_NUMPY_MIN:
+        for _ in range(times):
+            value += increment
+        return value
+    terms = np.full(times + 1, increment, dtype=float)
+    terms[0] = value
+    return float(np.add.accumulate(terms)[-1]) # accumulate adds one term at a time, unlike sum
+
 class Path:
     def __init__(self, target: PathTarget, reached_target_callback = None):
         self.target: PathTarget = target
         self.reached_target_callback = reached_target_callback
 
+    def clone(self, clones: dict[Entity, Entity]) -> "Path":
+        # Copy for Simulator.clone, following an entity target and re-binding a callback bound to an entity
+        target = clone_of(clones, self.target) if isinstance(self.target, Entity) else self.target
+        callback = self.reached_target_callback
+        owner = getattr(callback, "__self__", None)
+        if isinstance(owner, Entity):
+            callback = getattr(clone_of(clones, owner), callback.__name__)
+        return Path(target, callback)
+
     def get_target_pos(self):
         if isinstance(self.target, Entity):
             return self.target.position
@@ -120,26 +234,37 @@ class Path:
             new_y = current_pos[1] + dir_vec[1] * speed
         return (new_x, new_y)
 
+    def advance(self, current_pos, speed, steps):
+        # Where `steps` calls of move() take an entity, for steps that don't reach the target. The direction is worked
+        # out again at every step as move() does, so this can't be shortcut without changing the positions
+        for _ in range(steps):
+            current_pos = self.move(current_pos, speed)
+        return current_pos
+
 class Wave(Entity):
     def __init__(self, position, stats, team):
         super().__init__(position, stats, team=team)
         self.accumulated_reward = 0
 
     @staticmethod
-    def default_wave(wave_num, team: Team):
-        stats = GET_DEFAULT_WAVE_STATS(wave_num % 3 == 2)
+    def default_wave(wave_num, team: Team, size=1.0):
+        stats = GET_DEFAULT_WAVE_STATS(wave_num % 3 == 2, size)
         return Wave((0, 0), stats, team)
     
     def get_health_fraction(self):
-        return  (self.stats.health / self.stats.effective.health_stats.max_health)
+        return  (self.stats.health / self.stats.vector.max_health)
+
+    def damage_scale(self):
+        return self.get_health_fraction()
 
     def get_damage(self):
-        return super().get_damage() * self.get_health_fraction()
+        return super().get_damage() * self.damage_scale()
     
-    def take_damage(self, amount):
-        effective_damage = super().take_damage(amount)
+    def take_mitigated_damage(self, effective_damage):
+        super().take_mitigated_damage(effective_damage)
         reward = effective_damage * DEFAULT_WAVE_REWARD / DEFAULT_WAVE_HEALTH
         self.accumulated_reward += reward
+        return effective_damage
 
     def accept_reward(self):
         rew = self.accumulated_reward
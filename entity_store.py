@@ -0,0 +1,159 @@
+"""
+Optional struct-of-arrays store for entity state, backed by numpy.
+Each attached entity owns a slot in contiguous x/y/health/max_health/team/state arrays so that distance and threshold
+checks over many entities can run as single vectorized operations.
+
+Entities keep their Python attributes for cheap scalar reads and act as views onto their slot: position and state are
+written through to the store by Entity.set_pos/set_state, and health and max health by DynamicStats whenever they
+change (damage, healing, regen, level ups, items, waves merging). Bulk health operations should call push_health()
+after modifying the health column.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from entity import Entity, EntityState, Team
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STATE_CODES: dict[EntityState, int] = {state: i for i, state in enumerate(EntityState)}
+TEAM_CODES: dict[Team, int] = {team: i for i, team in enumerate(Team)}
+
+DEFAULT_CAPACITY = 64
+
+class EntityStore:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        assert np is not None, "EntityStore requires numpy"
+        self.capacity = 0
+        self.size = 0 # High water mark of used slots. Only slots below this can be active
+        self.entities: list[Optional[Entity]] = []
+        self.free_slots: list[int] = []
+        self.next_order = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.health = np.zeros(0)
+        self.max_health = np.zeros(0)
+        self.team = np.zeros(0, dtype=np.int8)
+        self.state = np.zeros(0, dtype=np.int8)
+        self.active = np.zeros(0, dtype=bool)
+        self.order = np.zeros(0, dtype=np.int64) # Attach order, used to return results in the same order as Map.entities
+        # Bumped whenever an attached entity's effective stats are replaced, so a cache of stats keys only needs to check
+        # them again once this has changed (see combat_engine.py)
+        self.stats_version = 0
+        self._grow(capacity)
+
+    def _grow(self, new_capacity):
+        extra = new_capacity - self.capacity
+        self.x = np.concatenate([self.x, np.zeros(extra)])
+        self.y = np.concatenate([self.y, np.zeros(extra)])
+        self.health = np.concatenate([self.health, np.zeros(extra)])
+        self.max_health = np.concatenate([self.max_health, np.zeros(extra)])
+        self.team = np.concatenate([self.team, np.zeros(extra, dtype=np.int8)])
+        self.state = np.concatenate([self.state, np.zeros(extra, dtype=np.int8)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.order = np.concatenate([self.order, np.zeros(extra, dtype=np.int64)])
+        self.entities.extend([None] * extra)
+        self.capacity = new_capacity
+
+    def clone(self, clones: dict[Entity, Entity]) -> EntityStore:
+        # Copy for Simulator.clone, holding the copies of the entities in the same slots
+        new = object.__new__(EntityStore)
+        new.__dict__.update(self.__dict__)
+        for name in ("x", "y", "health", "max_health", "team", "state", "active", "order"):
+            setattr(new, name, getattr(self, name).copy())
+        new.entities = [None if e is None else clones[e] for e in self.entities]
+        new.free_slots = list(self.free_slots)
+        return new
+
+    def attach(self, entity: Entity):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+            slot = self.size
+            self.size += 1
+        self.entities[slot] = entity
+        self.active[slot] = True
+        self.order[slot] = self.next_order
+        self.next_order += 1
+        self.team[slot] = TEAM_CODES[entity.team]
+        entity.store = self
+        entity.store_slot = slot
+        entity.stats.owner = entity
+        self.write_position(slot, entity.position)
+        self.write_state(slot, entity._state)
+        self.write_health(slot, entity.get_health(), entity.get_max_health())
+
+    def detach(self, entity: Entity):
+        slot = entity.store_slot
+        if entity.store is not self or slot is None:
+            return
+        self.entities[slot] = None
+        self.active[slot] = False
+        self.free_slots.append(slot)
+        entity.store = None
+        entity.store_slot = None
+        entity.stats.owner = None
+
+    def write_position(self, slot, position):
+        self.x[slot] = position[0]
+        self.y[slot] = position[1]
+
+    def write_state(self, slot, state: EntityState):
+        self.state[slot] = STATE_CODES[state]
+
+    def write_health(self, slot, health, max_health):
+        self.health[slot] = health
+        self.max_health[slot] = max_health
+
+    def push_health(self):
+        # Write the (possibly modified) health column back into the entities' stats
+        for slot in np.flatnonzero(self.active[:self.size]):
+            self.entities[slot].stats.health = float(self.health[slot])
+
+    def slots_of(self, entities: Sequence[Entity]):
+        return np.fromiter((e.store_slot for e in entities), dtype=np.int64, count=len(entities))
+
+    def in_order(self, slots) -> list[Entity]:
+        slots = slots[np.argsort(self.order[slots], kind="stable")]
+        return [self.entities[slot] for slot in slots]
+
+    def find_in_range(self, position, range_dist, exclude: Optional[Entity] = None, team: Optional[Team] = None, state: Optional[EntityState] = None) -> list[Entity]:
+        # Vectorized equivalent of Map.find_entities_in_range over every attached entity
+        n = self.size
+        mask = self.active[:n] & (self.state[:n] != STATE_CODES[EntityState.DEAD])
+        if team is not None:
+            mask &= self.team[:n] == TEAM_CODES[team]
+        if state is not None:
+            mask &= self.state[:n] == STATE_CODES[state]
+        mask &= np.hypot(self.x[:n] - position[0], self.y[:n] - position[1]) <= range_dist
+        if exclude is not None and exclude.store is self:
+            mask[exclude.store_slot] = False
+        return self.in_order(np.flatnonzero(mask))
+
+    def stats_replaced(self, slot, max_health):
+        self.max_health[slot] = max_health
+        self.stats_version += 1
+
+    def pairwise_distances(self, slots_a, slots_b):
+        dx = self.x[slots_a][:, None] - self.x[slots_b][None, :]
+        dy = self.y[slots_a][:, None] - self.y[slots_b][None, :]
+        return np.hypot(dx, dy)
+
+    def pairs_within(self, slots_a, slots_b, threshold):
+        # Boolean matrix of shape (len(slots_a), len(slots_b)), True where the pair is within threshold
+        return self.pairwise_distances(slots_a, slots_b) <= threshold
+
+    def points_within(self, points, slots, threshold):
+        # Same as pairs_within, but the first axis is arbitrary (x, y) points (e.g. wards) rather than store slots
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        dx = points[:, 0][:, None] - self.x[slots][None, :]
+        dy = points[:, 1][:, None] - self.y[slots][None, :]
+        return np.hypot(dx, dy) <= threshold
+
+    def __len__(self):
+        return self.size - len(self.free_slots)
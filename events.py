@@ -0,0 +1,130 @@
+"""
+In-memory log of notable game events (combats, kills, purchases, recalls, turret deaths, wave merges), kept in a ring
+buffer of the most recent DEFAULT_EVENT_CAPACITY records per Simulator. Analytics and the UI can read the buffer or
+subscribe to events as they happen, rather than parsing stdout.
+
+Every Simulator has a log at sim.map.events. Simulator.disable_events() sets it to None everywhere, and code that emits
+events checks for None before building a record, so a disabled log costs nothing beyond that check.
+"""
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+
+from entity import Team
+
+DEFAULT_EVENT_CAPACITY = 1024
+
+@dataclass
+class Event:
+    # sim_step is filled in by EventLog.emit when not given
+    pass
+
+@dataclass
+class CombatStarted(Event):
+    position: Tuple[float, float]
+    participants: int
+    sim_step: Optional[int] = None
+
+@dataclass
+class CombatEnded(Event):
+    position: Tuple[float, float]
+    steps_run: int
+    sim_step: Optional[int] = None
+
+@dataclass
+class PlayerKilled(Event):
+    player_id: str
+    team: Team # Team of the player that died
+    sim_step: Optional[int] = None
+
+@dataclass
+class TurretDestroyed(Event):
+    team: Team # Team the turret belonged to
+    position: Tuple[float, float]
+    sim_step: Optional[int] = None
+
+@dataclass
+class ItemPurchase(Event):
+    player_id: Optional[str]
+    item_name: str
+    bought: bool
+    reason: Optional[str] = None # Why the purchase failed
+    sim_step: Optional[int] = None
+
+@dataclass
+class RecallStarted(Event):
+    player_id: str
+    started: bool # False if the player couldn't recall (moving, attacking or not in the NORMAL state)
+    sim_step: Optional[int] = None
+
+@dataclass
+class WavesMerged(Event):
+    team: Team
+    position: Tuple[float, float] # Position of the wave the others merged into
+    health: float # Health of the merged wave
+    sim_step: Optional[int] = None
+
+@dataclass
+class TreeNavigationFailed(Event):
+    # Emitted by GameTree when there is no node to move to
+    direction: str # "down" or "up"
+    sim_step: Optional[int] = None
+
+EventCallback = Callable[[Event], None]
+
+class EventLog:
+    def __init__(self, capacity: int = DEFAULT_EVENT_CAPACITY) -> None:
+        assert capacity > 0, "Event log needs room for at least one event"
+        self.buffer: deque[Event] = deque(maxlen=capacity)
+        self.sim_step = 0 # Kept up to date by the Simulator
+        self.subscribers: list[Tuple[EventCallback, Optional[Tuple[type, ...]]]] = []
+
+    def clone(self) -> EventLog:
+        # Copy for Simulator.clone. Events are never modified once emitted, so they are shared. As with copies made by
+        # deepcopy or pickle, the copy starts without subscribers
+        new = EventLog(self.buffer.maxlen or DEFAULT_EVENT_CAPACITY)
+        new.buffer.extend(self.buffer)
+        new.sim_step = self.sim_step
+        return new
+
+    def emit(self, event: Event):
+        if getattr(event, "sim_step", None) is None:
+            event.sim_step = self.sim_step # type: ignore every concrete event has a sim_step field
+        self.buffer.append(event)
+        for callback, event_types in self.subscribers:
+            if event_types is None or isinstance(event, event_types):
+                callback(event)
+
+    def subscribe(self, callback: EventCallback, event_types: Optional[Sequence[type]] = None) -> EventCallback:
+        # Calls callback with every event emitted from now on (only those of the given types, if any). Returns the
+        # callback, for unsubscribe
+        self.subscribers.append((callback, None if event_types is None else tuple(event_types)))
+        return callback
+
+    def unsubscribe(self, callback: EventCallback):
+        self.subscribers = [(c, types) for c, types in self.subscribers if c is not callback]
+
+    def events(self, event_type: Optional[type] = None) -> list[Event]:
+        # The buffered events, oldest first
+        return [e for e in self.buffer if event_type is None or isinstance(e, event_type)]
+
+    def clear(self):
+        self.buffer.clear()
+
+    def __iter__(self) -> Iterator[Event]:
+        return iter(self.buffer)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getstate__(self):
+        # Subscribers belong to whoever is watching this particular log, so copies and snapshots start without any
+        state = self.__dict__.copy()
+        state["subscribers"] = []
+        return state
+
+def print_events(event: Event):
+    # Subscriber that prints each event, for interactive use
+    print(event)
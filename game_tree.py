@@ -1,15 +1,15 @@
 """
 Implementation of a game tree-like functionality for using the simulator
-The approach is to use deepcopy to take snapshots of the simulator
+The approach is to use Simulator.clone to take snapshots of the simulator
 In terms of how this relates to user actions, the snapshot should be taken immediately before the action
 """
 from __future__ import annotations
 
-from copy import deepcopy
 from dataclasses import dataclass, field
 from enum import Enum
 from itertools import count
 from typing import Any, Callable, Optional
+from events import EventLog, TreeNavigationFailed
 from sim import Simulator
 
 @dataclass
@@ -43,11 +43,12 @@ def _action_callback(callback):
 class GameTree:
     next_node_id = 0
     def __init__(self, root: Simulator) -> None:
-        self.root = StateNode(id=-1, sim=deepcopy(root))
+        self.root = StateNode(id=-1, sim=root.clone())
         self.cur_node: StateNode = self.root
+        self.events = EventLog() # Navigation events. Each node's sim keeps its own game events
 
     def get_current_sim_state(self) -> Simulator:
-        return deepcopy(self.cur_node.sim)
+        return self.cur_node.sim.clone()
 
     @_action_callback
     def switch_to_state(self, state_id) -> Simulator:
@@ -56,7 +57,7 @@ class GameTree:
             if child.id == state_id:
                 switch_to_node = child
         if switch_to_node is None:
-            print("failed to go down tree")
+            self.events.emit(TreeNavigationFailed("down", self.cur_node.sim.sim_step))
         else:
             self.cur_node = switch_to_node
         return self.cur_node.sim
@@ -66,14 +67,14 @@ class GameTree:
         if self.cur_node.parent_node is not None:
             self.cur_node = self.cur_node.parent_node
         else:
-            print("failed to go up tree")
+            self.events.emit(TreeNavigationFailed("up", self.cur_node.sim.sim_step))
         return self.cur_node.sim
     
     @_action_callback
     def add_node(self, sim: Simulator):
         assert sim.sim_step > self.cur_node.sim.sim_step, f"Cannot add a node at an earlier or same sim step (got {sim.sim_step} expected > {self.cur_node.sim.sim_step})"
 
-        new_node = StateNode(id=GameTree.next_node_id, sim=deepcopy(sim), parent_node=self.cur_node)
+        new_node = StateNode(id=GameTree.next_node_id, sim=sim.clone(), parent_node=self.cur_node)
         GameTree.next_node_id += 1
         self.cur_node.add_child(new_node)
         self.cur_node = new_node
@@ -0,0 +1,146 @@
+"""
+Headless batch runner for the simulator.
+Plays games at full CPU speed with scripted action schedules applied through the Controller.
+This module (and everything it imports) must not import pygame/tkinter/fonts, so it can be used from worker processes without a display.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Tuple
+
+from CONSTANTS import SIM_STEPS_PER_SECOND
+from controller import ActionEntry, ActionType, Controller, InputAction
+from sim import Simulator
+
+# Actions that are applied to the map as a whole rather than being offered per player by the Controller
+MAP_ACTION_TYPES = [ActionType.BUY_ITEM, ActionType.DISENGAGE_COMBAT]
+
+@dataclass
+class ScheduledAction:
+    # An action to apply immediately before the simulator runs step `sim_step`
+    sim_step: int
+    type: ActionType
+    player_id: Optional[str] = None
+    position: Optional[Tuple[float, float]] = None
+    item_name: Optional[str] = None
+
+ActionSchedule = Sequence[ScheduledAction]
+
+@dataclass
+class GameResult:
+    steps: int
+    sim_time: float
+    wall_time: float
+    applied_actions: int
+    skipped_actions: int # Actions that were not available to the player at their scheduled step
+
+    @property
+    def steps_per_second(self):
+        return self.steps / self.wall_time if self.wall_time > 0 else float("inf")
+
+@dataclass
+class BatchResult:
+    games: list[GameResult] = field(default_factory=list)
+
+    @property
+    def steps(self):
+        return sum(g.steps for g in self.games)
+
+    @property
+    def wall_time(self):
+        return sum(g.wall_time for g in self.games)
+
+    @property
+    def steps_per_second(self):
+        return self.steps / self.wall_time if self.wall_time > 0 else float("inf")
+
+    def __repr__(self) -> str:
+        return f"BatchResult(games={len(self.games)}, steps={self.steps}, wall_time={self.wall_time:.3f}s, steps_per_second={self.steps_per_second:.1f})"
+
+class HeadlessRunner:
+    def __init__(self, max_steps: Optional[int] = None, max_time: Optional[float] = None, fast_forward=False) -> None:
+        # max_time is in simulated seconds. The game stops at whichever limit is reached first.
+        # With fast_forward the game runs with Simulator.advance_until up to each scheduled action, which gives the same
+        # result as stepping but skips through idle stretches
+        assert max_steps is not None or max_time is not None, "Need a step or time limit to run headless"
+        limits = []
+        if max_steps is not None:
+            limits.append(max_steps)
+        if max_time is not None:
+            limits.append(int(max_time * SIM_STEPS_PER_SECOND))
+        self.step_limit = min(limits)
+        self.fast_forward = fast_forward
+
+    def resolve_action(self, controller: Controller, action: ScheduledAction) -> Optional[InputAction]:
+        # Turns a scheduled action into an InputAction, or returns None if the action is not currently available
+        sim_map = controller.sim.map
+        player = sim_map.get_player_by_id(action.player_id) if action.player_id is not None else None
+        if action.type in MAP_ACTION_TYPES:
+            if action.type == ActionType.DISENGAGE_COMBAT:
+                combat = sim_map.find_combat_in_range(player) if player is not None else None
+                if combat is None or combat.disengage_counter is not None:
+                    return None
+                return InputAction(ActionEntry(action.type, combat=combat), player=player)
+            return InputAction(ActionEntry(action.type), player=player, item_name=action.item_name)
+
+        if player is None:
+            return None
+        available = controller.get_available_player_actions(player)
+        if available is None:
+            return None
+        for entry in available.actions:
+            if entry.type == action.type:
+                return InputAction(entry, player=player, position=action.position)
+        return None
+
+    def run_game(self, schedule: ActionSchedule = (), sim: Optional[Simulator] = None) -> GameResult:
+        controller = Controller(sim)
+        pending = sorted(schedule, key=lambda a: a.sim_step)
+        next_action = 0
+        applied, skipped = 0, 0
+
+        start_step = controller.sim.sim_step
+        start = time.perf_counter()
+        while controller.sim.sim_step < self.step_limit:
+            while next_action < len(pending) and pending[next_action].sim_step <= controller.sim.sim_step:
+                input_action = self.resolve_action(controller, pending[next_action])
+                if input_action is None:
+                    skipped += 1
+                else:
+                    controller.apply_action(input_action)
+                    applied += 1
+                next_action += 1
+            if self.fast_forward:
+                next_step = pending[next_action].sim_step if next_action < len(pending) else self.step_limit
+                steps = min(next_step, self.step_limit) - controller.sim.sim_step
+                controller.sim.advance_until(max_time=steps / SIM_STEPS_PER_SECOND)
+            else:
+                controller.sim.step()
+        wall_time = time.perf_counter() - start
+
+        steps = controller.sim.sim_step - start_step
+        return GameResult(
+            steps=steps,
+            sim_time=steps * controller.sim.time_delta,
+            wall_time=wall_time,
+            applied_actions=applied,
+            skipped_actions=skipped,
+        )
+
+    def run_games(self, num_games: int, schedules: Optional[Sequence[ActionSchedule]] = None) -> BatchResult:
+        # If schedules are given, game i uses schedules[i % len(schedules)]
+        result = BatchResult()
+        for i in range(num_games):
+            schedule = schedules[i % len(schedules)] if schedules else ()
+            result.games.append(self.run_game(schedule))
+        return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run games headless and report simulation throughput")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--max-time", type=float, default=20 * 60, help="simulated seconds per game")
+    args = parser.parse_args()
+
+    print(HeadlessRunner(max_time=args.max_time).run_games(args.games))
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from item import Item
 from stats import AllStats
@@ -9,16 +10,30 @@ MAX_ITEMS = 6
 class Inventory:
     gold: int
     items: list[Item]
+    gold_earned: float = 0 # All the gold ever added, whatever has been spent since
     
-    def buy(self, item: Item):
-        owned_dependencies = [i for i in self.items if i in item.dependencies]
+    def clone(self) -> "Inventory":
+        return Inventory(self.gold, list(self.items), self.gold_earned) # Items themselves are shared
+
+    def replaced_by(self, item: Item) -> list[Item]:
+        # Owned items that buying item would use up
+        return [i for i in self.items if i in item.dependencies]
+
+    def buy_failure_reason(self, item: Item) -> Optional[str]:
+        # Why the item can't be bought, or None if it can
+        owned_dependencies = self.replaced_by(item)
         if len(self.items) - len(owned_dependencies) + 1 > MAX_ITEMS:
-            print("Cannot buy - have too many items")
-            return False
+            return "have too many items"
         mitigated_cost = item.cost - sum([i.cost for i in owned_dependencies])
         if mitigated_cost > self.gold:
-            print(f"Cannot buy - not enough gold (have {self.gold}, need {mitigated_cost})")
+            return f"not enough gold (have {self.gold}, need {mitigated_cost})"
+        return None
+
+    def buy(self, item: Item):
+        if self.buy_failure_reason(item) is not None:
             return False
+        owned_dependencies = self.replaced_by(item)
+        mitigated_cost = item.cost - sum([i.cost for i in owned_dependencies])
         for i in owned_dependencies:
             self.items.remove(i)
         self.items.append(item)
@@ -27,6 +42,7 @@ class Inventory:
 
     def add_gold(self, gold):
         self.gold += gold
+        self.gold_earned += gold
     
     def get_item_stats(self) -> list[AllStats]:
         return [i.stats for i in self.items]
\ No newline at end of file
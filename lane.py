@@ -1,15 +1,21 @@
 from __future__ import annotations
+from dataclasses import dataclass
 from enum import Enum
+from bisect import bisect_left, bisect_right
 from math import dist
+import math
 import random
-from typing import List, Optional, Sequence, Tuple
-
-from CONSTANTS import COMBAT_START_THRESHOLD, SIM_STEPS_PER_SECOND, WAVE_COMBINE_THRESHOLD
-from MAP_CONSTANTS import BOT_LANE_POINTS, MAP_X, MAP_Y, MID_LAND_POINTS, SIDE_LANE_POINTS, TOP_LANE_POINTS, get_tower_points
-from entity import Entity, LaneEntity, Wave, EntityState, Team, Turret, Wave
+from typing import List, Optional, Sequence, Tuple, Union
+
+from CONSTANTS import COMBAT_INCLUDE_THRESHOLD, COMBAT_START_THRESHOLD, SIM_STEPS_PER_SECOND, WAVE_COMBINE_THRESHOLD
+from MAP_CONSTANTS import MAP_X, MAP_Y, SIDE_LANE_POINTS, get_lane_points, get_lane_y_scale, get_tower_points
+from entity import Entity, LaneEntity, Wave, EntityState, Team, Turret, Wave, clone_of, repeat_add, steps_until_contact
+from entity_store import EntityStore
+from events import EventLog, WavesMerged
+from lane_solver import ClashOutcome, apply_clash_ticks, solve_clash
+from profiler import StepProfiler
 from player import Player
-
-WAVE_SPAWN_INTERVAL = 100
+from sim_config import DEFAULT_CONFIG, WAVE_SPAWN_INTERVAL, SimConfig
 
 
 class Lane(Enum):
@@ -17,6 +23,29 @@ class Lane(Enum):
     MID = 2
     BOTTOM = 3
 
+LaneKey = Union[Lane, int]
+
+def get_lane_keys(lane_count) -> list[LaneKey]:
+    # The standard three lanes keep their Lane names. Other layouts are numbered from the top
+    if lane_count == len(Lane):
+        return list(Lane)
+    return list(range(lane_count))
+
+def lane_name(lane: LaneKey) -> str:
+    return lane.name if isinstance(lane, Lane) else f"LANE{lane}"
+
+def has_damage_tick(damage_ticks: range, start, end) -> bool:
+    # Whether any of the sim steps from start up to (not including) end is in damage_ticks
+    i = bisect_left(damage_ticks, start)
+    return i < len(damage_ticks) and damage_ticks[i] < end
+
+# Shortest stretch of steps worth skipping a lane fight ahead for
+MIN_CLASH_STEPS = 2
+
+# Lane entities are swept along the lane axis to find contacts. Distance along the axis is never more than the actual
+# distance, so only entities within the threshold on the axis need an exact check (plus a little slack for rounding)
+LANE_SWEEP_WINDOW = COMBAT_START_THRESHOLD + 1e-6
+
 class LaneEntityWrapper:
     entity: LaneEntity
     def __init__(self, entity) -> None:
@@ -29,8 +58,15 @@ class LaneEntityWrapper:
         # if self.entity.attacking.attacking is None:
         #     return # Do not apply attack if the target is not attacking in lane. This prevents some units from getting an "initiative" via the step order
 
-        self.entity.attacking.take_damage(self.entity.get_damage())
+        self.entity.attack(self.entity.attacking)
     
+    def clone(self, clones: dict[Entity, Entity]) -> LaneEntityWrapper:
+        # Copy for Simulator.clone, wrapping the copy of the entity
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.entity = clone_of(clones, self.entity)
+        return new
+
     def clear_attacking(self):
         self.entity.attacking = None
 
@@ -50,24 +86,18 @@ class WaveWrapper(LaneEntityWrapper):
         self.segment_number = 0
         self.distance_along_segment = 0.0
         self.overall_distance = 0.0
+        self.missed_steps = 0 # Steps of the lane's current coarse step that passed before the wave spawned
 
-    def increment_distance(self, time_delta, current_seg_len):
-        # Returns True if the distance update cause a move to the next segment
-        # Note that distance deltas will never be enough to traverse multiple segments
-        dist = self.entity.get_speed() * time_delta
-        new_dist = self.distance_along_segment + dist
-        self.overall_distance += dist
-        if new_dist > current_seg_len:
-            self.segment_number += 1
-            self.distance_along_segment = new_dist - current_seg_len
-            return True
-        else:
-            self.distance_along_segment = new_dist
-            return False
+    def run_time(self, time_delta, run_steps):
+        # Time the wave moves for in a lane step of time_delta standing for run_steps sim steps, leaving out the steps
+        # before it spawned
+        if self.missed_steps == 0:
+            return time_delta
+        return time_delta / run_steps * (run_steps - self.missed_steps)
 
     def combine_from(self, other: WaveWrapper):
         # This is a bit of a hacky way of combining because it assumes that waves will not recalculate their stats
-        self.entity.stats.effective = self.entity.stats.effective + other.entity.stats.effective
+        self.entity.stats.set_effective(self.entity.stats.effective + other.entity.stats.effective)
         self.entity.stats.health += other.entity.stats.health
         other.entity.set_state(EntityState.DEAD) # Mark as dead so it gets cleaned up
         # For now assume same damage, other attributes
@@ -77,15 +107,114 @@ class TurretWrapper(LaneEntityWrapper):
     def __init__(self, entity) -> None:
         super().__init__(entity)
 
+class LanePath:
+    """
+    Cumulative arc-length table for travelling along a lane in one direction, so that the position and segment for a
+    distance travelled are a single lookup.
+    """
+    def __init__(self, points: Sequence[Tuple[float, float]]) -> None:
+        self.end_point = points[-1]
+        self.starts: list[Tuple[float, float]] = list(points[:-1])
+        self.dirs: list[Tuple[float, float]] = []
+        self.cumulative: list[float] = [0.0] # Distance along the path at the start of each segment (and the end of the path)
+        for p1, p2 in zip(points, points[1:]):
+            dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+            length = (dx**2 + dy**2)**0.5
+            self.dirs.append((dx / length, dy / length))
+            self.cumulative.append(self.cumulative[-1] + length)
+        self.length = self.cumulative[-1]
+        self.last_seg_index = len(self.dirs) - 1
+
+    def segment_at(self, distance) -> int:
+        # A distance exactly at the end of a segment is still on that segment. Past the end of the path gives last_seg_index + 1
+        return max(0, bisect_left(self.cumulative, distance) - 1)
+
+    def position_at(self, distance, segment) -> Tuple[float, float]:
+        if segment > self.last_seg_index:
+            return self.end_point
+        start, direction = self.starts[segment], self.dirs[segment]
+        along = distance - self.cumulative[segment]
+        return (start[0] + direction[0] * along, start[1] + direction[1] * along)
+
+    def distance_to(self, point) -> float:
+        # Shortest distance from the point to the path
+        best = math.inf
+        for segment, (start, direction) in enumerate(zip(self.starts, self.dirs)):
+            dx, dy = point[0] - start[0], point[1] - start[1]
+            along = min(max(dx * direction[0] + dy * direction[1], 0), self.cumulative[segment + 1] - self.cumulative[segment])
+            best = min(best, math.hypot(dx - direction[0] * along, dy - direction[1] * along))
+        return best
+
+def choose_lane_target(targets: list[Optional[int]], index, candidate, enemies: Sequence[LaneEntityWrapper]):
+    # Picks the same target as calling LaneEntityWrapper.set_attacking for every enemy in range in list order:
+    # the first turret in range if there is one, otherwise the last wave in range
+    current = targets[index]
+    if current is None:
+        targets[index] = candidate
+    elif isinstance(enemies[candidate], TurretWrapper):
+        if not isinstance(enemies[current], TurretWrapper) or candidate < current:
+            targets[index] = candidate
+    elif not isinstance(enemies[current], TurretWrapper) and candidate > current:
+        targets[index] = candidate
+
+@dataclass
+class LaneClash:
+    # A fight between two lane entities that is being skipped ahead (see SingleLaneSimulator.find_clash)
+    a: LaneEntityWrapper
+    b: LaneEntityWrapper
+    outcome: ClashOutcome
+    end_step: int # Something else may happen in the lane from this step on, so the fight has to be caught up by then
+    ticks_elapsed: int = 0
+
+@dataclass
+class LaneDivergence:
+    # Difference between two runs of the same lane (other - reference), e.g. a coarse stepped run against a full rate one
+    lane: LaneKey
+    waves: int # Difference in wave count
+    turrets: int # Difference in turrets standing
+    turret_health: float # Difference in total health of the turrets standing
+    wave_distance: float # Mean distance between matching waves (the n-th wave of a team furthest along the lane in each run)
+
+def lane_divergence(reference: LaneSimulator, other: LaneSimulator) -> list[LaneDivergence]:
+    divergences = []
+    for lane in reference.lanes:
+        ref, oth = reference.lanes[lane], other.lanes[lane]
+        distances = []
+        for team in (Team.BLUE, Team.RED):
+            ref_waves = sorted(ref.waves_by_team[team], key=lambda w: -w.overall_distance)
+            oth_waves = sorted(oth.waves_by_team[team], key=lambda w: -w.overall_distance)
+            distances += [abs(w1.overall_distance - w2.overall_distance) for w1, w2 in zip(ref_waves, oth_waves)]
+        ref_turrets = [w.entity for w in ref.get_all_wrappers() if isinstance(w, TurretWrapper)]
+        oth_turrets = [w.entity for w in oth.get_all_wrappers() if isinstance(w, TurretWrapper)]
+        divergences.append(LaneDivergence(
+            lane,
+            len(oth.waves) - len(ref.waves),
+            len(oth_turrets) - len(ref_turrets),
+            sum(t.stats.health for t in oth_turrets) - sum(t.stats.health for t in ref_turrets),
+            sum(distances) / len(distances) if distances else 0.0,
+        ))
+    return divergences
+
 class SingleLaneSimulator:
-    def __init__(self, lane_points: Sequence[Tuple[float, float]], players: Sequence[Player], on_remove_callback):
+    def __init__(self, lane_points: Sequence[Tuple[float, float]], players: Sequence[Player], on_remove_callback, store: Optional[EntityStore] = None, solve_unattended=False, simultaneous_damage=False, events: Optional[EventLog] = None):
         self.players = players
+        self.events = events
+        self.solve_unattended = solve_unattended
+        self.simultaneous_damage = simultaneous_damage
+        self.clash: Optional[LaneClash] = None
+        # Steps saved up while the lane is far from every player, to be run as one coarse step (see LaneSimulator.step)
+        self.attended = True # Whether a player was within SimConfig.lane_lod_radius at the last check
+        self.deferred_steps = 0
+        self.deferred_damage_tick = False
+        self.late_waves: List[WaveWrapper] = [] # Waves spawned partway through the deferred steps
+        self.store = store
         self.points = lane_points
         self.on_remove_callback = on_remove_callback
-        self.lengths, self.deltas = self._compute_path_info()
-        self.overall_length = sum(self.lengths)
+        # BLUE waves travel along the lane points in order, RED waves in reverse
+        self.paths: dict[Team, LanePath] = {Team.BLUE: LanePath(lane_points), Team.RED: LanePath(lane_points[::-1])}
+        self.overall_length = self.paths[Team.BLUE].length
         self.waves: List[WaveWrapper] = []
-        self.last_seg_index = len(self.lengths) - 1
+        self.last_seg_index = self.paths[Team.BLUE].last_seg_index
         self.waves_by_team: dict[Team, list[WaveWrapper]] = {
             Team.RED: [],
             Team.BLUE: [],
@@ -94,120 +223,381 @@ class SingleLaneSimulator:
             Team.RED: [],
             Team.BLUE: [],
         }
-
-    def _compute_path_info(self):
-        lengths = []
-        deltas = []
-        for i in range(len(self.points) - 1):
-            p1, p2 = self.points[i], self.points[i + 1]
-            dx = p2[0] - p1[0]
-            dy = p2[1] - p1[1]
-            length = (dx**2 + dy**2)**0.5
-            lengths.append(length)
-            deltas.append((dx / length, dy / length))
-        return lengths, deltas
+        self.wrapper_by_entity: dict[Entity, LaneEntityWrapper] = {}
+        # Direction from one end of the lane to the other. Contacts are found by sorting along it (see find_lane_contacts)
+        dx, dy = lane_points[-1][0] - lane_points[0][0], lane_points[-1][1] - lane_points[0][1]
+        self.axis = (dx / math.hypot(dx, dy), dy / math.hypot(dx, dy))
+
+    def clone(self, clones: dict[Entity, Entity], players: Sequence[Player], on_remove_callback, store: Optional[EntityStore], events: Optional[EventLog]) -> SingleLaneSimulator:
+        # Copy for Simulator.clone. The lane geometry is shared, the wrappers are copied
+        new = object.__new__(SingleLaneSimulator)
+        new.__dict__.update(self.__dict__)
+        new.players, new.on_remove_callback, new.store, new.events = players, on_remove_callback, store, events
+        wrappers = {w: w.clone(clones) for w in self.wrapper_by_entity.values()}
+        new.wrapper_by_entity = {w.entity: w for w in wrappers.values()}
+        new.waves = [wrappers[w] for w in self.waves]
+        new.waves_by_team = {team: [wrappers[w] for w in waves] for team, waves in self.waves_by_team.items()} # type: ignore
+        new.all_by_team = {team: [wrappers[w] for w in team_wrappers] for team, team_wrappers in self.all_by_team.items()}
+        new.late_waves = [wrappers[w] for w in self.late_waves]
+        if self.clash is not None:
+            # The outcome is never modified, so it is shared
+            a = wrappers.get(self.clash.a) or self.clash.a.clone(clones)
+            b = wrappers.get(self.clash.b) or self.clash.b.clone(clones)
+            new.clash = LaneClash(a, b, self.clash.outcome, self.clash.end_step, self.clash.ticks_elapsed)
+        return new
 
     def add_wave(self, wave: Wave):
         wrapper = WaveWrapper(wave)
         self.move_wave(0, wrapper) # This initializes the position
+        if self.deferred_steps > 0:
+            # The lane's next run moves its waves for all of the deferred steps, but this one only exists from now on
+            wrapper.missed_steps = self.deferred_steps
+            self.late_waves.append(wrapper)
         self.waves.append(wrapper)
         self.waves_by_team[wrapper.entity.team].append(wrapper)
         self.all_by_team[wrapper.entity.team].append(wrapper)
+        self.wrapper_by_entity[wave] = wrapper
 
     def add_turret(self, turret: Turret):
         wrapper = TurretWrapper(turret)
         self.all_by_team[wrapper.entity.team].append(wrapper)
+        self.wrapper_by_entity[turret] = wrapper
 
     def remove_entity(self, e: Entity):
-        to_remove = None
-        for w in self.get_all_wrappers():
-            if w.entity == e:
-                to_remove = w
-                break
-        if to_remove is not None:
-            self.remove_wrapper(w)
+        wrapper = self.wrapper_by_entity.get(e)
+        if wrapper is not None:
+            self.remove_wrapper(wrapper)
 
     def remove_wrapper(self, wrapper: LaneEntityWrapper):
+        if self.wrapper_by_entity.pop(wrapper.entity, None) is None:
+            return # Already removed
         if isinstance(wrapper, WaveWrapper):
             self.waves.remove(wrapper)
             self.waves_by_team[wrapper.entity.team].remove(wrapper)
         self.all_by_team[wrapper.entity.team].remove(wrapper)
         self.on_remove_callback(wrapper.entity)
 
-    def get_seg_info_for_wave(self, wave_wrapper: WaveWrapper):
-        # Get segment info accounting for the fact that team determines direction
-        if wave_wrapper.entity.team == Team.RED:
-            idx = self.last_seg_index - wave_wrapper.segment_number
-            point_index = idx + 1
-            delta_sgn = -1
-        else:
-            idx = wave_wrapper.segment_number
-            point_index = idx
-            delta_sgn = 1
-
-        delta = (self.deltas[idx][0] * delta_sgn, self.deltas[idx][1] * delta_sgn)
-
-        return self.lengths[idx], delta, point_index
-
     def move_wave(self, time_delta: float, wave_wrapper: WaveWrapper):
-        seg_len, seg_delta, point_index = self.get_seg_info_for_wave(wave_wrapper)
-        new_seg = wave_wrapper.increment_distance(time_delta, seg_len)
-        if not new_seg:
-            point = self.points[point_index]
-            new_pos = (point[0] + seg_delta[0] * wave_wrapper.distance_along_segment, point[1] + seg_delta[1] * wave_wrapper.distance_along_segment)
-            wave_wrapper.entity.set_pos(new_pos)
-
-    def combine_waves(self, sim_step):
-        if sim_step % 5 != 0: # Run this only periodically for efficiency
-            return
-        to_combine: list[Tuple[WaveWrapper, WaveWrapper]] = []
+        self.move_waves(time_delta, [wave_wrapper])
+
+    def move_waves(self, time_delta: float, waves: Sequence[WaveWrapper], run_steps=1):
+        # Advances each wave by its speed and places it with a lookup in its team's path table.
+        # Waves that go past the end of the lane are finished
+        for wave in waves:
+            self.place_wave(wave, wave.overall_distance + wave.entity.get_speed() * wave.run_time(time_delta, run_steps))
+
+    def place_wave(self, wave: WaveWrapper, distance):
+        path = self.paths[wave.entity.team]
+        segment = path.segment_at(distance)
+        wave.overall_distance = distance
+        wave.segment_number = segment
+        wave.distance_along_segment = distance - path.cumulative[min(segment, path.last_seg_index)]
+        wave.entity.set_pos(path.position_at(distance, segment))
+        if segment > path.last_seg_index:
+            self.finish_wave(wave)
+
+    def finish_wave(self, wave: WaveWrapper):
+        # The wave has nothing left to do, so it is taken out of the lane. The Map removes FINISHED entities at the end of the step
+        wave.entity.set_state(EntityState.FINISHED)
+        wave.clear_attacking()
+        self.remove_wrapper(wave)
+
+    def combine_waves(self):
+        """
+        Merges every chain of same team waves where each wave is within WAVE_COMBINE_THRESHOLD of the next one along
+        the lane into the wave furthest along the chain.
+        """
         for team in self.waves_by_team:
-            for wave1, wave2 in zip(self.waves_by_team[team], self.waves_by_team[team][1:]):
-                if abs(wave1.overall_distance - wave2.overall_distance) <= WAVE_COMBINE_THRESHOLD:
-                    to_combine.append((wave1, wave2))
-                    break
-        for w1, w2 in to_combine:
-            w1.combine_from(w2) # Assume that the first one is further along and should be combined into
-            self.remove_wrapper(w2)
+            waves = self.waves_by_team[team]
+            if len(waves) < 2:
+                continue
+            leader, previous = None, None
+            for wave in sorted(waves, key=lambda w: -w.overall_distance): # Nearly sorted already, so this is close to linear
+                if not wave.entity.is_alive():
+                    continue
+                if previous is not None and previous.overall_distance - wave.overall_distance <= WAVE_COMBINE_THRESHOLD:
+                    leader.combine_from(wave)
+                    self.remove_wrapper(wave)
+                    if self.events is not None:
+                        self.events.emit(WavesMerged(team, leader.entity.position, leader.entity.stats.health))
+                else:
+                    leader = wave
+                previous = wave
 
     def set_attacking(self):
         for w in self.get_all_wrappers():
             w.clear_attacking()
-        for w1 in self.all_by_team[Team.RED]:
-            for w2 in self.all_by_team[Team.BLUE]:
-                if w1.entity.distance_to_entity(w2.entity) <= COMBAT_START_THRESHOLD:
-                    w1.set_attacking(w2.entity)
-                    w2.set_attacking(w1.entity)
-        for w in self.get_all_wrappers():
-            # If any lane entities are not attacking and can attack a player, they should
+        if self.store is not None:
+            self.set_attacking_vectorized(self.store)
+            return
+        red, blue = self.all_by_team[Team.RED], self.all_by_team[Team.BLUE]
+        red_targets, blue_targets = [None] * len(red), [None] * len(blue)
+        for i, j in self.find_lane_contacts(red, blue):
+            choose_lane_target(red_targets, i, j, blue)
+            choose_lane_target(blue_targets, j, i, red)
+        for wrappers, targets, enemies in ((red, red_targets, blue), (blue, blue_targets, red)):
+            for w, target in zip(wrappers, targets):
+                if target is not None:
+                    w.entity.attacking = enemies[target].entity
+        self.set_attacking_players()
+
+    def lane_coord(self, position):
+        return position[0] * self.axis[0] + position[1] * self.axis[1]
+
+    def sorted_by_lane_coord(self, entities: Sequence[Entity]):
+        # Indices of the entities sorted by lane coordinate, and the sorted coordinates
+        coords = [self.lane_coord(e.position) for e in entities]
+        order = sorted(range(len(entities)), key=coords.__getitem__)
+        return order, [coords[k] for k in order]
+
+    def find_lane_contacts(self, red: Sequence[LaneEntityWrapper], blue: Sequence[LaneEntityWrapper]):
+        """
+        Pairs (i, j) of red[i] and blue[j] within COMBAT_START_THRESHOLD, found by sorting the BLUE side along the lane
+        axis and only checking the BLUE entities whose lane coordinate is within the threshold of each RED entity.
+        """
+        contacts = []
+        if len(red) == 0 or len(blue) == 0:
+            return contacts
+        blue_order, blue_coords = self.sorted_by_lane_coord([w.entity for w in blue])
+        for i, w1 in enumerate(red):
+            coord = self.lane_coord(w1.entity.position)
+            lo = bisect_left(blue_coords, coord - LANE_SWEEP_WINDOW)
+            hi = bisect_right(blue_coords, coord + LANE_SWEEP_WINDOW)
+            for k in range(lo, hi):
+                j = blue_order[k]
+                if w1.entity.distance_to_entity(blue[j].entity) <= COMBAT_START_THRESHOLD:
+                    contacts.append((i, j))
+        return contacts
+
+    def set_attacking_players(self):
+        # Lane entities that are not attacking anything in lane attack the first enemy player (in self.players order) in range
+        for team in (Team.RED, Team.BLUE):
+            enemy_players = [p for p in self.players if p.team == team.enemy()]
+            if len(enemy_players) == 0:
+                continue
+            order, coords = self.sorted_by_lane_coord(enemy_players)
+            for w in self.all_by_team[team]:
+                if w.entity.attacking is not None:
+                    continue
+                coord = self.lane_coord(w.entity.position)
+                lo = bisect_left(coords, coord - LANE_SWEEP_WINDOW)
+                hi = bisect_right(coords, coord + LANE_SWEEP_WINDOW)
+                in_range = [order[k] for k in range(lo, hi) if w.entity.distance_to_entity(enemy_players[order[k]]) <= COMBAT_START_THRESHOLD]
+                if in_range:
+                    w.entity.attacking = enemy_players[min(in_range)]
+
+    def set_attacking_vectorized(self, store: EntityStore):
+        # Same result as the sweep in set_attacking, but the distance checks are done as one matrix per pairing.
+        # Pairs are visited in list (row-major) order so the turret priority rule gives identical targets
+        red, blue = self.all_by_team[Team.RED], self.all_by_team[Team.BLUE]
+        if len(red) > 0 and len(blue) > 0:
+            in_range = store.pairs_within(store.slots_of([w.entity for w in red]), store.slots_of([w.entity for w in blue]), COMBAT_START_THRESHOLD)
+            for i, j in zip(*in_range.nonzero()):
+                red[i].set_attacking(blue[j].entity)
+                blue[j].set_attacking(red[i].entity)
+        wrappers = self.get_all_wrappers()
+        if len(wrappers) == 0 or len(self.players) == 0:
+            return
+        in_range = store.pairs_within(store.slots_of([w.entity for w in wrappers]), store.slots_of(self.players), COMBAT_START_THRESHOLD)
+        for i, w in enumerate(wrappers):
             if w.entity.attacking is not None:
                 continue
-            for player in self.players:
-                if player.team == w.entity.team.enemy() and w.entity.distance_to_entity(player) <= COMBAT_START_THRESHOLD:
-                    w.set_attacking(player)
+            for j in in_range[i].nonzero()[0]:
+                if self.players[j].team == w.entity.team.enemy():
+                    w.set_attacking(self.players[j])
 
-    def step(self, time_delta, is_damage_tick, sim_step):
+    def step(self, time_delta, is_damage_tick, sim_step, profiler: Optional[StepProfiler] = None, phase_prefix="lanes", steps_to_spawn=math.inf, run_steps=1):
         """
         Move each wave along the lane segments for one simulation step.
+        steps_to_spawn is the number of steps until the next wave spawn (which is an event that ends any skipped fight).
+        run_steps is the number of sim steps this step stands for (more than one for a lane far from players, see
+        LaneSimulator.step), with time_delta covering all of them.
         """
-        self.combine_waves(sim_step)
+        if profiler is not None:
+            t = profiler.start()
+        if self.clash is not None and self.step_clash(time_delta, is_damage_tick, sim_step, run_steps):
+            if profiler is not None:
+                profiler.lap(phase_prefix + ".clash", t)
+            return
+        self.combine_waves()
+        if profiler is not None:
+            t = profiler.lap(phase_prefix + ".combine_waves", t)
         self.set_attacking()
-
+        if profiler is not None:
+            t = profiler.lap(phase_prefix + ".set_attacking", t)
+        if self.solve_unattended:
+            self.clash = self.find_clash(time_delta, sim_step, steps_to_spawn, run_steps)
+            if self.clash is not None:
+                self.step_clash(time_delta, is_damage_tick, sim_step, run_steps)
+                if profiler is not None:
+                    profiler.lap(phase_prefix + ".clash", t)
+                return
+
+        # Attacks run in a random order, or with simultaneous_damage all damage is worked out before any is applied.
+        # Movement doesn't interact with attacks within a step, so the waves that are not attacking are moved afterwards in one pass
         wrappers = self.get_all_wrappers()
-        for wrapper in random.sample(wrappers, len(wrappers)):
+        if not self.simultaneous_damage:
+            wrappers = random.sample(wrappers, len(wrappers))
+        to_move: list[WaveWrapper] = []
+        hits: list[Tuple[Entity, float]] = [] # Target and mitigated damage
+        for wrapper in wrappers:
             if wrapper.entity._state == EntityState.COMBAT:
                 continue # Don't process entities that are in regular combat
-            if isinstance(wrapper, WaveWrapper) and wrapper.segment_number > self.last_seg_index:
-                #self.waves.remove(wave_wrapper)
-                continue # Don't process waves that have reached the end
             if wrapper.entity.attacking is not None:
-                wrapper.run_attack_step(is_damage_tick)
+                if not self.simultaneous_damage:
+                    wrapper.run_attack_step(is_damage_tick)
+                elif is_damage_tick:
+                    target = wrapper.entity.attacking
+                    hits.append((target, wrapper.entity.damage_against(target)))
             elif isinstance(wrapper, WaveWrapper):
-                self.move_wave(time_delta, wrapper)
+                to_move.append(wrapper)
+        for target, damage in hits:
+            target.take_mitigated_damage(damage)
+        self.move_waves(time_delta, to_move, run_steps)
+        if profiler is not None:
+            profiler.lap(phase_prefix + ".move_attack", t)
+
+    def find_clash(self, time_delta, sim_step, steps_to_spawn, run_steps=1) -> Optional[LaneClash]:
+        """
+        Returns a LaneClash if the only thing happening in the lane is two lane entities fighting each other, with no
+        player close enough to get involved, for long enough to be worth skipping ahead.
+        Each step of time_delta stands for run_steps sim steps (see step). steps_to_spawn and the clash's end are in sim steps.
+        """
+        attackers = [w for w in self.get_all_wrappers() if w.entity.attacking is not None]
+        if len(attackers) != 2:
+            return None
+        a, b = attackers
+        if a.entity.attacking is not b.entity or b.entity.attacking is not a.entity:
+            return None
+        if a.entity._state != EntityState.NORMAL or b.entity._state != EntityState.NORMAL:
+            return None
+        for player in self.players:
+            if player.attacking is a.entity or player.attacking is b.entity:
+                return None
+        # Players have to stay far enough away that they can't be pulled into the fight by a combat starting nearby
+        idle_steps = self.idle_steps(time_delta, ignore_pair=(a, b), player_threshold=COMBAT_INCLUDE_THRESHOLD)
+        steps = min(idle_steps * run_steps, steps_to_spawn) # In sim steps
+        if steps < MIN_CLASH_STEPS:
+            return None
+        # There can't be more damage ticks than steps before the clash has to be caught up, so there is no need to solve further
+        return LaneClash(a, b, solve_clash(a.entity, b.entity, max_ticks=steps), sim_step + steps)
+
+    def step_clash(self, time_delta, is_damage_tick, sim_step, run_steps=1):
+        """
+        Steps a lane while its clash is being skipped ahead: only the waves not in the fight move, and damage ticks are
+        counted rather than applied. Returns False (after catching up the fight) if the lane needs a regular step instead.
+        """
+        clash = self.clash
+        assert clash is not None, "No clash to step"
+        if sim_step >= clash.end_step or clash.a.entity._state != EntityState.NORMAL or clash.b.entity._state != EntityState.NORMAL:
+            self.resolve_clash()
+            return False
+        if is_damage_tick:
+            clash.ticks_elapsed += 1
+        self.move_waves(time_delta, [w for w in self.waves if w is not clash.a and w is not clash.b and w.entity._state != EntityState.COMBAT], run_steps)
+        if clash.ticks_elapsed >= clash.outcome.ticks:
+            self.resolve_clash() # The fight is over. Whoever died is cleaned up by the Map at the end of this step
+        return True
+
+    def resolve_clash(self):
+        # Applies the damage ticks counted so far to the entities in the clash
+        clash = self.clash
+        assert clash is not None, "No clash to resolve"
+        self.clash = None
+        apply_clash_ticks(clash.a.entity, clash.b.entity, clash.ticks_elapsed)
+        for w in (clash.a, clash.b):
+            if isinstance(w.entity, Wave):
+                w.entity.accept_reward() # Nobody was close enough to collect these rewards
+            if not w.entity.is_alive():
+                w.clear_attacking()
 
     def get_all_wrappers(self):
         return self.all_by_team[Team.BLUE] + self.all_by_team[Team.RED]
 
+    def has_player_within(self, radius):
+        path = self.paths[Team.BLUE]
+        return any(path.distance_to(player.position) <= radius for player in self.players)
+
+    def get_lane_speed(self, wrapper: LaneEntityWrapper):
+        # Speed at which the entity moves along the lane when not attacking. Turrets and waves at the end do not move
+        if isinstance(wrapper, WaveWrapper) and wrapper.segment_number <= self.last_seg_index:
+            return wrapper.entity.get_speed()
+        return 0
+
+    def idle_steps(self, time_delta, ignore_pair: Optional[Tuple[LaneEntityWrapper, LaneEntityWrapper]] = None, player_threshold=COMBAT_START_THRESHOLD):
+        """
+        Number of upcoming steps that are guaranteed to only move waves: no wave, turret or player contact,
+        no waves combining and no wave reaching the end of the lane.
+        The two wrappers in ignore_pair are taken to be fighting each other: their contact is not counted and they don't move.
+        Players count as in contact within player_threshold.
+        """
+        def speed(w: LaneEntityWrapper):
+            if ignore_pair is not None and w in ignore_pair:
+                return 0
+            return self.get_lane_speed(w)
+
+        steps = math.inf
+        for w1 in self.all_by_team[Team.RED]:
+            for w2 in self.all_by_team[Team.BLUE]:
+                if ignore_pair is not None and w1 in ignore_pair and w2 in ignore_pair:
+                    continue
+                closing_speed = speed(w1) + speed(w2)
+                steps = min(steps, steps_until_contact(w1.entity.distance_to_entity(w2.entity), COMBAT_START_THRESHOLD, closing_speed, time_delta))
+                if steps == 0:
+                    return 0
+        for w in self.get_all_wrappers():
+            for player in self.players:
+                if player.team == w.entity.team.enemy():
+                    closing_speed = speed(w) + player.get_speed()
+                    steps = min(steps, steps_until_contact(w.entity.distance_to_entity(player), player_threshold, closing_speed, time_delta))
+        for team in self.waves_by_team:
+            waves = sorted(self.waves_by_team[team], key=lambda w: w.overall_distance)
+            for wave1, wave2 in zip(waves, waves[1:]):
+                closing_speed = abs(speed(wave1) - speed(wave2))
+                steps = min(steps, steps_until_contact(abs(wave1.overall_distance - wave2.overall_distance), WAVE_COMBINE_THRESHOLD, closing_speed, time_delta))
+        for wave in self.waves:
+            wave_speed = speed(wave)
+            if wave_speed > 0:
+                steps = min(steps, steps_until_contact(self.overall_length - wave.overall_distance, 0, wave_speed, time_delta))
+        return steps
+
+    def run_offsets(self, steps, lod_steps) -> range:
+        # Which of the next `steps` steps run the lane (see LaneSimulator.step), counted from the first of them: every
+        # one, or every lod_steps once far from players
+        if self.attended or lod_steps == 1:
+            return range(steps)
+        return range(lod_steps - self.deferred_steps - 1, steps, lod_steps)
+
+    def skip_idle(self, time_delta, steps, sim_step, damage_ticks: range, lod_steps):
+        """
+        Same as running the `steps` steps from sim_step through LaneSimulator.step, for steps within idle_steps() and
+        with no change to attended, except for the random order drawn at each run (LaneSimulator.skip_idle replays
+        those). Nothing attacks in these steps, so the only thing the lane does is move its waves, by the same float
+        additions as stepping but without going through the steps one at a time. damage_ticks holds the sim steps that
+        are damage ticks.
+        """
+        runs = self.run_offsets(steps, lod_steps)
+        if len(runs) == 0:
+            self.deferred_steps += steps
+            self.deferred_damage_tick |= has_damage_tick(damage_ticks, sim_step, sim_step + steps)
+            return
+        first_run_steps = self.deferred_steps + runs[0] + 1
+        self.deferred_steps = steps - 1 - runs[-1]
+        self.deferred_damage_tick = has_damage_tick(damage_ticks, sim_step + runs[-1] + 1, sim_step + steps)
+        for w in self.get_all_wrappers():
+            w.clear_attacking() # What set_attacking does when the lane runs
+        for wave in list(self.waves):
+            speed = wave.entity.get_speed()
+            distance = wave.overall_distance + speed * wave.run_time(time_delta * first_run_steps, first_run_steps)
+            self.place_wave(wave, repeat_add(distance, speed * (time_delta * runs.step), len(runs) - 1))
+        self.clear_late_waves()
+
+    def clear_late_waves(self):
+        # Once the lane has run, every wave has been there for the whole of the next coarse step
+        for wave in self.late_waves:
+            wave.missed_steps = 0
+        self.late_waves.clear()
+
     def remove_dead(self):
         for w in self.get_all_wrappers():
             if not w.entity.is_alive():
@@ -217,58 +607,115 @@ class SingleLaneSimulator:
         return f"{[repr(wave) for wave in self.waves]}"
 
 class LaneSimulator:
-    # Simulates all three lanes
-    def __init__(self, add_entity_callback, players: Sequence[Player], on_remove_callback):
-        self.lanes: dict[Lane, SingleLaneSimulator] = {
-            Lane.TOP: SingleLaneSimulator(TOP_LANE_POINTS, players, on_remove_callback),
-            Lane.MID: SingleLaneSimulator(MID_LAND_POINTS, players, on_remove_callback),
-            Lane.BOTTOM: SingleLaneSimulator(BOT_LANE_POINTS, players, on_remove_callback)
+    # Simulates all the lanes (three by default, see SimConfig.lane_count)
+    def __init__(self, add_entity_callback, players: Sequence[Player], on_remove_callback, store: Optional[EntityStore] = None, config: SimConfig = DEFAULT_CONFIG, events: Optional[EventLog] = None):
+        self.config = config
+        self.lanes: dict[LaneKey, SingleLaneSimulator] = {
+            lane: SingleLaneSimulator(get_lane_points(i, config.lane_count), players, on_remove_callback, store, config.solve_unattended_lanes, config.simultaneous_lane_damage, events)
+            for i, lane in enumerate(get_lane_keys(config.lane_count))
         }
-        self.spawn_interval_sim_steps = WAVE_SPAWN_INTERVAL * SIM_STEPS_PER_SECOND
+        self.spawn_interval_sim_steps = max(1, round(config.wave_spawn_interval * SIM_STEPS_PER_SECOND))
+        # Sim steps per coarse step for lanes far from players. 1 means every lane is stepped at the full rate
+        self.lod_steps = 1 if config.lane_lod_radius is None else max(1, round(config.lane_lod_interval * SIM_STEPS_PER_SECOND))
         self.wave_num = 0
         self.add_entity_callback = add_entity_callback
+        self.lane_by_entity: dict[Entity, LaneKey] = {}
 
         self.add_turrets()
 
 
+    def clone(self, clones: dict[Entity, Entity], add_entity_callback, players: Sequence[Player], on_remove_callback, store: Optional[EntityStore], events: Optional[EventLog]) -> LaneSimulator:
+        # Copy for Simulator.clone, adding entities to and reporting removals to the copy of the Map
+        new = object.__new__(LaneSimulator)
+        new.__dict__.update(self.__dict__)
+        new.add_entity_callback = add_entity_callback
+        new.lanes = {lane: lane_sim.clone(clones, players, on_remove_callback, store, events) for lane, lane_sim in self.lanes.items()}
+        new.lane_by_entity = {clone_of(clones, e): lane for e, lane in self.lane_by_entity.items()}
+        return new
+
     def add_turrets(self):
-        turrets = {
-            Team.BLUE : {
-                Lane.TOP: get_tower_points(1, False),
-                Lane.MID: get_tower_points(0, False),
-                Lane.BOTTOM: get_tower_points(-1, False)
-            },
-            Team.RED: {
-                Lane.TOP: get_tower_points(1, True),
-                Lane.MID: get_tower_points(0, True),
-                Lane.BOTTOM: get_tower_points(-1, True)   
-            }
-        }
-        for team in turrets:
-            for lane in turrets[team]:
-                for pos in turrets[team][lane]:
+        for team in (Team.BLUE, Team.RED):
+            for i, lane in enumerate(self.lanes):
+                y_scale = get_lane_y_scale(i, self.config.lane_count)
+                for pos in get_tower_points(y_scale, team == Team.RED):
                     self.add_turret(Turret.default_turret(pos, team), lane)
     
+    def set_event_log(self, events: Optional[EventLog]):
+        for lane in self.lanes.values():
+            lane.events = events
+
     def remove_entity(self, entity):
-        for lane in self.lanes:
+        lane = self.lane_by_entity.pop(entity, None)
+        if lane is not None:
             self.lanes[lane].remove_entity(entity)
     
-    def add_turret(self, turret: Turret, lane: Lane):
+    def add_turret(self, turret: Turret, lane: LaneKey):
         self.add_entity_callback(turret)
         self.lanes[lane].add_turret(turret)
+        self.lane_by_entity[turret] = lane
 
-    def add_wave(self, wave: Wave, lane: Lane):
+    def add_wave(self, wave: Wave, lane: LaneKey):
         self.add_entity_callback(wave)
         self.lanes[lane].add_wave(wave)
+        self.lane_by_entity[wave] = lane
     
-    def step(self, time_delta, sim_time, is_damage_tick, sim_step):
+    def step(self, time_delta, sim_time, is_damage_tick, sim_step, profiler: Optional[StepProfiler] = None):
+        if profiler is not None:
+            t = profiler.start()
         self.spawn_waves(sim_step)
-        for lane in self.lanes:
-            self.lanes[lane].step(time_delta, sim_time, is_damage_tick)
+        if profiler is not None:
+            profiler.lap("lanes.spawn", t)
+        steps_to_spawn = (-sim_step - 1) % self.spawn_interval_sim_steps + 1 # This step's spawn has already happened
+        check_players = self.lod_steps > 1 and sim_step % self.lod_steps == 0 # Player distances are checked once per coarse step
+        for lane, lane_sim in self.lanes.items():
+            if check_players:
+                lane_sim.attended = lane_sim.has_player_within(self.config.lane_lod_radius)
+            lane_sim.deferred_steps += 1
+            lane_sim.deferred_damage_tick |= is_damage_tick
+            if lane_sim.deferred_steps < self.lod_steps and not lane_sim.attended:
+                continue # Far from every player: saved up until there are lod_steps of them
+            # Runs the saved up steps (if any) together with this one
+            lane_sim.step(time_delta * lane_sim.deferred_steps, lane_sim.deferred_damage_tick, sim_step, profiler, f"lanes.{lane_name(lane)}", steps_to_spawn, lane_sim.deferred_steps)
+            lane_sim.deferred_steps, lane_sim.deferred_damage_tick = 0, False
+            lane_sim.clear_late_waves()
+
+    def idle_steps(self, time_delta, sim_step):
+        steps_to_spawn = -sim_step % self.spawn_interval_sim_steps # Steps until (not including) the next spawn step
+        # A lane with deferred steps is behind: when it next runs, it moves and checks for contact as if those steps
+        # had already been idle, so they come out of its idle stretch
+        return min([steps_to_spawn] + [max(0, lane_sim.idle_steps(time_delta) - lane_sim.deferred_steps) for lane_sim in self.lanes.values()])
+
+    def steps_to_player_check(self, sim_step):
+        # Steps from sim_step until (not including) the next step that checks which lanes have players near them
+        if self.lod_steps == 1:
+            return math.inf
+        return -sim_step % self.lod_steps
+
+    def skip_idle(self, time_delta, steps, sim_step, damage_ticks: range):
+        # Same as `steps` calls of step() from sim_step, for steps within idle_steps() where only the last one can check
+        # for players (see steps_to_player_check). The players must already have been moved through all of the steps
+        if self.lod_steps > 1 and (sim_step + steps - 1) % self.lod_steps == 0:
+            self.skip_lanes(time_delta, steps - 1, sim_step, damage_ticks)
+            for lane_sim in self.lanes.values():
+                lane_sim.attended = lane_sim.has_player_within(self.config.lane_lod_radius)
+            self.skip_lanes(time_delta, 1, sim_step + steps - 1, damage_ticks)
+        else:
+            self.skip_lanes(time_delta, steps, sim_step, damage_ticks)
+
+    def skip_lanes(self, time_delta, steps, sim_step, damage_ticks: range):
+        # Each lane run draws a random order over the lane's entities. Nothing attacks, so the order itself doesn't
+        # matter, but the draws are replayed in the order stepping would make them to keep the random stream the same
+        shuffled = [(lane_sim.run_offsets(steps, self.lod_steps), lane_sim.get_all_wrappers()) for lane_sim in self.lanes.values() if not lane_sim.simultaneous_damage]
+        for i in range(steps):
+            for runs, wrappers in shuffled:
+                if i in runs:
+                    random.sample(wrappers, len(wrappers))
+        for lane_sim in self.lanes.values():
+            lane_sim.skip_idle(time_delta, steps, sim_step, damage_ticks, self.lod_steps)
 
     def spawn_waves(self, sim_time):
         if sim_time % self.spawn_interval_sim_steps == 0:
             for lane in self.lanes:
-                self.add_wave(Wave.default_wave(self.wave_num, Team.BLUE), lane)
-                self.add_wave(Wave.default_wave(self.wave_num, Team.RED), lane)
+                self.add_wave(Wave.default_wave(self.wave_num, Team.BLUE, self.config.wave_size), lane)
+                self.add_wave(Wave.default_wave(self.wave_num, Team.RED, self.config.wave_size), lane)
             self.wave_num += 1
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Per Simulator cache of mitigated damage, so a damage tick looks its damage up rather than working out armor and magic
+resist multipliers for every hit.
+
+Entries are keyed on DynamicStats.stats_key, which changes whenever an entity's effective stats are replaced (level up,
+item purchase, waves merging). Stale entries are never looked up again, and the cache is emptied once it grows past
+max_entries. Entities of the same template and level share a key (see stats.LevelTable), so lanes full of default waves
+and turrets only need a handful of entries.
+
+Damage of attackers at full scale (turrets, players) is one lookup, and gives exactly the same result as
+stats.mitigated_damage. Wave damage scales with the wave's health (Wave.damage_scale), and (damage * scale) * multiplier
+is not always bit for bit the same float as (damage * multiplier) * scale, so waves still work their damage out with
+mitigated_damage. The batched combat engine uses the full scale values for waves too, scaled afterwards.
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+from stats import DynamicStats, mitigated_damage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_MAX_ENTRIES = 4096
+
+class MitigationCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        assert max_entries > 0, "Need room for at least one entry"
+        self.max_entries = max_entries
+        self.pair_damage: dict[int, dict[int, float]] = {} # Attacker key -> defender key -> damage at scale 1
+        self.entries = 0
+
+    def clone(self) -> MitigationCache:
+        # Copy for Simulator.clone. Copies of entities keep their stats keys, so the entries stay valid
+        new = MitigationCache(self.max_entries)
+        new.pair_damage = {key: dict(row) for key, row in self.pair_damage.items()}
+        new.entries = self.entries
+        return new
+
+    def damage(self, attacker: DynamicStats, scale, defender: DynamicStats) -> float:
+        if scale != 1:
+            return mitigated_damage(attacker.vector, scale, defender.vector)
+        row = self.pair_damage.get(attacker.stats_key)
+        if row is None:
+            row = self.pair_damage[attacker.stats_key] = {}
+        damage = row.get(defender.stats_key)
+        if damage is None:
+            damage = row[defender.stats_key] = mitigated_damage(attacker.vector, 1, defender.vector)
+            self.added_entry()
+        return damage
+
+    def damage_matrix(self, attackers: Sequence[DynamicStats], defenders: Sequence[DynamicStats]):
+        # Damage at scale 1 from each attacker (rows) to each defender (columns), for the batched combat engine
+        return np.array([[self.damage(a, 1, d) for d in defenders] for a in attackers], dtype=float).reshape(len(attackers), len(defenders))
+
+    def added_entry(self):
+        self.entries += 1
+        if self.entries > self.max_entries:
+            self.clear()
+
+    def clear(self):
+        self.pair_damage.clear()
+        self.entries = 0
+
+    def __getstate__(self):
+        # Keys don't carry over to copies (see DynamicStats.__getstate__), so neither do the entries
+        state = self.__dict__.copy()
+        state["pair_damage"], state["entries"] = {}, 0
+        return state
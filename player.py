@@ -1,7 +1,7 @@
-from tkinter import NORMAL
+import math
 from typing import Optional
-from CONSTANTS import COMBAT_START_THRESHOLD, PRESENCE_THRESHOLD, RECALL_TIME, RESPAWN_TIME
-from entity import Entity, EntityState, Path, PathTarget, Team
+from CONSTANTS import COMBAT_START_THRESHOLD, PRESENCE_THRESHOLD, RECALL_TIME, RESPAWN_TIME, TARGET_LOC_THRESHOLD
+from entity import Entity, EntityState, Path, PathTarget, Team, repeat_add, steps_until_contact, steps_until_expired
 from entity import LaneEntity
 from MAP_CONSTANTS import MAP_X
 from inventory import Inventory
@@ -37,10 +37,15 @@ class Player(Entity):
         self.respawn_timer = None
         self.recall_timer = None
     
+    def clone(self) -> "Player":
+        new = super().clone()
+        new.inventory = self.inventory.clone()
+        return new
+
     def set_respawning(self):
         self.respawn_timer = RESPAWN_TIME
         self.set_state(EntityState.RESPAWNING)
-        self.position = RESPAWN_POINT[self.team]
+        self.set_pos(RESPAWN_POINT[self.team])
     
     def at_spawn(self):
         return self.distance_to_point(RESPAWN_POINT[self.team]) <= PRESENCE_THRESHOLD
@@ -57,20 +62,54 @@ class Player(Entity):
             if self.recall_timer <= 0:
                 self.recall_timer = None
                 self.set_state(EntityState.NORMAL)
-                self.position = RESPAWN_POINT[self.team]
+                self.set_pos(RESPAWN_POINT[self.team])
         elif self.attacking is not None:
             if self.attacking._state != EntityState.NORMAL:
                 self.set_attacking(None)
                 return
             if not is_damage_tick:
                 return
-            self.attacking.take_damage(self.get_damage())
+            self.attack(self.attacking)
         else:
             self.move(time_delta)
         
         if self.is_alive() and self.at_spawn():
             self.stats.heal()
     
+    def idle_steps(self, time_delta):
+        # How many upcoming steps this player can take without anything happening other than movement and timers ticking
+        # (no attacks, no timer expiring, no arrival at the path target and no healing at spawn)
+        if self.attacking is not None or self._state == EntityState.COMBAT:
+            return 0
+        steps = math.inf
+        if self._state == EntityState.RESPAWNING:
+            assert self.respawn_timer is not None, "Must have a respawn timer if respawning"
+            steps = steps_until_expired(self.respawn_timer, time_delta)
+        elif self._state == EntityState.RECALLING:
+            assert self.recall_timer is not None, "Must have a recall timer if recalling"
+            steps = steps_until_expired(self.recall_timer, time_delta)
+        elif self.path is not None:
+            if isinstance(self.path.target, Entity):
+                return 0 # Moving targets are not predicted
+            step_dist = self.get_speed() * time_delta
+            if step_dist > 0:
+                remaining = self.distance_to_point(self.path.target) - step_dist - TARGET_LOC_THRESHOLD
+                steps = max(0, math.floor(remaining / step_dist) - 1)
+        if self.is_alive() and self.stats.health < self.stats.vector.max_health:
+            steps = min(steps, steps_until_contact(self.distance_to_point(RESPAWN_POINT[self.team]), PRESENCE_THRESHOLD, self.get_speed(), time_delta))
+        return steps
+
+    def skip_idle(self, time_delta, steps):
+        # Same as `steps` calls of step() within idle_steps(). Timers skip ahead in one go, paths are followed a step at a time
+        if self._state == EntityState.RESPAWNING:
+            self.respawn_timer = repeat_add(self.respawn_timer, -time_delta, steps)
+        elif self._state == EntityState.RECALLING:
+            self.recall_timer = repeat_add(self.recall_timer, -time_delta, steps)
+        elif self.path is not None:
+            self.set_pos(self.path.advance(self.position, self.get_speed() * time_delta, steps))
+        if self.is_alive() and self.at_spawn():
+            self.stats.heal() # Already at full health (see idle_steps), so this only does what the last step would
+
     def reset_core(self):
         self.attacking = None
         self.clear_path()
@@ -88,11 +127,12 @@ class Player(Entity):
         return self.path is None and self.attacking is None and self._state == EntityState.NORMAL
 
     def start_recall(self):
+        # Returns whether the recall started
         if not self.can_recall():
-            print("can't recall")
-            return
+            return False
         self.recall_timer = RECALL_TIME
         self.set_state(EntityState.RECALLING)
+        return True
     
     def stop_recall(self, new_state: Optional[EntityState] = None):
         if self._state != EntityState.RECALLING:
@@ -122,10 +162,15 @@ class Player(Entity):
         self.stats.gain_experience(reward)
 
     def buy(self, item: Item):
-        if self.at_spawn() and self.inventory.buy(item):
-            self.stats.apply_item_stats(self.inventory.get_item_stats())
-            return True
-        return False
+        if not self.at_spawn():
+            return False
+        replaced = self.inventory.replaced_by(item)
+        if not self.inventory.buy(item):
+            return False
+        for old_item in replaced:
+            self.stats.remove_item(old_item.stats)
+        self.stats.add_item(item.stats)
+        return True
     
     @staticmethod
     def default_player(position, team: Team, player_id):
@@ -0,0 +1,95 @@
+"""
+Opt-in per-phase profiler for Simulator steps.
+When a StepProfiler is attached (Simulator.enable_profiling), Map.step and the lane simulators time each phase of the
+step and record entity counts at the end of every tick. When none is attached the only cost is an `is not None` check
+per phase.
+
+Phase names are dotted so related phases sort together, e.g. "lanes.TOP.set_attacking".
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    total_time: float = 0 # Wall time in seconds
+    max_time: float = 0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls > 0 else 0
+
+@dataclass
+class TickCounts:
+    sim_step: int
+    entities: int
+    waves: int
+    turrets: int
+    combats: int
+
+@dataclass
+class ProfileReport:
+    steps: int
+    total_time: float # Sum of the top level phases (phases without a dot in their name)
+    phases: dict[str, PhaseStats]
+    ticks: list[TickCounts]
+
+    def summary_table(self, sort_by_time=True) -> str:
+        names = sorted(self.phases, key=lambda name: -self.phases[name].total_time) if sort_by_time else sorted(self.phases)
+        width = max([len("phase")] + [len(name) for name in names])
+        lines = [f"{'phase':<{width}}  {'calls':>8}  {'total ms':>10}  {'mean us':>9}  {'max us':>9}  {'share':>6}"]
+        for name in names:
+            stats = self.phases[name]
+            share = stats.total_time / self.total_time if self.total_time > 0 else 0
+            lines.append(
+                f"{name:<{width}}  {stats.calls:>8}  {stats.total_time * 1e3:>10.2f}  "
+                f"{stats.mean_time * 1e6:>9.1f}  {stats.max_time * 1e6:>9.1f}  {share:>6.1%}"
+            )
+        if self.ticks:
+            last = self.ticks[-1]
+            peak = max(t.entities for t in self.ticks)
+            lines.append(f"{self.steps} steps, {self.total_time * 1e3:.2f} ms, entities at end {last.entities} (peak {peak}), waves {last.waves}, combats {last.combats}")
+        return "\n".join(lines)
+
+class StepProfiler:
+    def __init__(self, record_ticks=True) -> None:
+        self.record_ticks = record_ticks
+        self.phases: dict[str, PhaseStats] = {}
+        self.ticks: list[TickCounts] = []
+        self.steps = 0
+
+    def start(self) -> float:
+        return time.perf_counter()
+
+    def lap(self, name: str, start: float) -> float:
+        # Records the time since start against the phase and returns the current time, so phases can be chained
+        now = time.perf_counter()
+        elapsed = now - start
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.calls += 1
+        stats.total_time += elapsed
+        if elapsed > stats.max_time:
+            stats.max_time = elapsed
+        return now
+
+    def record_tick(self, sim_step, entities, waves, turrets, combats):
+        self.steps += 1
+        if self.record_ticks:
+            self.ticks.append(TickCounts(sim_step, entities, waves, turrets, combats))
+
+    def reset(self):
+        self.phases = {}
+        self.ticks = []
+        self.steps = 0
+
+    def report(self) -> ProfileReport:
+        total_time = sum(stats.total_time for name, stats in self.phases.items() if "." not in name)
+        phases = {name: PhaseStats(stats.calls, stats.total_time, stats.max_time) for name, stats in self.phases.items()}
+        return ProfileReport(self.steps, total_time, phases, list(self.ticks))
+
+    def summary_table(self) -> str:
+        return self.report().summary_table()
@@ -0,0 +1,76 @@
+"""
+Registry of the entities on the Map, indexed by id, type and team.
+All indexes are insertion ordered dicts, so adding and removing are O(1) and iterating gives entities in the order they
+were added (the same order the old flat entities list had).
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional, Type, TypeVar
+
+from entity import Entity, Team
+from player import Player
+
+E = TypeVar("E", bound=Entity)
+
+class EntityRegistry:
+    def __init__(self) -> None:
+        self.next_id = 0
+        self.by_id: dict[int, Entity] = {}
+        self.by_type: dict[type, dict[int, Entity]] = {}
+        self.by_team: dict[Team, dict[int, Entity]] = {}
+        self.players_by_player_id: dict[str, Player] = {}
+
+    def add(self, entity: Entity):
+        assert entity.entity_id is None, "Tried to add an entity that is already registered"
+        entity.entity_id = self.next_id
+        self.next_id += 1
+        self.by_id[entity.entity_id] = entity
+        self.by_type.setdefault(type(entity), {})[entity.entity_id] = entity
+        self.by_team.setdefault(entity.team, {})[entity.entity_id] = entity
+        if isinstance(entity, Player):
+            self.players_by_player_id[entity.player_id] = entity
+
+    def remove(self, entity: Entity):
+        entity_id = entity.entity_id
+        assert entity_id is not None and self.by_id.get(entity_id) is entity, "Tried to remove an entity that is not registered"
+        del self.by_id[entity_id]
+        del self.by_type[type(entity)][entity_id]
+        del self.by_team[entity.team][entity_id]
+        if isinstance(entity, Player):
+            del self.players_by_player_id[entity.player_id]
+        entity.entity_id = None
+
+    def clone(self, clones: dict[Entity, Entity]) -> EntityRegistry:
+        # Copy for Simulator.clone, holding the copies of the entities. Ids stay the same
+        new = EntityRegistry()
+        new.next_id = self.next_id
+        new.by_id = {entity_id: clones[e] for entity_id, e in self.by_id.items()}
+        new.by_type = {t: {entity_id: clones[e] for entity_id, e in entities.items()} for t, entities in self.by_type.items()}
+        new.by_team = {team: {entity_id: clones[e] for entity_id, e in entities.items()} for team, entities in self.by_team.items()}
+        new.players_by_player_id = {player_id: clones[p] for player_id, p in self.players_by_player_id.items()} # type: ignore copies of players are players
+        return new
+
+    def get(self, entity_id: int) -> Optional[Entity]:
+        return self.by_id.get(entity_id)
+
+    def get_player(self, player_id) -> Optional[Player]:
+        return self.players_by_player_id.get(player_id)
+
+    def of_type(self, entity_type: Type[E]) -> Iterator[E]:
+        # Entities whose type is exactly entity_type (entity classes are not subclassed further)
+        return iter(self.by_type.get(entity_type, {}).values()) # type:ignore values are all of entity_type
+
+    def of_team(self, team: Team) -> Iterator[Entity]:
+        return iter(self.by_team.get(team, {}).values())
+
+    def count_type(self, entity_type: type) -> int:
+        return len(self.by_type.get(entity_type, {}))
+
+    def __contains__(self, entity: Entity):
+        return entity.entity_id is not None and self.by_id.get(entity.entity_id) is entity
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(self.by_id.values())
+
+    def __len__(self):
+        return len(self.by_id)
@@ -0,0 +1,165 @@
+"""
+Rollout service that spreads headless simulator runs across a pool of worker processes.
+Each rollout starts from a copy of a given starting state, applies one action script up to a horizon and returns a
+compact record of what happened (gold, experience, turrets lost and kills per team).
+
+Workers are shared-nothing: the starting state is pickled once to a file, and each worker loads it the first time it
+sees it and keeps the bytes cached, so later rollouts from the same state only pay for unpickling a fresh copy.
+Workers only keep the last WORKER_STATE_CACHE_SIZE states, and the file is deleted once its run() has finished, so a
+long lived service searching over many starting states doesn't keep growing.
+The pool is created once and reused for every call to run().
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import Iterator, Optional, Sequence
+
+from entity import Team, Turret
+from headless import ActionSchedule, HeadlessRunner
+from sim import Simulator
+
+WORKER_STATE_CACHE_SIZE = 4
+
+# Per worker LRU cache of pickled starting states, keyed by the path they were loaded from
+_worker_states: OrderedDict[str, bytes] = OrderedDict()
+
+@dataclass
+class TeamTotals:
+    gold: dict[Team, float]
+    experience: dict[Team, float]
+    turrets: dict[Team, int]
+    kills: dict[Team, int]
+
+    @staticmethod
+    def from_sim(sim: Simulator):
+        totals = TeamTotals(
+            gold={Team.BLUE: 0, Team.RED: 0},
+            experience={Team.BLUE: 0, Team.RED: 0},
+            turrets={Team.BLUE: 0, Team.RED: 0},
+            kills=dict(sim.map.kills_by_team),
+        )
+        for player in sim.map.players:
+            totals.gold[player.team] += player.inventory.gold_earned
+            totals.experience[player.team] += player.stats.leveled.experience
+        for e in sim.map.entities.of_type(Turret):
+            if e.is_alive():
+                totals.turrets[e.team] += 1
+        return totals
+
+@dataclass
+class RolloutResult:
+    script_index: int
+    steps: int
+    wall_time: float
+    gold: dict[Team, float] # Gold earned during the rollout, whether or not it was spent
+    experience: dict[Team, float] # Experience gained during the rollout
+    turrets_lost: dict[Team, int]
+    kills: dict[Team, int]
+
+def _load_state(state_path: str) -> Simulator:
+    state = _worker_states.get(state_path)
+    if state is None:
+        with open(state_path, "rb") as f:
+            state = _worker_states[state_path] = f.read()
+        if len(_worker_states) > WORKER_STATE_CACHE_SIZE:
+            _worker_states.popitem(last=False)
+    else:
+        _worker_states.move_to_end(state_path)
+    return pickle.loads(state)
+
+def _run_chunk(state_path: str, tasks: list[tuple[int, ActionSchedule, int]], horizon: int) -> list[RolloutResult]:
+    results = []
+    for script_index, script, seed in tasks:
+        random.seed(seed)
+        sim = _load_state(state_path)
+        if sim.map.combat_engine is not None:
+            sim.map.combat_engine.reseed(seed) # Its RNG state was pickled along with the starting state
+        start = TeamTotals.from_sim(sim)
+        start_step = sim.sim_step
+        # Scripts are relative to the starting state's sim_step
+        shifted = [replace(action, sim_step=action.sim_step + start_step) for action in script]
+        game = HeadlessRunner(max_steps=start_step + horizon).run_game(shifted, sim=sim)
+        end = TeamTotals.from_sim(sim)
+        results.append(RolloutResult(
+            script_index=script_index,
+            steps=game.steps,
+            wall_time=game.wall_time,
+            gold={team: end.gold[team] - start.gold[team] for team in start.gold},
+            experience={team: end.experience[team] - start.experience[team] for team in start.experience},
+            turrets_lost={team: start.turrets[team] - end.turrets[team] for team in start.turrets},
+            kills={team: end.kills[team] - start.kills[team] for team in start.kills},
+        ))
+    return results
+
+class RolloutService:
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.state_dir = tempfile.mkdtemp(prefix="moba_rollout_")
+        self.next_state_id = 0
+
+    def register_state(self, sim: Simulator) -> str:
+        # Writes the starting state once so workers can load it without it being sent along with every task
+        path = os.path.join(self.state_dir, f"state_{self.next_state_id}.pkl")
+        self.next_state_id += 1
+        with open(path, "wb") as f:
+            pickle.dump(sim, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    def run(self, start_state: Simulator, scripts: Sequence[ActionSchedule], horizon: int, chunk_size: Optional[int] = None, seed: Optional[int] = None) -> Iterator[RolloutResult]:
+        """
+        Runs every script from start_state for `horizon` sim steps and yields results as they complete (not in script order).
+        Script i is run with random seed `seed + i`, so results are reproducible when a seed is given.
+        """
+        state_path = self.register_state(start_state)
+        if seed is None:
+            seed = random.randrange(2**31)
+        if chunk_size is None:
+            chunk_size = max(1, len(scripts) // (self.max_workers * 4)) # A few chunks per worker to keep them all busy
+        tasks = [(i, list(script), seed + i) for i, script in enumerate(scripts)]
+        pending = {
+            self.executor.submit(_run_chunk, state_path, tasks[i:i + chunk_size], horizon)
+            for i in range(0, len(tasks), chunk_size)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        finally:
+            # Also reached if the caller stops iterating early: chunks that haven't started are dropped, and running ones
+            # are waited for, so the file isn't deleted while a worker may still be reading it
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            os.remove(state_path)
+
+    def close(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+if __name__ == "__main__":
+    from headless import ScheduledAction
+    from controller import ActionType
+
+    scripts = [[ScheduledAction(0, ActionType.MOVE_TO_LOCATION, "A", (75 + i * 10, 0))] for i in range(64)]
+    with RolloutService() as service:
+        start = time.perf_counter()
+        results = list(service.run(Simulator(), scripts, horizon=3000, seed=0))
+        elapsed = time.perf_counter() - start
+    steps = sum(r.steps for r in results)
+    print(f"{len(results)} rollouts, {steps} steps in {elapsed:.2f}s ({steps / elapsed:.1f} steps/s on {service.max_workers} workers)")
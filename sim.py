@@ -1,13 +1,59 @@
+from __future__ import annotations
+
 
 import math
-from typing import Optional, Sequence
+from copy import deepcopy
+from typing import Callable, Optional, Sequence
 
-from CONSTANTS import COMBAT_INCLUDE_THRESHOLD, COMBAT_START_THRESHOLD, DAMAGE_APPLY_INTERVAL, PRESENCE_THRESHOLD, SIM_STEPS_PER_SECOND
+from CONSTANTS import COMBAT_INCLUDE_THRESHOLD, COMBAT_START_THRESHOLD, DAMAGE_APPLY_INTERVAL, PRESENCE_THRESHOLD, SIM_STEPS_PER_SECOND, SPATIAL_GRID_CELL_SIZE
 from MAP_CONSTANTS import MAP_X
 from combat import Combat
+from combat_engine import CombatEngine
 from lane import LaneSimulator
 from player import Player
-from entity import Entity, LaneEntity, Wave, EntityState, Team, Turret, Wave
+from entity import Entity, LaneEntity, Wave, EntityState, Team, Turret, Wave, clone_of
+from entity_store import EntityStore
+from events import DEFAULT_EVENT_CAPACITY, EventLog, PlayerKilled, TurretDestroyed
+from mitigation_cache import MitigationCache
+from profiler import StepProfiler
+from registry import EntityRegistry
+from sim_config import DEFAULT_CONFIG, SimConfig
+from spatial_index import SpatialHashGrid
+
+IDLE_CHECK_MAX_BACKOFF = 64 # Max steps between checks for an idle stretch in Simulator.advance_until
+
+# For each time_delta, the values Simulator.damage_tick_timer goes through from one damage tick to the next (the last
+# one is negative, which makes its step a damage tick) and the position of each value in that list
+_damage_tick_cycles: dict[float, tuple[list[float], dict[float, int]]] = {}
+
+def damage_tick_cycle(time_delta):
+    cycle = _damage_tick_cycles.get(time_delta)
+    if cycle is None:
+        values = [DAMAGE_APPLY_INTERVAL]
+        while values[-1] >= 0:
+            values.append(values[-1] - time_delta)
+        cycle = _damage_tick_cycles[time_delta] = (values, {value: i for i, value in enumerate(values)})
+    return cycle
+
+def damage_ticks(timer, time_delta, sim_step, steps) -> tuple[range, float]:
+    """
+    The sim steps among the `steps` from sim_step that are damage ticks, and the damage tick timer after them, for a
+    timer that is at `timer` at sim_step. Gives the same floats as Simulator.finish_step without going through the steps
+    """
+    values, index = damage_tick_cycle(time_delta)
+    end, first_tick = sim_step + steps, None
+    while timer not in index and sim_step < end: # Only until the first tick, if the timer was set to something else
+        if timer < 0:
+            first_tick, timer = sim_step, DAMAGE_APPLY_INTERVAL
+        else:
+            timer -= time_delta
+        sim_step += 1
+    if timer not in index:
+        return range(0), timer
+    i = index[timer]
+    if first_tick is None:
+        first_tick = sim_step + len(values) - 1 - i
+    return range(first_tick, end, len(values)), values[(i + end - sim_step) % len(values)]
 
 PLAYER_START_INFO = {
     Team.BLUE: [
@@ -22,27 +68,84 @@ PLAYER_START_INFO = {
     ]
 }
 
+def get_player_start_info(team_size):
+    # The first three players per team are the standard ones. Extra players are lined up in rows of four behind them
+    start_info = {team: PLAYER_START_INFO[team][:team_size] for team in PLAYER_START_INFO}
+    for i in range(len(PLAYER_START_INFO[Team.BLUE]), team_size):
+        x, y = (i % 4) * 25, 25 + (i // 4) * 25
+        start_info[Team.BLUE].append(((x, y), f"BLUE{i}"))
+        start_info[Team.RED].append(((MAP_X - x, y), f"RED{i}"))
+    return start_info
+
 class Map:
-    def __init__(self):
-        self.entities: list[Entity] = []
+    def __init__(self, use_entity_store=False, config: SimConfig = DEFAULT_CONFIG):
+        self.config = config
+        self.entities = EntityRegistry()
+        self.grid = SpatialHashGrid(SPATIAL_GRID_CELL_SIZE)
+        self.store: Optional[EntityStore] = EntityStore() if use_entity_store else None # Enables vectorized range/threshold checks
         self.combats: list[Combat] = []
+        self.mitigation = MitigationCache()
+        self.combat_engine: Optional[CombatEngine] = CombatEngine(mitigation=self.mitigation, store=self.store) if config.batched_combat else None
         self.players: Sequence[Player] = []
-        for team in PLAYER_START_INFO:
-            for info in PLAYER_START_INFO[team]:
+        self.kills_by_team: dict[Team, int] = {Team.BLUE: 0, Team.RED: 0} # Player kills scored by each team
+        self.profiler: Optional[StepProfiler] = None # Set by Simulator.enable_profiling
+        self.events: Optional[EventLog] = EventLog() # None when disabled (Simulator.disable_events)
+        start_info = get_player_start_info(config.team_size)
+        for team in start_info:
+            for info in start_info[team]:
                 player = Player.default_player(info[0], team, info[1])
                 self.add_entity(player)
                 self.players.append(player)
-        self.lanes = LaneSimulator(self.add_entity, self.players, lambda x: None)
+        self.lanes = LaneSimulator(self.add_entity, self.players, self.on_lane_entity_removed, store=self.store, config=config, events=self.events)
 
     def add_entity(self, entity):
-        self.entities.append(entity)
+        self.entities.add(entity)
+        self.grid.insert(entity)
+        entity.spatial_index = self.grid
+        entity.mitigation = self.mitigation
+        if self.store is not None:
+            self.store.attach(entity)
+
+    def clone(self) -> Map:
+        # See Simulator.clone
+        new = object.__new__(Map)
+        new.__dict__.update(self.__dict__)
+        clones: dict[Entity, Entity] = {e: e.clone() for e in self.entities}
+        for e in list(clones.values()):
+            e.link_clone(clones)
+        new.entities = self.entities.clone(clones)
+        new.grid = self.grid.clone(clones)
+        new.store = None if self.store is None else self.store.clone(clones)
+        new.mitigation = self.mitigation.clone()
+        new.events = None if self.events is None else self.events.clone()
+        new.combat_engine = None if self.combat_engine is None else self.combat_engine.clone(new.mitigation, new.store)
+        new.combats = [combat.clone(clones, new.events) for combat in self.combats]
+        new.players = [clone_of(clones, p) for p in self.players] # type: ignore copies of players are players
+        new.kills_by_team = dict(self.kills_by_team)
+        new.profiler = deepcopy(self.profiler)
+        new.lanes = self.lanes.clone(clones, new.add_entity, new.players, new.on_lane_entity_removed, new.store, new.events)
+        # Every copy (including any made along the way by clone_of) is pointed at the copy's indexes
+        for old, e in clones.items():
+            e.spatial_index = None if old.spatial_index is None else new.grid
+            e.store = None if old.store is None else new.store
+            e.mitigation = None if old.mitigation is None else new.mitigation
+        return new
+
+    def set_event_log(self, events: Optional[EventLog]):
+        # Switches every part of the map (lanes, running combats) over to the given log, or turns events off with None
+        self.events = events
+        self.lanes.set_event_log(events)
+        for combat in self.combats:
+            combat.events = events
 
     def find_entities_in_range(
             self, position, range_dist,
             exclude=None, entities_list: Optional[Sequence[Entity]] = None, team: Optional[Team] = None, state: Optional[EntityState] = None) -> Sequence[Entity]:
         result = []
         if entities_list is None:
-            entities_list = self.entities
+            if self.store is not None:
+                return self.store.find_in_range(position, range_dist, exclude=exclude, team=team, state=state)
+            entities_list = self.grid.query(position, range_dist) # Only look at entities in nearby cells
         for e in entities_list:
             if state is not None and e._state != state:
                 continue
@@ -58,90 +161,252 @@ class Map:
             if player.distance_to_entity(combat) <= COMBAT_INCLUDE_THRESHOLD:
                 return combat
     
-    def start_combat_at_location(self, position):
+    def combat_participants_at_location(self, position) -> Optional[Sequence[Entity]]:
+        # The entities a combat started at the position would include, or None if no combat would start there
         entities = self.find_entities_in_range(position, COMBAT_START_THRESHOLD, state=EntityState.NORMAL)
         has_red_player = any([e.team == Team.RED for e in entities if e._state == EntityState.NORMAL])
         has_blue_player = any([e.team == Team.BLUE for e in entities if e._state == EntityState.NORMAL])
         if has_red_player and has_blue_player:
-            entities_to_use = self.find_entities_in_range(position, COMBAT_INCLUDE_THRESHOLD, state=EntityState.NORMAL)
-            self.combats.append(Combat(entities_to_use, position))
+            return self.find_entities_in_range(position, COMBAT_INCLUDE_THRESHOLD, state=EntityState.NORMAL)
+        return None
+
+    def start_combat_at_location(self, position):
+        entities_to_use = self.combat_participants_at_location(position)
+        if entities_to_use is not None:
+            self.combats.append(Combat(entities_to_use, position, self.events))
 
     def join_combat(self, player: Player, combat: Combat):
         if player.distance_to_entity(combat) <= COMBAT_INCLUDE_THRESHOLD:
             combat.add_entity(player)
     
     def get_players(self) -> list[Player]:
-        return [e for e in self.entities if isinstance(e, Player)]
+        return list(self.entities.of_type(Player))
     
     def get_player_by_id(self, player_id):
-        for p in self.get_players():
-            if p.player_id == player_id:
-                return p
+        return self.entities.get_player(player_id)
     
     def distribute_rewards(self):
         # Distributes rewards for damaging waves
         players = self.get_players()
-        for e in self.entities:
-            if isinstance(e, Wave):
-                rew = e.accept_reward()
-                in_range: list[Player] = self.find_entities_in_range(e.position, PRESENCE_THRESHOLD, entities_list=players, team=e.team.enemy()) # type:ignore it's restricted to a list of players
-                if len(in_range) > 0:
-                    if len(in_range) > 1:
-                        rew = rew * 1.3 # Sharing multiplier
-                    split_reward = rew / len(in_range)
-                    for player in in_range:
-                        player.apply_reward(split_reward)
+        for e in self.entities.of_type(Wave):
+            rew = e.accept_reward()
+            in_range: list[Player] = self.find_entities_in_range(e.position, PRESENCE_THRESHOLD, entities_list=players, team=e.team.enemy()) # type:ignore it's restricted to a list of players
+            if len(in_range) > 0:
+                if len(in_range) > 1:
+                    rew = rew * 1.3 # Sharing multiplier
+                split_reward = rew / len(in_range)
+                for player in in_range:
+                    player.apply_reward(split_reward)
     
+    def on_lane_entity_removed(self, entity: Entity):
+        # Called by the lane simulator when it stops tracking an entity. Dead entities are cleaned up in step.
+        # This is a method rather than a lambda so that simulators can be pickled
+        pass
+
     def on_entity_death(self, entity: Entity):
         if isinstance(entity, Player):
+            self.kills_by_team[entity.team.enemy()] += 1
             entity.set_respawning()
+            if self.events is not None:
+                self.events.emit(PlayerKilled(entity.player_id, entity.team))
         else:
-            self.entities.remove(entity)
-            self.lanes.remove_entity(entity)
+            if isinstance(entity, Turret) and self.events is not None:
+                self.events.emit(TurretDestroyed(entity.team, entity.position))
+            self.remove_entity(entity)
+
+    def remove_entity(self, entity: Entity):
+        # Takes a (non player) entity out of every index on the map
+        self.entities.remove(entity)
+        self.grid.remove(entity)
+        entity.spatial_index = None
+        entity.mitigation = None
+        if self.store is not None:
+            self.store.detach(entity)
+        self.lanes.remove_entity(entity)
 
     def step(self, time_delta, sim_time, is_damage_tick, sim_step):
+        profiler = self.profiler
+        if profiler is not None:
+            t = profiler.start()
         for entity in self.get_players():
             # Only handle things for players. LaneSimulator handles wave movement
             if entity._state == EntityState.COMBAT:
                 continue # The combat class does handling for this state
             entity.step(time_delta, is_damage_tick)
-        self.lanes.step(time_delta, sim_time, is_damage_tick, sim_step)
+        if profiler is not None:
+            t = profiler.lap("players", t)
+        self.lanes.step(time_delta, sim_time, is_damage_tick, sim_step, profiler)
+        if profiler is not None:
+            t = profiler.lap("lanes", t)
 
-        finished_combats = []
-        for combat in self.combats:
-            done = not combat.step(time_delta, is_damage_tick)
-            if done:
-                combat.cleanup()
-                finished_combats.append(combat)
+        if self.combat_engine is not None:
+            still_active = self.combat_engine.step(self.combats, time_delta, is_damage_tick)
+        else:
+            still_active = [combat.step(time_delta, is_damage_tick) for combat in self.combats]
+        finished_combats = [combat for combat, active in zip(self.combats, still_active) if not active]
         for finished_combat in finished_combats:
+            finished_combat.cleanup()
             self.combats.remove(finished_combat)
+        if profiler is not None:
+            t = profiler.lap("combats", t)
         
-        for entity in self.entities:
+        to_clean_up = [entity for entity in self.entities if entity._state == EntityState.DEAD or entity._state == EntityState.FINISHED]
+        for entity in to_clean_up:
             if entity._state == EntityState.DEAD:
                 self.on_entity_death(entity)
+            else:
+                self.remove_entity(entity)
+        if profiler is not None:
+            t = profiler.lap("cleanup", t)
         
         self.distribute_rewards()
+        if profiler is not None:
+            profiler.lap("rewards", t)
+            self.record_tick(profiler, sim_step)
+
+    def record_tick(self, profiler: StepProfiler, sim_step):
+        profiler.record_tick(
+            sim_step,
+            entities=len(self.entities),
+            waves=self.entities.count_type(Wave),
+            turrets=self.entities.count_type(Turret),
+            combats=len(self.combats),
+        )
+
 
+    def idle_steps(self, time_delta, sim_step):
+        """
+        Number of upcoming steps guaranteed to be idle: only movement along paths/lanes and timers ticking, with no contact,
+        combat, wave spawn/combine, arrival, or timer expiring. Bounds are conservative, so this may undercount
+        """
+        if len(self.combats) > 0:
+            return 0
+        for e in self.entities:
+            if e._state in (EntityState.DEAD, EntityState.COMBAT):
+                return 0
+            if isinstance(e, Wave) and e.accumulated_reward != 0:
+                return 0
+        steps = self.lanes.idle_steps(time_delta, sim_step)
+        for player in self.get_players():
+            steps = min(steps, player.idle_steps(time_delta))
+        return steps
+
+    def skip_idle(self, time_delta, steps, sim_step, damage_ticks: range):
+        # Same as `steps` calls of step() from sim_step, for steps within idle_steps(), without going through them one at a
+        # time. Lanes far from players check the player positions every few steps, so the players are moved up to each check
+        players = self.get_players()
+        while steps > 0:
+            run = min(steps, self.lanes.steps_to_player_check(sim_step) + 1)
+            for player in players:
+                player.skip_idle(time_delta, run)
+            self.lanes.skip_idle(time_delta, run, sim_step, damage_ticks)
+            sim_step += run
+            steps -= run
 
     def attack_enemy_lane_entity_in_range(self, player: Player):
         # If there is a LaneEntity in range, will command the player to attack it
-        for e in self.entities:
-            if e.team == player.team.enemy() and isinstance(e, LaneEntity):
+        for e in self.entities.of_team(player.team.enemy()):
+            if isinstance(e, LaneEntity):
                 player.set_attacking(e)
 
 class Simulator:
-    def __init__(self) -> None:
-        self.map = Map()
+    def __init__(self, use_entity_store=False, config: SimConfig = DEFAULT_CONFIG) -> None:
+        self.map = Map(use_entity_store=use_entity_store, config=config)
         self.sim_step = 0
         self.time_delta = 1 / SIM_STEPS_PER_SECOND
         self.damage_tick_timer = DAMAGE_APPLY_INTERVAL
     
+    def clone(self) -> Simulator:
+        """
+        Independent copy of the simulator, for snapshots (see game_tree.py). Only state that changes as the game runs is
+        copied: entities and their stats, inventories and timers, the Map's indexes, lanes and combats. Things that
+        never change once built (the config, lane geometry, level tables, items, AllStats objects) are shared with the
+        copy. Event log subscribers are not carried over, as with deepcopy
+        """
+        new = object.__new__(Simulator)
+        new.__dict__.update(self.__dict__)
+        new.map = self.map.clone()
+        return new
+
     def step(self):
         is_damage_tick = self.damage_tick_timer < 0
             
         self.map.step(self.time_delta, self.sim_step * self.time_delta, is_damage_tick, self.sim_step)
+        self.finish_step(is_damage_tick)
+
+    def finish_step(self, is_damage_tick):
         self.sim_step += 1
+        if self.map.events is not None:
+            self.map.events.sim_step = self.sim_step
         if is_damage_tick:
             self.damage_tick_timer = DAMAGE_APPLY_INTERVAL
         else:
-            self.damage_tick_timer -= self.time_delta
\ No newline at end of file
+            self.damage_tick_timer -= self.time_delta
+
+    def advance_until(self, predicate: Optional[Callable[[Simulator], bool]] = None, max_time: Optional[float] = None):
+        """
+        Steps until predicate(self) is True or max_time simulated seconds have passed, returning the number of steps taken.
+        Stretches where nothing can happen except movement and timers are skipped through without any range checks,
+        with results identical to calling step() repeatedly. The predicate is checked after every regular step and after
+        every skipped stretch, so it should depend on events (contact, combat, arrival, timers) rather than exact positions
+        """
+        assert predicate is not None or max_time is not None, "Need a predicate or max_time to know when to stop"
+        end_step = math.inf if max_time is None else self.sim_step + round(max_time * SIM_STEPS_PER_SECOND)
+        start_step = self.sim_step
+        # Working out the idle stretch costs about as much as a step, so while things are busy it is rechecked with backoff
+        recheck_in, backoff = 0, 1
+        while self.sim_step < end_step:
+            if recheck_in <= 0:
+                idle_steps = min(self.map.idle_steps(self.time_delta, self.sim_step), end_step - self.sim_step)
+                if idle_steps > 0:
+                    self.skip_idle_steps(idle_steps)
+                    backoff = 1
+                else:
+                    recheck_in = backoff
+                    backoff = min(backoff * 2, IDLE_CHECK_MAX_BACKOFF)
+            if recheck_in > 0:
+                self.step()
+                recheck_in -= 1
+            if predicate is not None and predicate(self):
+                break
+        return self.sim_step - start_step
+
+    def skip_idle_steps(self, steps):
+        # Runs `steps` steps within Map.idle_steps() in one go, leaving everything as `steps` calls of step() would
+        profiler = self.map.profiler
+        if profiler is not None:
+            t = profiler.start()
+        ticks, self.damage_tick_timer = damage_ticks(self.damage_tick_timer, self.time_delta, self.sim_step, steps)
+        self.map.skip_idle(self.time_delta, steps, self.sim_step, ticks)
+        if profiler is not None:
+            profiler.lap("idle", t)
+            for sim_step in range(self.sim_step, self.sim_step + steps):
+                self.map.record_tick(profiler, sim_step)
+        self.sim_step += steps
+        if self.map.events is not None:
+            self.map.events.sim_step = self.sim_step
+
+    def enable_profiling(self, record_ticks=True) -> StepProfiler:
+        """
+        Attaches a StepProfiler that times each phase of every following step (see profiler.py) and returns it.
+        Use profiler.report() or profiler.summary_table() to read the results
+        """
+        self.map.profiler = StepProfiler(record_ticks=record_ticks)
+        return self.map.profiler
+
+    def disable_profiling(self) -> Optional[StepProfiler]:
+        profiler, self.map.profiler = self.map.profiler, None
+        return profiler
+
+    def enable_events(self, capacity: int = DEFAULT_EVENT_CAPACITY) -> EventLog:
+        # Starts a new event log keeping the last `capacity` events (see events.py) and returns it
+        events = EventLog(capacity)
+        events.sim_step = self.sim_step
+        self.map.set_event_log(events)
+        return events
+
+    def disable_events(self) -> Optional[EventLog]:
+        # Stops recording events. Returns the log that was in use
+        events = self.map.events
+        self.map.set_event_log(None)
+        return events
@@ -0,0 +1,48 @@
+"""
+Size settings for a game, given to the Simulator when it is built.
+The defaults give the standard game: 3 players per team, 3 lanes with 3 turrets per team each, default waves every
+WAVE_SPAWN_INTERVAL seconds.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from CONSTANTS import DAMAGE_APPLY_INTERVAL, SIM_STEPS_PER_SECOND
+
+WAVE_SPAWN_INTERVAL = 100 # Seconds between waves
+
+@dataclass(frozen=True)
+class SimConfig:
+    team_size: int = 3 # Players per team
+    lane_count: int = 3
+    wave_size: float = 1.0 # Multiplier on the health and damage of each spawned wave
+    wave_spawn_interval: float = WAVE_SPAWN_INTERVAL
+    # Fights between two lane entities with no players nearby are solved with lane_solver and skipped ahead rather than
+    # ticked. Damage in those fights is applied simultaneously, so results differ from the default random order
+    solve_unattended_lanes: bool = False
+    # Lane damage is worked out for every attacker before any of it is applied, rather than applied one attacker at a time
+    # in a random order. Results don't depend on the order (or the random stream), and match lane_solver exactly
+    simultaneous_lane_damage: bool = False
+    # Damage ticks of all combats are resolved together by combat_engine.CombatEngine (needs numpy), with damage within a
+    # tick applied simultaneously and misses and targets drawn from its own numpy RNG
+    batched_combat: bool = False
+    # Lanes with no player within lane_lod_radius of the lane path are stepped once every lane_lod_interval seconds,
+    # with a correspondingly larger time_delta, rather than every step. None keeps every lane at the full rate.
+    # Waves move and spawn as at the full rate, but contacts are only found once per coarse step, so waves can walk up to
+    # lane_lod_interval past where they would have stopped and fights can start a damage tick late. A lane that gets a
+    # player nearby runs its saved up steps straight away, with its waves as they are. Wave counts match the full rate
+    # until a fight comes out differently. After that, 15 minute games had each lane at most one fight (two waves) apart.
+    # With the default random lane damage the random stream differs too, which moves results about as much as another
+    # seed does. See lane.lane_divergence
+    lane_lod_radius: Optional[float] = None
+    lane_lod_interval: float = 1.0 # Seconds
+
+    def __post_init__(self):
+        assert self.team_size >= 0, "team_size can't be negative"
+        assert self.lane_count >= 1, "Need at least one lane"
+        assert self.wave_size > 0, "wave_size must be positive"
+        assert self.wave_spawn_interval > 0, "wave_spawn_interval must be positive"
+        assert self.lane_lod_radius is None or self.lane_lod_radius >= 0, "lane_lod_radius can't be negative"
+        # A coarse step applies at most one damage tick, so it can't cover more than one damage interval
+        assert 1 / SIM_STEPS_PER_SECOND <= self.lane_lod_interval <= DAMAGE_APPLY_INTERVAL, "lane_lod_interval must be between one step and one damage interval"
+
+DEFAULT_CONFIG = SimConfig()
@@ -0,0 +1,84 @@
+"""
+Uniform grid spatial index used by the Map for range queries.
+Entities are bucketed by the cell containing their position and re-bucketed whenever they move (see Entity.set_pos),
+so a range query only has to look at the cells overlapping the query circle instead of every entity on the map.
+"""
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Tuple
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+Cell = Tuple[int, int]
+
+class SpatialHashGrid:
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[Cell, set[Entity]] = {}
+        self.cell_by_entity: dict[Entity, Cell] = {}
+        # Insertion order of each entity, so query results come back in the same order as a linear scan would give
+        self.order: dict[Entity, int] = {}
+        self.next_order = 0
+
+    def clone(self, clones: dict[Entity, Entity]) -> SpatialHashGrid:
+        # Copy for Simulator.clone, holding the copies of the entities
+        new = SpatialHashGrid(self.cell_size)
+        new.cells = {cell: {clones[e] for e in bucket} for cell, bucket in self.cells.items()}
+        new.cell_by_entity = {clones[e]: cell for e, cell in self.cell_by_entity.items()}
+        new.order = {clones[e]: order for e, order in self.order.items()}
+        new.next_order = self.next_order
+        return new
+
+    def get_cell(self, position) -> Cell:
+        return (math.floor(position[0] / self.cell_size), math.floor(position[1] / self.cell_size))
+
+    def insert(self, entity: Entity):
+        cell = self.get_cell(entity.position)
+        self.cells.setdefault(cell, set()).add(entity)
+        self.cell_by_entity[entity] = cell
+        self.order[entity] = self.next_order
+        self.next_order += 1
+
+    def remove(self, entity: Entity):
+        cell = self.cell_by_entity.pop(entity, None)
+        if cell is None:
+            return
+        del self.order[entity]
+        bucket = self.cells[cell]
+        bucket.discard(entity)
+        if len(bucket) == 0:
+            del self.cells[cell]
+
+    def update(self, entity: Entity):
+        # Re-bucket an entity after its position changed
+        old_cell = self.cell_by_entity.get(entity)
+        if old_cell is None:
+            return
+        new_cell = self.get_cell(entity.position)
+        if new_cell == old_cell:
+            return
+        bucket = self.cells[old_cell]
+        bucket.discard(entity)
+        if len(bucket) == 0:
+            del self.cells[old_cell]
+        self.cells.setdefault(new_cell, set()).add(entity)
+        self.cell_by_entity[entity] = new_cell
+
+    def query(self, position, range_dist) -> list[Entity]:
+        # Returns candidates from every cell overlapping the square around the query circle, in insertion order.
+        # Callers still need to do the exact distance check
+        min_x, min_y = self.get_cell((position[0] - range_dist, position[1] - range_dist))
+        max_x, max_y = self.get_cell((position[0] + range_dist, position[1] + range_dist))
+        candidates: list[Entity] = []
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    candidates.extend(bucket)
+        candidates.sort(key=self.order.__getitem__)
+        return candidates
+
+    def __len__(self):
+        return len(self.cell_by_entity)
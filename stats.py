@@ -1,7 +1,13 @@
+from __future__ import annotations
+
+from bisect import bisect_right
 from dataclasses import dataclass, field
-from typing import Callable, Optional
+from itertools import count
+from typing import TYPE_CHECKING, Callable, Optional
 import textwrap
 
+if TYPE_CHECKING:
+    from entity import Entity
 
 EXPERIENCE_THRESHOLDS = {
     1: 0,
@@ -17,6 +23,10 @@ EXPERIENCE_THRESHOLDS = {
 }
 
 MAX_LEVEL = max(EXPERIENCE_THRESHOLDS.keys())
+LEVEL_THRESHOLDS = [EXPERIENCE_THRESHOLDS[level] for level in range(1, MAX_LEVEL + 1)] # Index i is the threshold of level i + 1
+
+def level_for_experience(experience):
+    return max(1, bisect_right(LEVEL_THRESHOLDS, experience))
 
 
 def indent(string: str, indentLevel: int = 1):
@@ -96,8 +106,8 @@ class HealthStats:
 
 @dataclass
 class AllStats:
-    health_stats: HealthStats = HealthStats()
-    damage_stats: DamageStats = DamageStats()
+    health_stats: HealthStats = field(default_factory=HealthStats)
+    damage_stats: DamageStats = field(default_factory=DamageStats)
     move_speed: float = 0
 
     def get_effective_damage(self, damage: DamageStats):
@@ -137,6 +147,135 @@ class AllStats:
             move_speed=move_speed
         )
 
+class StatVector:
+    """
+    All of an entity's stat values in one fixed layout of float slots. Updated in place (add, add_scaled, scale, load),
+    so hot paths like attack ticks can read and combine stats without building new stats objects.
+    The dataclasses above stay the public way to describe stats; from_stats/to_stats convert between the two.
+    """
+    __slots__ = ("max_health", "health_regen", "armor", "magic_resist", "physical_damage", "magic_damage", "true_damage", "move_speed")
+
+    def __init__(self, **values) -> None:
+        for name in StatVector.__slots__:
+            setattr(self, name, 0)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def from_stats(stats: AllStats):
+        return StatVector().load(stats)
+
+    @staticmethod
+    def from_values(*values):
+        # Values in __slots__ order
+        return StatVector(**dict(zip(StatVector.__slots__, values)))
+
+    def values(self):
+        return tuple(getattr(self, name) for name in StatVector.__slots__)
+
+    def __reduce__(self):
+        # Copies and snapshots store the values as a plain tuple
+        return (StatVector.from_values, self.values())
+
+    def load(self, stats: AllStats):
+        health, damage = stats.health_stats, stats.damage_stats
+        self.max_health = health.max_health
+        self.health_regen = health.health_regen
+        self.armor = health.armor
+        self.magic_resist = health.magic_resist
+        self.physical_damage = damage.physical_damage
+        self.magic_damage = damage.magic_damage
+        self.true_damage = damage.true_damage
+        self.move_speed = stats.move_speed
+        return self
+
+    def to_stats(self) -> AllStats:
+        return AllStats(
+            health_stats=HealthStats(self.max_health, self.health_regen, self.armor, self.magic_resist),
+            damage_stats=DamageStats(self.physical_damage, self.magic_damage, self.true_damage),
+            move_speed=self.move_speed
+        )
+
+    def copy(self) -> StatVector:
+        new = StatVector.__new__(StatVector)
+        new.max_health, new.health_regen, new.armor, new.magic_resist = self.max_health, self.health_regen, self.armor, self.magic_resist
+        new.physical_damage, new.magic_damage, new.true_damage, new.move_speed = self.physical_damage, self.magic_damage, self.true_damage, self.move_speed
+        return new
+
+    def copy_from(self, other: StatVector):
+        for name in StatVector.__slots__:
+            setattr(self, name, getattr(other, name))
+        return self
+
+    def add(self, other: StatVector):
+        return self.add_scaled(other, 1)
+
+    def add_stats(self, stats: AllStats, scalar):
+        # Same as add_scaled(StatVector.from_stats(stats), scalar), without the intermediate vector
+        health, damage = stats.health_stats, stats.damage_stats
+        self.max_health += health.max_health * scalar
+        self.health_regen += health.health_regen * scalar
+        self.armor += health.armor * scalar
+        self.magic_resist += health.magic_resist * scalar
+        self.physical_damage += damage.physical_damage * scalar
+        self.magic_damage += damage.magic_damage * scalar
+        self.true_damage += damage.true_damage * scalar
+        self.move_speed += stats.move_speed * scalar
+        return self
+
+    def add_scaled(self, other: StatVector, scalar):
+        for name in StatVector.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name) * scalar)
+        return self
+
+    def scale(self, scalar):
+        for name in StatVector.__slots__:
+            setattr(self, name, getattr(self, name) * scalar)
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, StatVector):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __repr__(self):
+        return "StatVector(" + ", ".join(f"{name}={getattr(self, name)}" for name in StatVector.__slots__) + ")"
+
+def mitigated_damage(attacker: StatVector, scale, defender: StatVector) -> float:
+    # Same result as defender's get_effective_damage on the attacker's damage * scale, worked out from the slots directly
+    total_damage = 0
+    total_damage += attacker.physical_damage * scale * (100 / (100 + defender.armor))
+    total_damage += attacker.magic_damage * scale * (100 / (100 + defender.magic_resist))
+    total_damage += attacker.true_damage * scale
+    return total_damage
+
+# Every distinct effective stats object gets a key, so per pair results (see mitigation_cache.py) can be looked up by key.
+# Keys are never reused within a process
+new_stats_key = count().__next__
+
+class LevelTable:
+    # Effective stats at every level for one stat template. Shared by all entities made from that template, so these
+    # AllStats objects must never be modified in place
+    def __init__(self, base: AllStats, level_increase: AllStats) -> None:
+        self.base = base
+        self.level_increase = level_increase
+        self.effective = [base + (level_increase * (level - 1)) for level in range(MAX_LEVEL + 1)] # Index 0 is unused
+        self.stats_keys = [new_stats_key() for _ in self.effective]
+
+    def __reduce__(self):
+        # Copies and snapshots look the table up again rather than carrying their own
+        return (shared_level_table, (self.base, self.level_increase))
+
+_level_tables: dict[tuple, LevelTable] = {}
+
+def shared_level_table(base: AllStats, level_increase: AllStats) -> LevelTable:
+    # Templates with the same values get the same table
+    key = (StatVector.from_stats(base).values(), StatVector.from_stats(level_increase).values())
+    table = _level_tables.get(key)
+    if table is None:
+        table = _level_tables[key] = LevelTable(base, level_increase)
+    return table
+
 @dataclass
 class LeveledStats:
     base: AllStats
@@ -144,14 +283,21 @@ class LeveledStats:
     effective: AllStats = field(init=False)
     level: int = field(init=False)
     experience: int = 0
+    table: LevelTable = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
+        self.table = shared_level_table(self.base, self.level_increase)
+        self.base, self.level_increase = self.table.base, self.table.level_increase
         self.set_level(1)
     
     def set_level(self, level):
-        self.effective = self.base + (self.level_increase * (level - 1))
+        self.effective = self.table.effective[level]
         self.level = level
 
+    @property
+    def stats_key(self):
+        return self.table.stats_keys[self.level]
+
     def gain_experience(self, experience):
         self.experience += experience
         if self.canLevelUp():
@@ -163,43 +309,148 @@ class LeveledStats:
         return self.level < MAX_LEVEL and EXPERIENCE_THRESHOLDS[self.level + 1] <= self.experience
     
     def updateLevel(self):
-        for newLevel in range(self.level + 1, MAX_LEVEL + 1):
-            if EXPERIENCE_THRESHOLDS[newLevel] <= self.experience:
-                self.level = newLevel
-            else:
-                break
+        self.set_level(level_for_experience(self.experience))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["effective"] # Comes from the shared table
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.effective = self.table.effective[self.level]
 
 @dataclass
 class ItemStats:
-    effective: AllStats = AllStats() # everything is zero by default
+    vector: StatVector = field(default_factory=StatVector) # Sum of the stats of every item held. Everything is zero by default
+    count: int = 0
+
+    @property
+    def effective(self) -> AllStats:
+        return self.vector.to_stats()
+
+    def add(self, stats: AllStats):
+        self.vector.add_stats(stats, 1)
+        self.count += 1
+
+    def remove(self, stats: AllStats):
+        self.vector.add_stats(stats, -1)
+        self.count -= 1
+
+    def clone(self) -> ItemStats:
+        return ItemStats(self.vector.copy(), self.count)
 
     def apply_item_stats(self, item_stats: list[AllStats]):
-        self.effective = AllStats()
+        self.vector.scale(0)
+        self.count = 0
         for stats in item_stats:
-            self.effective = self.effective + stats
+            self.add(stats)
 
 @dataclass
 class DynamicStats:
     # This stats object should persist on entities
-    health: float = field(init=False)
-    effective: AllStats = field(init=False)
+    _health: float = field(init=False)
     leveled: LeveledStats
-    items: ItemStats = ItemStats()
+    items: ItemStats = field(default_factory=ItemStats)
+    vector: StatVector = field(init=False, repr=False, compare=False) # Effective stats, always up to date
+    stats_key: int = field(init=False, repr=False, compare=False) # Changes whenever the effective stats change
+    _effective: Optional[AllStats] = field(init=False, repr=False, compare=False) # None until next read after a change
+    # The entity these stats belong to while it is in an EntityStore, which health and max health changes are written
+    # through to. Only set then, so entities without a store don't keep themselves alive in a reference cycle
+    owner: Optional[Entity] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
-        self.effective = self.leveled.effective + self.items.effective
-        self.health = self.effective.health_stats.max_health
+        self.vector = StatVector()
+        self.refresh_effective()
+        self.health = self.vector.max_health
+
+    @property
+    def health(self) -> float:
+        return self._health
+
+    @health.setter
+    def health(self, health: float):
+        self._health = health
+        owner = self.owner
+        if owner is not None and owner.store is not None:
+            owner.store.health[owner.store_slot] = health
+
+    def stats_replaced(self):
+        owner = self.owner
+        if owner is not None and owner.store is not None:
+            owner.store.stats_replaced(owner.store_slot, self.vector.max_health)
+
+    @property
+    def effective(self) -> AllStats:
+        # Only built when read, so item changes and level ups only update the vector
+        if self._effective is None:
+            self._effective = self.vector.to_stats()
+        return self._effective
+
+    @effective.setter
+    def effective(self, effective: AllStats):
+        self.set_effective(effective)
+
+    def set_effective(self, effective: AllStats):
+        # Replacing effective stats should go through here so the vector and key stay in sync
+        self._effective = effective
+        self.vector.load(effective)
+        self.stats_key = self.leveled.stats_key if effective is self.leveled.effective else new_stats_key()
+        self.stats_replaced()
+
+    def refresh_effective(self):
+        # Without items, the leveled stats are used as they are, so entities of a template share one object per level
+        if self.items.count == 0:
+            self.set_effective(self.leveled.effective)
+            return
+        self.vector.load(self.leveled.effective).add(self.items.vector)
+        self._effective = None
+        self.stats_key = new_stats_key()
+        self.stats_replaced()
+
+    def clone(self) -> DynamicStats:
+        # Copy for Simulator.clone. AllStats objects are never modified in place, so the effective and leveled stats
+        # objects are shared with the copy, and so is the key
+        new = object.__new__(DynamicStats)
+        new.__dict__.update(self.__dict__)
+        new.leveled = object.__new__(LeveledStats)
+        new.leveled.__dict__.update(self.leveled.__dict__)
+        new.items = self.items.clone()
+        new.vector = self.vector.copy()
+        return new
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["stats_key"] # Keys are only meaningful within the process that made them
+        if self._effective is self.leveled.effective:
+            del state["_effective"] # The shared level object, which LeveledStats restores from its table
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "_effective" not in state:
+            self._effective = self.leveled.effective
+        self.stats_key = self.leveled.stats_key if self._effective is self.leveled.effective else new_stats_key()
     
     def reevaluate(self):
-        missing_health = self.effective.health_stats.max_health - self.health
-        self.effective = self.leveled.effective + self.items.effective
-        self.health = self.effective.health_stats.max_health - missing_health
-        
+        # Missing health stays the same when max health changes
+        missing_health = self.vector.max_health - self.health
+        self.refresh_effective()
+        self.health = self.vector.max_health - missing_health
 
     def apply_item_stats(self, item_stats: list[AllStats]):
+        # Replaces all item stats. add_item/remove_item update them incrementally
         self.items.apply_item_stats(item_stats)
         self.reevaluate()
 
+    def add_item(self, stats: AllStats):
+        self.items.add(stats)
+        self.reevaluate()
+
+    def remove_item(self, stats: AllStats):
+        self.items.remove(stats)
+        self.reevaluate()
+
     def gain_experience(self, experience):
         if self.leveled.gain_experience(experience):
             self.reevaluate() # recompute stats if we leveled up
@@ -210,11 +461,11 @@ class DynamicStats:
         return effective_damage
 
     def heal(self):
-        self.health = self.effective.health_stats.max_health
+        self.health = self.vector.max_health
     
     def step_heal(self, time_delta):
-        new_health = self.health + self.effective.health_stats.health_regen * time_delta
-        self.health = max(self.effective.health_stats.max_health, new_health)
+        new_health = self.health + self.vector.health_regen * time_delta
+        self.health = max(self.vector.max_health, new_health)
 
     @staticmethod
     def make_stats(max_health, physical_damage, armor, magic_resist, move_speed):
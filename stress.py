@@ -0,0 +1,105 @@
+"""
+Stress test that ramps up the game size (players per team, lanes, wave size and spawn rate) and times the range and
+threshold checks that scale with the number of entities: Map.find_entities_in_range, SingleLaneSimulator.set_attacking
+and Vision.step.
+
+For each size the game is played for a while (with players spread over the lanes) so the lanes fill up with waves,
+then each check is timed over a number of repeats. The scaling exponent column compares the time per call with the
+previous size: about 1 means the check is linear in the number of entities, about 2 quadratic.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import time
+from dataclasses import dataclass
+
+from CONSTANTS import PRESENCE_THRESHOLD
+from MAP_CONSTANTS import get_lane_points
+from controller import ActionType
+from headless import HeadlessRunner, ScheduledAction
+from sim import Simulator
+from sim_config import SimConfig
+from vision import Vision
+
+# (team size, lane count) for each level of the ramp, ending at 50v50 on 10 lanes
+DEFAULT_RAMP = [(3, 3), (5, 3), (10, 4), (20, 6), (35, 8), (50, 10)]
+
+@dataclass
+class StressResult:
+    config: SimConfig
+    entities: int
+    find_in_range_time: float # Per call, seconds
+    set_attacking_time: float # All lanes, seconds
+    vision_time: float # One recalculating Vision.step, seconds
+
+def spread_players(sim: Simulator) -> list[ScheduledAction]:
+    # Sends player i of each team to the middle of lane i % lane_count
+    lane_count = sim.map.config.lane_count
+    schedule = []
+    for i, player in enumerate(sim.map.players):
+        points = get_lane_points(i % lane_count, lane_count)
+        schedule.append(ScheduledAction(0, ActionType.MOVE_TO_LOCATION, player.player_id, points[len(points) // 2]))
+    return schedule
+
+def time_call(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+def run_level(config: SimConfig, warmup_steps: int, repeats: int, use_entity_store: bool) -> StressResult:
+    sim = Simulator(use_entity_store=use_entity_store, config=config)
+    HeadlessRunner(max_steps=warmup_steps).run_game(spread_players(sim), sim=sim)
+    sim_map = sim.map
+
+    entities = list(sim_map.entities)
+    def find_in_range():
+        for entity in entities:
+            sim_map.find_entities_in_range(entity.position, PRESENCE_THRESHOLD, exclude=entity, team=entity.team.enemy())
+    find_in_range_time = time_call(find_in_range, repeats) / max(1, len(entities))
+
+    def set_attacking():
+        for lane in sim_map.lanes.lanes.values():
+            lane.set_attacking()
+    set_attacking_time = time_call(set_attacking, repeats)
+
+    vision = Vision(sim_map.entities, sim_map.store)
+    vision_time = time_call(lambda: vision.step(sim.time_delta, 0), repeats) # sim_step 0 always recalculates
+
+    return StressResult(config, len(entities), find_in_range_time, set_attacking_time, vision_time)
+
+def scaling_exponent(prev: StressResult, cur: StressResult, attr: str):
+    if prev.entities == cur.entities or getattr(prev, attr) <= 0:
+        return math.nan
+    return math.log(getattr(cur, attr) / getattr(prev, attr)) / math.log(cur.entities / prev.entities)
+
+def run_ramp(ramp, warmup_steps, repeats, use_entity_store, wave_size_per_lane=0.0, wave_spawn_interval=30.0) -> list[StressResult]:
+    results = []
+    print(f"{'team':>5} {'lanes':>5} {'entities':>8} {'find_in_range us':>17} {'exp':>5} {'set_attacking us':>17} {'exp':>5} {'vision us':>10} {'exp':>5}")
+    for team_size, lane_count in ramp:
+        random.seed(0)
+        config = SimConfig(team_size=team_size, lane_count=lane_count, wave_size=1 + wave_size_per_lane * lane_count, wave_spawn_interval=wave_spawn_interval)
+        result = run_level(config, warmup_steps, repeats, use_entity_store)
+        exps = [scaling_exponent(results[-1], result, attr) if results else math.nan for attr in ("find_in_range_time", "set_attacking_time", "vision_time")]
+        print(
+            f"{team_size:>5} {lane_count:>5} {result.entities:>8} "
+            f"{result.find_in_range_time * 1e6:>17.2f} {exps[0]:>5.2f} {result.set_attacking_time * 1e6:>17.1f} {exps[1]:>5.2f} "
+            f"{result.vision_time * 1e6:>10.1f} {exps[2]:>5.2f}"
+        )
+        results.append(result)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ramp up the game size and time the checks that scale with entity count")
+    parser.add_argument("--warmup-steps", type=int, default=1500, help="sim steps played before timing each level")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--store", action="store_true", help="use the numpy EntityStore for range checks")
+    parser.add_argument("--wave-spawn-interval", type=float, default=30.0, help="seconds between waves")
+    parser.add_argument("--wave-size-per-lane", type=float, default=0.0, help="extra wave size multiplier per lane")
+    parser.add_argument("--max-team-size", type=int, default=None, help="stop the ramp after this team size")
+    args = parser.parse_args()
+
+    ramp = [level for level in DEFAULT_RAMP if args.max_team_size is None or level[0] <= args.max_team_size]
+    run_ramp(ramp, args.warmup_steps, args.repeats, args.store, args.wave_size_per_lane, args.wave_spawn_interval)
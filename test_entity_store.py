@@ -0,0 +1,56 @@
+from entity import Team, Wave
+from entity_store import EntityStore
+from item import SHIELD
+from lane import WaveWrapper
+from player import RESPAWN_POINT, Player
+
+def assert_in_sync(store: EntityStore, *entities):
+    for e in entities:
+        assert store.health[e.store_slot] == e.stats.health
+        assert store.max_health[e.store_slot] == e.stats.vector.max_health
+
+def test_health_columns_follow_every_change():
+    store = EntityStore()
+    player = Player.default_player(RESPAWN_POINT[Team.BLUE], Team.BLUE, "A")
+    enemy = Player.default_player(RESPAWN_POINT[Team.RED], Team.RED, "D")
+    store.attach(player)
+    store.attach(enemy)
+
+    enemy.attack(player)
+    assert_in_sync(store, player)
+    player.stats.step_heal(1.0)
+    assert_in_sync(store, player)
+    player.stats.gain_experience(1000) # Levels up
+    assert_in_sync(store, player)
+    player.inventory.add_gold(SHIELD.cost)
+    assert player.buy(SHIELD)
+    assert_in_sync(store, player)
+    player.stats.heal()
+    assert_in_sync(store, player)
+
+def test_health_columns_follow_wave_merge():
+    store = EntityStore()
+    a, b = WaveWrapper(Wave.default_wave(0, Team.BLUE)), WaveWrapper(Wave.default_wave(1, Team.BLUE))
+    store.attach(a.entity)
+    store.attach(b.entity)
+    a.combine_from(b)
+    assert_in_sync(store, a.entity)
+
+def test_clone_writes_to_its_own_slot():
+    store = EntityStore()
+    player = Player.default_player(RESPAWN_POINT[Team.BLUE], Team.BLUE, "A")
+    store.attach(player)
+    copy = player.clone()
+    copy.store = None
+    copy.stats.health = 1
+    assert store.health[player.store_slot] == player.stats.health
+
+def test_stats_only_linked_while_attached():
+    # Linked stats and entity refer to each other, which would keep entities without a store alive until a gc pass
+    store = EntityStore()
+    player = Player.default_player(RESPAWN_POINT[Team.BLUE], Team.BLUE, "A")
+    assert player.stats.owner is None
+    store.attach(player)
+    assert player.stats.owner is player
+    store.detach(player)
+    assert player.stats.owner is None
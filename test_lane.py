@@ -0,0 +1,17 @@
+import random
+
+from entity import Wave
+from sim import Simulator
+
+def test_lane_damage_only_on_damage_ticks():
+    random.seed(0)
+    sim = Simulator()
+    hit_steps = []
+    for _ in range(1000):
+        is_damage_tick = sim.damage_tick_timer < 0 # What step() works out
+        health = {e: e.stats.health for e in sim.map.entities if isinstance(e, Wave)}
+        sim.step()
+        if any(e.stats.health < h for e, h in health.items()):
+            hit_steps.append(sim.sim_step - 1)
+            assert is_damage_tick, f"lane waves took damage at step {sim.sim_step - 1}, which isn't a damage tick"
+    assert len(hit_steps) > 0
@@ -0,0 +1,40 @@
+import random
+
+from MAP_CONSTANTS import BOT_LANE_POINTS
+from controller import ActionType
+from headless import HeadlessRunner, ScheduledAction
+from lane import Lane
+from sim import Simulator
+from sim_config import SimConfig
+
+# 99.4 seconds between spawns puts the second spawn (step 497) partway through a coarse step. Lane damage doesn't depend on
+# the random stream, so the only difference between the two games is the coarse stepping
+FULL_RATE = SimConfig(simultaneous_lane_damage=True, wave_spawn_interval=99.4)
+COARSE = SimConfig(simultaneous_lane_damage=True, wave_spawn_interval=99.4, lane_lod_radius=150)
+
+def play(config, schedule, steps):
+    random.seed(0)
+    sim = Simulator(config=config)
+    HeadlessRunner(max_steps=steps).run_game(schedule, sim=sim)
+    return sim
+
+def rear_waves(sim, lane):
+    return sorted(w.overall_distance for w in sim.map.lanes.lanes[lane].waves)[:2]
+
+def test_wave_spawned_between_coarse_steps_moves_from_its_spawn():
+    # The waves spawned at step 497 haven't reached anything by step 520, so they have to be where the full rate game has them
+    full, coarse = play(FULL_RATE, [], 520), play(COARSE, [], 520)
+    assert not coarse.map.lanes.lanes[Lane.BOTTOM].attended
+    for lane in full.map.lanes.lanes:
+        assert rear_waves(full, lane) == rear_waves(coarse, lane)
+
+def test_coarse_lane_catches_up_on_entering_radius():
+    # C walks from the base towards bottom lane, which has been stepped coarsely until then. Once C is within
+    # lane_lod_radius, the deferred steps are run and the lane has the same waves as in the full rate game
+    schedule = [ScheduledAction(510, ActionType.MOVE_TO_LOCATION, "C", BOT_LANE_POINTS[0])]
+    assert not play(COARSE, schedule, 515).map.lanes.lanes[Lane.BOTTOM].attended
+    full, coarse = play(FULL_RATE, schedule, 531), play(COARSE, schedule, 531)
+    bottom = coarse.map.lanes.lanes[Lane.BOTTOM]
+    assert bottom.attended and bottom.deferred_steps == 0
+    assert len(full.map.lanes.lanes[Lane.BOTTOM].waves) == len(bottom.waves)
+    assert rear_waves(full, Lane.BOTTOM) == rear_waves(coarse, Lane.BOTTOM)
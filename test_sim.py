@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from CONSTANTS import SIM_STEPS_PER_SECOND
+from controller import ActionType
+from entity import Team
+from game_tree import GameTree
+from headless import HeadlessRunner, ScheduledAction
+from item import ARMOR, SWORD
+from mitigation_cache import MitigationCache
+from player import RESPAWN_POINT, Player
+from sim import Simulator
+from sim_config import SimConfig
+from stats import mitigated_damage
+
+SCHEDULE = [
+    ScheduledAction(0, ActionType.MOVE_TO_LOCATION, "A", (240, 0)),
+    ScheduledAction(0, ActionType.MOVE_TO_LOCATION, "D", (500, 0)),
+    ScheduledAction(0, ActionType.MOVE_TO_LOCATION, "B", (240, 50)),
+    ScheduledAction(0, ActionType.MOVE_TO_LOCATION, "E", (240, 50)),
+    ScheduledAction(200, ActionType.ENGAGE_COMBAT, "B"),
+    ScheduledAction(400, ActionType.ATTACK_LANE_ENTITY, "A"),
+]
+
+def game_state(sim: Simulator):
+    # Everything a step can change, to compare two games
+    entities = [
+        (type(e).__name__, e.entity_id, e.team, e.position, e.stats.health, e._state, e.stats.vector.values(), getattr(e.attacking, "entity_id", None))
+        for e in sim.map.entities
+    ]
+    lanes = [[(w.entity.entity_id, getattr(w, "overall_distance", None)) for w in lane.get_all_wrappers()] for lane in sim.map.lanes.lanes.values()]
+    events = [repr(e) for e in sim.map.events] if sim.map.events is not None else None
+    return sim.sim_step, sim.damage_tick_timer, len(sim.map.combats), entities, lanes, events
+
+def played(steps, config=SimConfig()):
+    random.seed(1)
+    sim = Simulator(config=config)
+    HeadlessRunner(max_steps=steps).run_game(SCHEDULE, sim=sim)
+    return sim
+
+def test_clone_and_snapshot_match_and_are_independent():
+    sim = played(500)
+    before = game_state(sim)
+    copy, snapshot = sim.clone(), GameTree(sim).get_current_sim_state()
+    assert game_state(copy) == game_state(snapshot) == before
+    # The copy's registry hands out its own entities
+    assert copy.map.get_player_by_id("A") is not sim.map.get_player_by_id("A")
+    assert copy.map.get_player_by_id("A").entity_id == sim.map.get_player_by_id("A").entity_id
+
+    results = []
+    for game in (copy, snapshot):
+        random.seed(7)
+        for _ in range(300):
+            game.step()
+        results.append(game_state(game))
+    assert results[0] == results[1]
+    assert game_state(sim) == before
+
+@pytest.mark.parametrize("config", [SimConfig(), SimConfig(lane_lod_radius=150)])
+def test_advance_until_matches_step(config):
+    random.seed(3)
+    stepped = Simulator(config=config)
+    for _ in range(2000):
+        stepped.step()
+    stepped_random = random.getstate()
+
+    random.seed(3)
+    skipped = Simulator(config=config)
+    assert skipped.advance_until(max_time=2000 / SIM_STEPS_PER_SECOND) == 2000
+    assert random.getstate() == stepped_random
+    assert game_state(skipped) == game_state(stepped)
+
+def test_mitigation_cache_follows_stat_changes():
+    cache = MitigationCache()
+    attacker = Player.default_player(RESPAWN_POINT[Team.BLUE], Team.BLUE, "A")
+    defender = Player.default_player(RESPAWN_POINT[Team.RED], Team.RED, "D")
+    def check():
+        assert cache.damage(attacker.stats, 1, defender.stats) == mitigated_damage(attacker.stats.vector, 1, defender.stats.vector)
+        return cache.damage(attacker.stats, 1, defender.stats)
+
+    start = check()
+    defender.inventory.add_gold(ARMOR.cost)
+    assert defender.buy(ARMOR)
+    with_armor = check()
+    assert with_armor < start
+    attacker.stats.gain_experience(1000) # Levels up
+    assert check() > with_armor
+
+def test_effective_is_rebuilt_after_stat_changes():
+    player = Player.default_player(RESPAWN_POINT[Team.BLUE], Team.BLUE, "A")
+    stats = player.stats
+    assert stats.effective is stats.leveled.effective
+    damage = stats.effective.damage_stats.physical_damage
+
+    player.inventory.add_gold(SWORD.cost)
+    assert player.buy(SWORD)
+    assert stats._effective is None # Not built until read
+    assert stats.effective.damage_stats.physical_damage == damage + SWORD.stats.damage_stats.physical_damage
+    assert stats.effective == stats.vector.to_stats()
+
+    level = stats.leveled.level
+    stats.gain_experience(1000)
+    assert stats.leveled.level > level
+    assert stats._effective is None
+    assert stats.effective == stats.vector.to_stats()
+    assert stats.effective.damage_stats.physical_damage == stats.leveled.effective.damage_stats.physical_damage + SWORD.stats.damage_stats.physical_damage
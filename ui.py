@@ -6,6 +6,7 @@ from MAP_CONSTANTS import SCREEN_Y
 from MAP_CONSTANTS import MAP_X, SCREEN_X
 from controller import ActionEntry, ActionType, Controller, DisplayLocationType, InputAction
 from entity import Team
+from events import print_events
 from MAP_CONSTANTS import MAP_Y
 from game_tree import GameTree, GameTreeAction, GameTreeActionType
 from overlay_manager import OverlayManager, OverlayType
@@ -17,11 +18,14 @@ class UI:
     def __init__(self, use_game_tree=False) -> None:
         pygame.init()
         self.controller = Controller()
+        self.controller.sim.map.events.subscribe(print_events) # Game events go to the console, as the game is played
         self.overlay_manager = OverlayManager()
         self.clock = pygame.time.Clock()
         self.selected_player = None
         self.screen = pygame.display.set_mode((SCREEN_X, SCREEN_Y))
         self.game_tree = GameTree(self.controller.sim) if use_game_tree else None
+        if self.game_tree is not None:
+            self.game_tree.events.subscribe(print_events)
         self.paused = False
         self.run()
 
@@ -66,6 +70,8 @@ class UI:
         def callback(position):
             new_sim = action.callback(self.controller.sim)
             self.controller.sim = new_sim # The callback from the action will return the current simulator state to use, so that needs to be set into the controller
+            if new_sim.map.events is not None:
+                new_sim.map.events.subscribe(print_events) # Snapshots come without subscribers
         
         return type, callback
     
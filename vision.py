@@ -1,6 +1,8 @@
-from typing import Sequence, Union
+from typing import Optional, Union
 from CONSTANTS import PRESENCE_THRESHOLD, SIM_STEPS_PER_SECOND, VISION_RECALCULATE_PERIOD
 from entity import Entity, Team
+from entity_store import EntityStore
+from registry import EntityRegistry
 
 VISION_RECALCULATE_SIM_STEPS: int = int(VISION_RECALCULATE_PERIOD * SIM_STEPS_PER_SECOND)
 
@@ -21,8 +23,9 @@ class Ward:
 VisionSource = Union[Entity, Ward]
 
 class Vision:
-    def __init__(self, entities: Sequence[Entity]) -> None:
+    def __init__(self, entities: EntityRegistry, store: Optional[EntityStore] = None) -> None:
         self.entities = entities
+        self.store = store # If given, every entity must be attached to it
         self.wards: list[Ward] = []
         self.viewable_by_team: dict[Team, list[Entity]] = {Team.BLUE: [], Team.RED: []}
     
@@ -41,11 +44,32 @@ class Vision:
         if sim_step % VISION_RECALCULATE_SIM_STEPS != 0:
             return # Only recalculate periodically
         self.viewable_by_team = {Team.BLUE: [], Team.RED: []}
-        vision_sources = list(self.entities) + self.wards
-        vision_sources_by_team = {team: [e for e in vision_sources if e.team == team] for team in (Team.RED, Team.BLUE)}
-        entities_by_team = {team: [e for e in self.entities if e.team == team] for team in (Team.RED, Team.BLUE)}
+        if self.store is not None:
+            self.recalculate_vectorized(self.store)
+            return
+        entities_by_team = {team: list(self.entities.of_team(team)) for team in (Team.RED, Team.BLUE)}
+        vision_sources_by_team = {team: entities_by_team[team] + [w for w in self.wards if w.team == team] for team in (Team.RED, Team.BLUE)}
         for team in (Team.RED, Team.BLUE):
             for vision_source in vision_sources_by_team[team]:
                 for enemy_e in entities_by_team[team.enemy()]:
                     if enemy_e.distance_to_point(vision_source.position) <= PRESENCE_THRESHOLD:
-                        self.viewable_by_team[team].append(enemy_e)
\ No newline at end of file
+                        self.viewable_by_team[team].append(enemy_e)
+
+    def recalculate_vectorized(self, store: EntityStore):
+        # Same result (including order and duplicates) as the nested loops in step, with one distance matrix per team.
+        # Entity vision sources come before wards, as in the loop version
+        entities_by_team = {team: list(self.entities.of_team(team)) for team in (Team.RED, Team.BLUE)}
+        for team in (Team.RED, Team.BLUE):
+            enemies = entities_by_team[team.enemy()]
+            if len(enemies) == 0:
+                continue
+            enemy_slots = store.slots_of(enemies)
+            rows = []
+            if len(entities_by_team[team]) > 0:
+                rows.extend(store.pairs_within(store.slots_of(entities_by_team[team]), enemy_slots, PRESENCE_THRESHOLD))
+            team_wards = [w for w in self.wards if w.team == team]
+            if len(team_wards) > 0:
+                rows.extend(store.points_within([w.position for w in team_wards], enemy_slots, PRESENCE_THRESHOLD))
+            for row in rows:
+                for j in row.nonzero()[0]:
+                    self.viewable_by_team[team].append(enemies[j])